@@ -0,0 +1,45 @@
+"""Compares the converter against the former one re.sub per amino acid implementation."""
+import random
+import re
+from timeit import timeit
+
+from Bio.PDB.Polypeptide import three_to_one as biopython_three_to_one, aa3
+
+from bioinfo_toolset.modules.converter import three_to_one, three_to_one_many
+
+
+def legacy_three_to_one(three_letter_string: str):
+    converted = three_letter_string
+    for aa_name in aa3:
+        converted = re.sub(aa_name, biopython_three_to_one(
+            aa_name), converted, flags=re.I)
+    return converted
+
+
+def hgvsp_strings(count, seed=42):
+    rnd = random.Random(seed)
+    names = [aa.capitalize() for aa in aa3]
+    return [f"ENSP{rnd.randint(1, 10 ** 6):011d}.1:p.{rnd.choice(names)}{rnd.randint(1, 2000)}{rnd.choice(names + ['Ter', 'fsTer12'])}"
+            for _ in range(count)]
+
+
+if __name__ == '__main__':
+    strings = hgvsp_strings(10000)
+    assert [legacy_three_to_one(s) for s in strings] == three_to_one_many(strings)
+    runs = 5
+
+    legacy = timeit(lambda: [legacy_three_to_one(s) for s in strings], number=runs)
+    three_to_one.cache_clear()
+    single = timeit(lambda: ([three_to_one(s) for s in strings], three_to_one.cache_clear()), number=runs)
+    # transcripts of recurrent variants repeat the same HGVS.p strings
+    repeated = strings[:500] * 20
+    legacy_repeated = timeit(lambda: [legacy_three_to_one(s) for s in repeated], number=runs)
+    cached = timeit(lambda: [three_to_one(s) for s in repeated], number=runs)
+    batch = timeit(lambda: three_to_one_many(strings), number=runs)
+
+    print(f"{len(strings)} HGVS.p strings, total seconds of {runs} runs:")
+    for name, seconds, baseline in [('legacy re.sub per amino acid', legacy, legacy),
+                                    ('three_to_one (uncached)', single, legacy),
+                                    ('three_to_one_many', batch, legacy),
+                                    ('three_to_one (500 repeated)', cached, legacy_repeated)]:
+        print(f"  {name:30s} {seconds:8.4f}s  {baseline / seconds:6.1f}x")
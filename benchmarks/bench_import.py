@@ -0,0 +1,37 @@
+"""Measures the startup latency of the bit CLI, each command runs in a fresh interpreter."""
+import subprocess
+import sys
+from time import perf_counter
+
+COMMANDS = [
+    ('import bioinfo_toolset.bit', ['-c', 'import bioinfo_toolset.bit']),
+    ('bit --help', ['-m', 'bioinfo_toolset.bit', '--help']),
+    ('bit hgvs -p', ['-m', 'bioinfo_toolset.bit', 'hgvs', '-p', '7:g.140453136A>T']),
+    ('bit liftover-file --help', ['-m', 'bioinfo_toolset.bit', 'liftover-file', '--help']),
+]
+# startup budget of the commands above in milliseconds
+BUDGET = 200
+
+
+def startup(args, runs):
+    """Returns the best wall clock time of `runs` interpreter runs in milliseconds."""
+    best = None
+    for _ in range(runs):
+        start = perf_counter()
+        subprocess.run([sys.executable] + args, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = (perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == '__main__':
+    runs = 5
+    baseline = startup(['-c', 'pass'], runs)
+    print(f"best of {runs} runs, python startup {baseline:.0f} ms included:")
+    slow = False
+    for name, args in COMMANDS:
+        ms = startup(args, runs)
+        slow = slow or ms > BUDGET
+        print(f"  {name:30s} {ms:8.0f} ms {'(over budget)' if ms > BUDGET else ''}")
+    sys.exit(1 if slow else 0)
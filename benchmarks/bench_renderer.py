@@ -0,0 +1,63 @@
+"""Compares the text renderer against the former print and colored per key output of bit vep."""
+import json
+from contextlib import redirect_stdout
+from os import devnull
+from timeit import timeit
+
+from termcolor import colored
+
+from benchmarks.bench_vep_result import vep_lines
+from bioinfo_toolset.modules.formatter import format_allele_string, format_position, transcript_name
+from bioinfo_toolset.modules.renderer import TRANSCRIPT_KEYS, VARIANT_KEYS, TextRenderer, TsvRenderer
+
+
+def legacy_output(results):
+    def output_kv(id, value, indent=0, highlight=False):
+        attrs = ['bold'] if highlight else []
+        if isinstance(value, list) and value and isinstance(value[0], (str, dict)):
+            value = ', '.join([str(val) for val in value])
+        print(f'%-{indent * 4}s%-{36 if highlight else 32}s : %s' %
+              (' ', colored(id, 'cyan', attrs=attrs), colored(value, 'white', attrs=attrs)))
+
+    for result in results:
+        print(colored(f"Result for {result['input']}", 'blue', attrs={'bold'}))
+        for id in VARIANT_KEYS:
+            if id in result:
+                output_kv(id, format_allele_string(result[id]) if id == 'allele_string' else result[id])
+        for transcript in result.get('transcript_consequences', []):
+            highlight = transcript.get('canonical') == 1
+            for id in TRANSCRIPT_KEYS:
+                if id in transcript:
+                    output_kv(id, transcript[id], 1, highlight)
+            output_kv('cdna_position', format_position(transcript, 'cdna'), 1, highlight)
+            output_kv('transcript_name', transcript_name(transcript)[0], 1, highlight)
+            print(f'%-{4}s---' % ' ')
+
+
+def legacy(results):
+    with open(devnull, 'w') as outf, redirect_stdout(outf):
+        legacy_output(results)
+
+
+def render(renderer, results):
+    with renderer as out:
+        for result in results:
+            out.write(result)
+
+
+if __name__ == '__main__':
+    results = [json.loads(line) for line in vep_lines(10000)]
+    runs = 3
+
+    # termcolor leaves out the colors if stdout is not a terminal
+    legacy_seconds = timeit(lambda: legacy(results), number=runs)
+    text = timeit(lambda: render(TextRenderer(devnull, color=True, all_transcripts=True), results), number=runs)
+    plain = timeit(lambda: render(TextRenderer(devnull, color=False, all_transcripts=True), results), number=runs)
+    tsv = timeit(lambda: render(TsvRenderer(devnull, all_transcripts=True), results), number=runs)
+
+    print(f"{len(results)} VEP results, all transcripts, total seconds of {runs} runs:")
+    for name, seconds in [('legacy print and colored', legacy_seconds),
+                          ('TextRenderer (color)', text),
+                          ('TextRenderer (no color)', plain),
+                          ('TsvRenderer', tsv)]:
+        print(f"  {name:26s} {seconds:8.4f}s  {legacy_seconds / seconds:6.1f}x")
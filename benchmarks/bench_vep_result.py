@@ -0,0 +1,67 @@
+"""Compares decoding VEP json lines with json.loads and orjson.loads against LazyResult (time and memory held)."""
+import json
+import random
+import tracemalloc
+from timeit import timeit
+
+from bioinfo_toolset.modules.vep_result import LazyResult, orjson
+
+
+def vep_lines(count, seed=42):
+    rnd = random.Random(seed)
+    lines = []
+    for i in range(count):
+        start = rnd.randint(1, 10 ** 8)
+        result = {
+            'input': f"1\t{start}\t.\tA\tT", 'id': '.', 'assembly_name': 'GRCh38', 'seq_region_name': '1',
+            'start': start, 'end': start, 'strand': 1, 'allele_string': 'A/T',
+            'most_severe_consequence': 'missense_variant',
+            'transcript_consequences': [
+                {'transcript_id': f"ENST{rnd.randint(1, 10 ** 6):011d}", 'gene_symbol': 'BRAF', 'impact': 'MODERATE',
+                 'consequence_terms': ['missense_variant'], 'biotype': 'protein_coding', 'strand': 1,
+                 'cdna_start': rnd.randint(1, 5000), 'sift_score': rnd.random(), 'polyphen_score': rnd.random()}
+                for _ in range(rnd.randint(1, 12))],
+            'colocated_variants': [
+                {'id': f"rs{rnd.randint(1, 10 ** 9)}", 'start': start, 'end': start, 'allele_string': 'A/T',
+                 'frequencies': {'T': {population: rnd.random() for population in
+                                       ['af', 'gnomade', 'gnomade_afr', 'gnomade_amr', 'gnomade_asj', 'gnomade_eas',
+                                        'gnomade_fin', 'gnomade_nfe', 'gnomade_oth', 'gnomade_sas']}}}
+                for _ in range(rnd.randint(0, 3))],
+        }
+        lines.append(json.dumps(result).encode() + b'\n')
+    return lines
+
+
+def held(decode, lines):
+    tracemalloc.start()
+    results = [decode(line) for line in lines]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del results
+    return size
+
+
+def accessed(line):
+    """A LazyResult whose transcripts are used."""
+    result = LazyResult(line)
+    result['transcript_consequences']
+    return result
+
+
+if __name__ == '__main__':
+    lines = vep_lines(10000)
+    runs = 5
+    print(f"{len(lines)} VEP json lines ({sum(map(len, lines)) / 1024 ** 2:.1f} MiB), "
+          f"orjson {'installed' if orjson is not None else 'not installed'}, total seconds of {runs} runs:")
+    baseline = timeit(lambda: [json.loads(line) for line in lines], number=runs)
+    baseline_held = held(json.loads, lines)
+    decoders = [('json.loads', json.loads)]
+    if orjson is not None:
+        decoders.append(('orjson.loads', orjson.loads))
+    decoders += [('LazyResult', LazyResult),
+                 ('LazyResult, transcripts used', accessed)]
+    for name, decode in decoders:
+        seconds = timeit(lambda: [decode(line) for line in lines], number=runs)
+        size = held(decode, lines)
+        print(f"  {name:30s} {seconds:8.4f}s  {baseline / seconds:6.1f}x  "
+              f"{size / 1024 ** 2:7.1f} MiB held  {baseline_held / size:5.1f}x")
@@ -1,21 +1,18 @@
 #!/usr/bin/env python
 
 import traceback
+from itertools import islice
 from pprint import pprint
 from sys import stdout
 
 import click
 from click import Choice
 from friendlylog import colored_logger as log
-from termcolor import colored
 
-from bioinfo_toolset.modules.vep_offline import OfflineVep
 import logging
 
-from bioinfo_toolset.modules.vrs import VRS
-
-from bioinfo_toolset.modules.formatter import (
-    format_allele_string, format_protein_position, format_position, format_change_position, transcript_name)
+# Modules depending on docker, ga4gh, hgvs or biopython are imported in the
+# commands using them, which keeps the startup of all other commands fast.
 
 log.setLevel(logging.DEBUG)
 
@@ -46,19 +43,53 @@ def liftover(_from, to, chromosome, position):
 cli.add_command(liftover)
 
 
+@click.command()
+@click.option('--from', '-f', '_from', default='hg19', type=str, help='Convert from this genome assembly')
+@click.option('--to', '-t', default='hg38', type=str, help='Convert to this genome assembly')
+@click.option('--format', '-F', 'file_format', default='bed', type=Choice(['bed', 'vcf', 'tsv']), help='Format of the input (tsv: chromosome, 1-based start and optional end)')
+@click.option('--output', '-o', 'output', default='-', type=click.Path(), help='Output file (default stdout)')
+@click.option('--unmapped', '-u', 'unmapped', default=None, type=click.Path(), help='Write the records that cannot be lifted to this file')
+@click.argument('input', type=click.Path())
+def liftover_file(_from, to, file_format, output, unmapped, input):
+    """Lifts the coordinates of a BED, VCF or TSV file (- for stdin) record by record."""
+    from bioinfo_toolset.modules.liftover import lift_records
+    unmapped_file = open(unmapped, 'w') if unmapped else None
+    try:
+        with click.open_file(input, 'r') as inf, click.open_file(output, 'w') as outf:
+            for line in lift_records(_from, to, inf, file_format, unmapped_file):
+                outf.write(line)
+    finally:
+        if unmapped_file is not None:
+            unmapped_file.close()
+
+
+cli.add_command(liftover_file)
+
+
 @click.command()
 @click.option('--parse', '-p', '_parse', is_flag=True, help='Parse the hgvs string')
 @click.option('--transcript', '-t', '_transcript', is_flag=True, help='Parse a variant using transcript level change [chr:pos:hgvs]')
 @click.option('--GRCh37', '--grch37', '--old', '-o', 'GRCh37', is_flag=True, help="Use the GRCh rest api for the query")
+@click.option('--normalize', '-n', '_normalize', is_flag=True, help='Output the variant as normalized (trimmed, left aligned) vcf line')
 @click.argument('hgvs_string', type=str)
-def hgvs(hgvs_string: str, _parse: bool = True, _transcript: bool = False, GRCh37: bool = False):
+def hgvs(hgvs_string: str, _parse: bool = True, _transcript: bool = False, GRCh37: bool = False, _normalize: bool = False):
+    if _normalize and not (_parse or _transcript):
+        raise click.UsageError('--normalize needs --parse or --transcript')
     from bioinfo_toolset.modules.hgvs import Hgvs
+    parsed = None
     if _parse:
-        pprint(Hgvs.parse(hgvs_string))
+        parsed = Hgvs.parse(hgvs_string)
     elif _transcript:
         chromosome, position, transcript_change = hgvs_string.split(':')
-        pprint(Hgvs.from_transcript_change(
-            chromosome, int(position), transcript_change, GRCh37))
+        parsed = Hgvs.from_transcript_change(
+            chromosome, int(position), transcript_change, GRCh37)
+    if parsed is None:
+        return
+    if _normalize:
+        from bioinfo_toolset.modules.normalize import from_hgvs
+        print(from_hgvs(parsed, 'GRCh37' if GRCh37 else 'GRCh38').vcf())
+    else:
+        pprint(parsed)
 
 
 cli.add_command(hgvs)
@@ -70,18 +101,44 @@ cli.add_command(hgvs)
 @click.argument('start', type=int)
 @click.argument('end', type=int, required=False, default=None)
 def position(chromosome: int, start: int, end: int = None, GRCh37: bool = False):
+    from bioinfo_toolset.modules.reference import allele_at_position
     # We need to correct the postion by moving it one back
     start -= 1
     if end is None:
         end = start + 1
-    vrs = VRS()
-    print(vrs.allele_at_position(
+    print(allele_at_position(
         'GRCh37' if GRCh37 else 'GRCh38', chromosome, start, end))
 
 
 cli.add_command(position)
 
 
+@click.command()
+@click.option('--GRCh37', '--grch37', '--old', '-o', 'GRCh37', is_flag=True, help="The variants are on GRCh37")
+@click.option('--shift', '-s', 'shift', default='left', type=Choice(['left', 'right']), help="Align indels to the left (VCF) or right (3', HGVS)")
+@click.option('--output', '-O', 'output', default='-', type=click.Path(), help='Output file (default stdout)')
+@click.argument('input', type=click.Path())
+def normalize(GRCh37, shift, output, input):
+    """
+    Normalizes the variants of a VCF file (- for stdin): shared bases are
+    trimmed and indels aligned against the reference (the fasta installed
+    by populate-cache or the seqrepo).
+    """
+    from bioinfo_toolset.modules.normalize import normalize_vcf_lines
+    with click.open_file(input, 'r') as inf, click.open_file(output, 'w') as outf:
+        while True:
+            lines = list(islice(inf, 100000))
+            if not lines:
+                break
+            records = [line.rstrip('\n') for line in lines if not line.startswith('#') and line.strip()]
+            normalized = iter(normalize_vcf_lines(records, 'GRCh37' if GRCh37 else 'GRCh38', shift))
+            for line in lines:
+                outf.write(line if line.startswith('#') or not line.strip() else next(normalized) + '\n')
+
+
+cli.add_command(normalize)
+
+
 @click.command(context_settings={"ignore_unknown_options": True}, help="The query string can be a hgvs, id or region (e.g. hgvs: 9:g.22125504G>C, region: 3:178928079/C)")
 @click.option('--GRCh37', '--grch37', '--old', '-o', 'GRCh37', is_flag=True, help="Use the GRCh rest api for the query")
 @click.option('--liftover', '-lift', '-l', '_liftover', is_flag=True, help="Liftover the variant GRCh38/GRCh37, depending on the used assembly")
@@ -92,201 +149,133 @@ cli.add_command(position)
 @click.option('--refseq-mode', '-r', 'refsec_mode', is_flag=True, help='Use RefSeq transcript set to report consequences')
 @click.option('--vrs', '-v', 'vrs', is_flag=True, help='Calculates and outputs the VRS identifier per transcript')
 @click.option('--details', '-d', 'details', is_flag=True, help='Outputs all values of variant and transcript got from VEP.')
+@click.option('--jobs', '-j', 'jobs', default=1, type=click.IntRange(min=1), help='Number of concurrent VEP containers used to annotate a vcf_file and of processes calculating VRS ids')
+@click.option('--stream', 'stream', is_flag=True, help='Stream a vcf_file through VEP and print the results as they arrive (ignores --jobs). With --cache the file is looked up in chunks of BIT_STREAM_CHUNK_SIZE lines')
+@click.option('--batch', '-b', 'batch', is_flag=True, help='INPUT is a file (or - for stdin) with one hgvs, id or region per line, queried in batches')
+@click.option('--cache', '-c', 'use_cache', is_flag=True, help='Serve already annotated variants from the local annotation cache')
+@click.option('--output-format', '-f', 'output_format', default='text', type=Choice(['text', 'tsv', 'jsonl', 'parquet', 'arrow']), help='text, tab separated rows per transcript, one json result per line or parquet/arrow tables of variants, transcript consequences and colocated variants')
+@click.option('--output', '-O', 'output_path', default=None, type=click.Path(), help='Output file for text, tsv and jsonl (default stdout) or directory for parquet and arrow')
+@click.option('--server', '-S', 'server', default=None, envvar='BIT_SERVER', type=str, help='Annotate vcf and vcf_file input with a running `bit serve` daemon (socket path or http://127.0.0.1:PORT)')
 # @click.option('--vcf', 'vcf_format', is_flag=True, help='The given vcf string is in vcf format (tab separated).')
 @click.argument('input', type=str)
-def vep(species, input_type, input, GRCh37, _liftover, enrich_transcripts, all_transcripts, refsec_mode, vrs, details):
-    from bioinfo_toolset.modules.vep import vep
-    from bioinfo_toolset.modules.liftover import liftover
-
-    def output(text, indent=0):
-        print(f'%-{indent * 4}s{text}' % (' '))
-
-    def output_kv(id, value, indent=0, highlight=False):
-        attrs = []
-        if highlight:
-            attrs = ['bold']
-        if isinstance(value, list):
-            if isinstance(value[0], str):
-                value = ', '.join(value)
-            elif isinstance(value[0], dict):
-                value = ', '.join([str(val) for val in value])
-        if isinstance(value, dict):
-            new_value = ''
-            for key, val in value.items():
-                if new_value != '':
-                    new_value += f"\n{' ' * (indent * 4 + 24)}"
-                new_value += f"{key}: "
-                if isinstance(val, list):
-                    new_value += ', '.join([str(v) for v in val])
-                elif isinstance(val, dict):
-                    for k, v in val.items():
-                        new_value += f"\n{' ' * (indent * 4 + 30)}"
-                        new_value += f'{k}: {v}'
-                else:
-                    new_value += str(val)
-            value = new_value
-        print(f'%-{indent * 4}s%-{36 if highlight else 32}s : %s' %
-              (' ', colored(id, 'cyan', attrs=attrs), colored(value, 'white', attrs=attrs)))
-
-    def format_value(id, value):
-        formatters = {
-            'allele_string': format_allele_string
-        }
-        if id in formatters:
-            return formatters[id](value)
+def vep(species, input_type, input, GRCh37, _liftover, enrich_transcripts, all_transcripts, refsec_mode, vrs, details, jobs, stream, batch, use_cache, output_format, output_path, server):
+    from bioinfo_toolset.modules.vep import vep, vep_batch
+    from bioinfo_toolset.modules.vep_offline import STREAM_CHUNK_SIZE, OfflineVep, vcf_lines
+    from bioinfo_toolset.modules.liftover import liftover, liftover_interval
+    from bioinfo_toolset.modules.renderer import shown_transcripts
+
+    def lift(result):
+        """Returns the assembly, chromosome and position of the variant lifted to the other assembly."""
+        lo_postion = {}
+        if result['start'] <= result['end']:
+            t_chr, lo_postion['start'], lo_postion['end'] = liftover_interval(
+                'hg19' if GRCh37 else 'hg38', 'hg38' if GRCh37 else 'hg19', result['seq_region_name'], result['start'], result['end'] + 1)
+            lo_postion['end'] -= 1
         else:
-            return value
-
-    def output_item(_dict, id, indent=0, highlight=False):
-        if id in _dict:
-            output_kv(id, format_value(id, _dict[id]), indent, highlight)
-
-    def output_splitter(indent=0):
-        output('---', indent)
-
-    def output_variant(variant, indent=0, details=details):
-        if details:
-            output_values = list(variant.keys())
-            if 'transcript_consequences' in output_values:
-                output_values.remove('transcript_consequences')
-        else:
-            output_values = ['assembly_name',
-                             'id',
-                             'seq_region_name',
-                             'start',
-                             'end',
-                             'variant_class',
-                             'allele_string',
-                             'strand',
-                             'somatic',
-                             'most_severe_consequence',
-                             'clin_sig',
-                             'frequencies',
-                             'phenotype_or_disease',
-                             'var_synonyms',
-                             'vrs'
-                             ]
-        for id in output_values:
-            output_item(variant, id, indent)
-
-    def output_transcript(transcript, indent=0, details=details):
-        highlight = False
-        if 'canonical' in transcript and transcript['canonical'] == 1:
-            highlight = True
-
-        if details:
-            output_values = transcript.keys()
-        else:
-            output_values = [
-                'source',
-                'transcript_id',
-                'gene_symbol',
-                'gene_id',
-                'variant_allele',
-                'hgvsg',
-                'hgvsc',
-                'hgvsp',
-                'hgnc_id',
-                'amino_acids',
-                'impact',
-                'consequence_terms',
-                'codons',
-                'biotype',
-                'polyphen_score',
-                'strand',
-                'sift_score',
-                'sift_prediction',
-                'flags'
-            ]
-
-        for id in output_values:
-            output_item(transcript, id, indent, highlight)
-        output_kv('cds_position', format_position(
-            transcript, 'cds'), indent, highlight)
-        output_kv('cdna_position', format_position(
-            transcript, 'cdna'), indent, highlight)
-        output_kv('protein_position', format_protein_position(
-            transcript), indent, highlight)
-        output_kv('transcript_name', transcript_name(
-            transcript)[0], indent, highlight)
-
-    def calculate_vrs(variant):
+            # insertions are reported with start = end + 1
+            t_chr, lo_postion['start'] = liftover(
+                'hg19' if GRCh37 else 'hg38', 'hg38' if GRCh37 else 'hg19', result['seq_region_name'], result['start'])
+            t_chr, lo_postion['end'] = liftover(
+                'hg19' if GRCh37 else 'hg38', 'hg38' if GRCh37 else 'hg19', result['seq_region_name'], result['end'])
+        return 'GRCh38' if GRCh37 else 'GRCh37', t_chr, lo_postion
+
+    def chunks_of(results):
+        """Yields lists of up to STREAM_CHUNK_SIZE results, so streamed results are not all buffered."""
+        results = iter(results)
+        while True:
+            chunk = list(islice(results, STREAM_CHUNK_SIZE))
+            if not chunk:
+                return
+            yield chunk
+
+    def calculate_vrs(results, processes=jobs):
+        """Calculates the VRS ids of the variants in one bulk run per chunk of results."""
         from bioinfo_toolset.modules.vrs import VRS
         _vrs = VRS.get_instance()
-        if '/' in variant['allele_string']:
-            variant['vrs'] = _vrs.identify(
-                sequence_id=f"{variant['assembly_name']}:{variant['seq_region_name']}", allele=variant['allele_string'].split('/')[1], start=variant['start'], end=variant['end'])
-        else:
-            variant['vrs'] = variant['allele_string']
-        return variant
-
-    def enrich_transcript(transcript, species=species, GRCh37=GRCh37):
-        if 'hgvsc' in transcript:
-            from bioinfo_toolset.modules.variant_recoder import recode
-            records = recode(transcript['hgvsc'], species, GRCh37)
-            transcript['hgvsg'] = []
-            for rec in records:
-                for allele in rec.values():
-                    for hgvsg in allele['hgvsg']:
-                        transcript['hgvsg'].append(hgvsg)
-        return transcript
+        for variants in chunks_of(results):
+            alleles = [variant for variant in variants if '/' in variant['allele_string']]
+            ids = _vrs.identify_many([(f"{variant['assembly_name']}:{variant['seq_region_name']}", variant['allele_string'].split('/')[1], variant['start'], variant['end'])
+                                      for variant in alleles], processes=processes)
+            for variant, _id in zip(alleles, ids):
+                variant['vrs'] = _id
+            for variant in variants:
+                if '/' not in variant['allele_string']:
+                    variant['vrs'] = variant['allele_string']
+            yield from variants
+
+    def enrich_transcripts_of(results, species=species, GRCh37=GRCh37):
+        """Resolves the hgvsg of all shown transcripts with concurrent, batched recoder requests per chunk of results."""
+        from bioinfo_toolset.modules.variant_recoder import recode_batch
+        for chunk in chunks_of(results):
+            records = recode_batch([transcript['hgvsc'] for result in chunk
+                                    for transcript in shown_transcripts(result, all_transcripts) if 'hgvsc' in transcript], species, GRCh37)
+            for result in chunk:
+                for transcript in shown_transcripts(result, all_transcripts):
+                    if 'hgvsc' in transcript:
+                        transcript['hgvsg'] = [hgvsg for rec in records[transcript['hgvsc']]
+                                               for allele in rec.values() if isinstance(allele, dict)
+                                               for hgvsg in allele.get('hgvsg', [])]
+            yield from chunk
 
     try:
-        if input_type == 'vcf':
+        result_cache = None
+        if use_cache:
+            from bioinfo_toolset.modules.cache import AnnotationCache
+            result_cache = AnnotationCache()
+
+        if server is not None and input_type in ['vcf', 'vcf_file']:
+            from bioinfo_toolset.modules.server import Client
+            results = Client(server).vep(
+                [input] if input_type == 'vcf' else vcf_lines(input),
+                GRCh37=GRCh37
+            )
+        elif input_type == 'vcf':
             offline_vep = OfflineVep()
             results = offline_vep.evaluate(
                 [input],
-                GRCh37=GRCh37
+                GRCh37=GRCh37,
+                result_cache=result_cache
             )
         elif input_type == 'vcf_file':
             offline_vep = OfflineVep()
-            lines = []
-            with open(input, 'r') as inf:
-                for line in inf.readlines():
-                    if not line.startswith('#'):
-                        lines.append(line.strip())
-            results = offline_vep.evaluate(
-                lines,
-                GRCh37=GRCh37
-            )
+            if stream:
+                results = offline_vep.evaluate_iter(
+                    vcf_lines(input),
+                    GRCh37=GRCh37,
+                    result_cache=result_cache
+                )
+            else:
+                results = offline_vep.evaluate_parallel(
+                    list(vcf_lines(input)),
+                    jobs,
+                    GRCh37=GRCh37,
+                    result_cache=result_cache
+                )
+        elif batch:
+            with click.open_file(input, 'r') as inf:
+                inputs = [line.strip() for line in inf
+                          if line.strip() and not line.startswith('#')]
+            results = vep_batch(inputs, species=species,
+                                input_type=input_type, GRCh37=GRCh37, refseq=refsec_mode, cache=result_cache)
         else:
             results = vep(input, species=species,
-                          input_type=input_type, GRCh37=GRCh37, refseq=refsec_mode)
+                          input_type=input_type, GRCh37=GRCh37, refseq=refsec_mode, cache=result_cache)
 
-        for result in results:
-            if vrs:
-                result = calculate_vrs(result)
-            print(
-                colored(f"Result for {result['input']}", 'blue', attrs={'bold'}))
-            print(
-                colored(f"{result['assembly_name']}: {result['id']} -> {result['seq_region_name']}:{format_change_position(result)} ({format_allele_string(result['allele_string'])})", 'green', attrs=['bold']))
-            if _liftover:
-                lo_postion = {}
-                t_chr, lo_postion['start'] = liftover(
-                    'hg19' if GRCh37 else 'hg38', 'hg38' if GRCh37 else 'hg19', result['seq_region_name'], result['start'])
-                t_chr, lo_postion['end'] = liftover(
-                    'hg19' if GRCh37 else 'hg38', 'hg38' if GRCh37 else 'hg19', result['seq_region_name'], result['end'])
-                print(
-                    colored(f"{'GRCh38' if GRCh37 else 'GRCh37'}: {result['id']} -> {t_chr}:{format_change_position(lo_postion)} ({format_allele_string(result['allele_string'])})", 'green', attrs=['bold']))
-            output_variant(result)
-
-            if 'colocated_variants' in result:
-                print(
-                    colored(f"Colocated variants ({len(result['colocated_variants'])}):", 'cyan'))
-                for colocated_variant in result['colocated_variants']:
-                    output_variant(colocated_variant, indent=1)
-                    output_splitter(indent=1)
-
-            if 'transcript_consequences' in result:
-                print(
-                    colored(f"Transcript consequences ({len(result['transcript_consequences'])}{' / only canonical shown' if not all_transcripts else ''}):", 'cyan'))
-                for transcript_consequence in result['transcript_consequences']:
-                    if all_transcripts or (not all_transcripts and 'canonical' in transcript_consequence and transcript_consequence['canonical'] == 1):
-                        if enrich_transcripts:
-                            transcript_consequence = enrich_transcript(
-                                transcript_consequence)
-                        output_transcript(transcript_consequence, indent=1)
-                        output_splitter(indent=1)
+        if enrich_transcripts:
+            results = enrich_transcripts_of(results)
+        if vrs:
+            results = calculate_vrs(results)
+
+        if output_format in ['text', 'tsv']:
+            from bioinfo_toolset.modules.renderer import renderer
+            out = renderer(output_format, output_path, details=details, all_transcripts=all_transcripts,
+                           lift=lift if _liftover else None, flush=stream)
+        else:
+            from bioinfo_toolset.modules.writer import writer
+            out = writer(output_format, output_path)
+        with out:
+            for result in results:
+                out.write(result)
 
     except Exception as ex:
         log.error(ex)
@@ -299,13 +288,120 @@ cli.add_command(vep)
 @click.command()
 @click.argument('release', type=str)
 @click.option('--force', '-f', 'force', is_flag=True, help='Forces update of cache even if a former cache is already there.')
-def populate_cache(release, force):
+@click.option('--jobs', '-j', 'jobs', default=None, type=click.IntRange(min=1), help='Number of files downloaded at the same time (default BIT_DOWNLOAD_WORKERS)')
+def populate_cache(release, force, jobs):
+    from bioinfo_toolset.modules.vep_offline import OfflineVep
+    from bioinfo_toolset.modules.download import DOWNLOAD_WORKERS
     offline_vep = OfflineVep()
-    offline_vep.populate_cache(release, force)
+    offline_vep.populate_cache(release, force, jobs or DOWNLOAD_WORKERS)
 
 
 cli.add_command(populate_cache)
 
 
+@click.command()
+@click.option('--socket', '-s', 'socket_path', default=None, type=click.Path(), help='Unix socket to listen on (default BIT_SERVER_SOCKET)')
+@click.option('--port', '-p', 'port', default=None, type=int, help='Listen on http://127.0.0.1:PORT instead of a Unix socket')
+@click.option('--pool-size', '-n', 'pool_size', default=None, type=click.IntRange(min=1), help='Number of warm VEP containers (default BIT_VEP_POOL_SIZE or 2)')
+@click.option('--cache', '-c', 'use_cache', is_flag=True, help='Serve already annotated variants from the local annotation cache')
+@click.option('--batch-size', 'batch_size', default=None, type=click.IntRange(min=1), help='Maximal number of lines per VEP run (default BIT_SERVER_BATCH_SIZE)')
+@click.option('--batch-delay', 'batch_delay', default=None, type=float, help='Seconds a request waits for others to join its batch (default BIT_SERVER_BATCH_DELAY)')
+def serve(socket_path, port, pool_size, use_cache, batch_size, batch_delay):
+    """Runs the offline VEP daemon, which batches the requests of `bit vep --server` clients."""
+    from bioinfo_toolset.modules import server
+    from bioinfo_toolset.modules.vep_offline import OfflineVep, POOL_SIZE
+    result_cache = None
+    if use_cache:
+        from bioinfo_toolset.modules.cache import AnnotationCache
+        result_cache = AnnotationCache()
+    pool_size = pool_size or POOL_SIZE or 2
+    service = server.Service(
+        OfflineVep(pool_size=pool_size),
+        result_cache,
+        batch_size or server.SERVER_BATCH_SIZE,
+        server.SERVER_BATCH_DELAY if batch_delay is None else batch_delay,
+        # one batch per warm container
+        pool_size
+    )
+    server.serve(service, socket_path or server.SERVER_SOCKET, port)
+
+
+cli.add_command(serve)
+
+
+@click.command()
+@click.argument('release', type=str, required=False, default=None)
+def invalidate_cache(release):
+    """Removes the cached annotations of RELEASE (or all cached annotations)."""
+    from bioinfo_toolset.modules.cache import AnnotationCache
+    removed = AnnotationCache().invalidate(release)
+    log.info(f"Removed {removed} cached annotations.")
+
+
+cli.add_command(invalidate_cache)
+
+
+@click.group()
+def store():
+    """Local annotation store, queried by region."""
+    pass
+
+
+@click.command('ingest')
+@click.argument('input', type=click.Path())
+def store_ingest(input):
+    """Stores the VEP results of a jsonl file (- for stdin), e.g. written by `bit vep -f jsonl`."""
+    from bioinfo_toolset.modules.store import STORE_BATCH_SIZE, get_store
+    from bioinfo_toolset.modules.vep_result import LazyResult
+    # the input is merged into the store in batches of STORE_BATCH_SIZE results per assembly
+    batches = {}
+    stored = {}
+
+    def flush(assembly):
+        stored[assembly] = stored.get(assembly, 0) + get_store(assembly).ingest(batches.pop(assembly))
+
+    with click.open_file(input, 'rb') as inf:
+        for line in inf:
+            if line.strip():
+                result = LazyResult(line)
+                batch = batches.setdefault(result['assembly_name'], [])
+                batch.append(result)
+                if len(batch) >= STORE_BATCH_SIZE:
+                    flush(result['assembly_name'])
+    for assembly in list(batches):
+        flush(assembly)
+    for assembly, count in stored.items():
+        log.info(f"Stored {count} {assembly} annotations.")
+
+
+store.add_command(store_ingest)
+
+
+@click.command('query')
+@click.option('--GRCh37', '--grch37', '--old', '-o', 'GRCh37', is_flag=True, help="Query the GRCh37 annotations")
+@click.option('--all-transcripts', '-a', 'all_transcripts', is_flag=True, help='Show all transcripts, not only the canonical ones')
+@click.option('--details', '-d', 'details', is_flag=True, help='Outputs all values of variant and transcript got from VEP.')
+@click.option('--output-format', '-f', 'output_format', default='text', type=Choice(['text', 'tsv', 'jsonl', 'parquet', 'arrow']), help='Format of the results, as of bit vep')
+@click.option('--output', '-O', 'output', default=None, type=click.Path(), help='Output file for text, tsv and jsonl (default stdout) or directory for parquet and arrow')
+@click.argument('region', type=str)
+def store_query(region, GRCh37, all_transcripts, details, output_format, output):
+    """Outputs the stored annotations overlapping REGION (e.g. 17:7570000-7590000)."""
+    from bioinfo_toolset.modules.store import get_store
+    results = get_store('GRCh37' if GRCh37 else 'GRCh38').query(region)
+    if output_format in ['text', 'tsv']:
+        from bioinfo_toolset.modules.renderer import renderer
+        out = renderer(output_format, output, details=details, all_transcripts=all_transcripts)
+    else:
+        from bioinfo_toolset.modules.writer import writer
+        out = writer(output_format, output)
+    with out:
+        for result in results:
+            out.write(result)
+
+
+store.add_command(store_query)
+cli.add_command(store)
+
+
 if __name__ == '__main__':
     cli()
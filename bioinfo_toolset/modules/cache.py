@@ -0,0 +1,202 @@
+import hashlib
+import json
+import re
+import sqlite3
+from os import environ, makedirs
+from os.path import join, dirname, expanduser
+from pathlib import Path
+from threading import Lock
+from time import time
+
+from friendlylog import colored_logger as log
+
+from bioinfo_toolset.modules.normalize import trim_vcf
+from bioinfo_toolset.modules.vep_result import decode, dumps
+
+CACHE_FILE = expanduser(environ.get('BIT_CACHE_FILE', join(
+    Path.home(), '.bit', 'annotations.sqlite')))
+# Maximal size of the cached annotations in bytes
+CACHE_MAX_SIZE = int(environ.get('BIT_CACHE_MAX_SIZE', 2 * 1024 ** 3))
+
+RE_CHR_PREFIX = re.compile(r'^chr', flags=re.I)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS annotations (
+    key TEXT PRIMARY KEY,
+    release TEXT NOT NULL,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS annotations_accessed ON annotations (accessed);
+CREATE INDEX IF NOT EXISTS annotations_release ON annotations (release);
+-- the total size of the annotations, kept up to date by the triggers
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT INTO meta (name, value)
+    SELECT 'size', (SELECT COALESCE(SUM(size), 0) FROM annotations)
+    WHERE NOT EXISTS (SELECT 1 FROM meta WHERE name = 'size');
+CREATE TRIGGER IF NOT EXISTS annotations_insert AFTER INSERT ON annotations BEGIN
+    UPDATE meta SET value = value + NEW.size WHERE name = 'size';
+END;
+CREATE TRIGGER IF NOT EXISTS annotations_delete AFTER DELETE ON annotations BEGIN
+    UPDATE meta SET value = value - OLD.size WHERE name = 'size';
+END;
+CREATE TRIGGER IF NOT EXISTS annotations_update AFTER UPDATE OF size ON annotations BEGIN
+    UPDATE meta SET value = value - OLD.size + NEW.size WHERE name = 'size';
+END;
+"""
+
+
+def normalize_input(input: str, input_type: str):
+    """
+    Normalizes a VEP input so that equal variants written differently
+    (chr prefix, whitespace, allele case, padding bases) get the same cache
+    key. Indels are aligned by the callers which have the reference, see
+    normalize.normalize_vcf_lines. VEP also takes ids and hgvs in vcf input,
+    those lines are only stripped.
+    """
+    fields = input.split()
+    if input_type == 'vcf' and len(fields) >= 5:
+        fields[0] = RE_CHR_PREFIX.sub('', fields[0])
+        fields[3] = fields[3].upper()
+        fields[4] = fields[4].upper()
+        if fields[1].isdigit() and fields[3].isalpha() and fields[4].isalpha():
+            position, fields[3], fields[4] = trim_vcf(int(fields[1]), fields[3], fields[4])
+            fields[1] = str(position)
+        return '\t'.join(fields[:5])
+    return RE_CHR_PREFIX.sub('', input.strip())
+
+
+class AnnotationCache():
+    """
+    Persistent cache of VEP annotations. Entries are keyed by the normalized
+    variant, the assembly, the VEP release and the option set. The least
+    recently used entries are evicted once the cache grows over `max_size` bytes.
+    """
+
+    def __init__(self, file=CACHE_FILE, max_size=CACHE_MAX_SIZE):
+        makedirs(dirname(file) or '.', exist_ok=True)
+        self.max_size = max_size
+        self.lock = Lock()
+        self.connection = sqlite3.connect(file, check_same_thread=False)
+        # rows replaced by INSERT OR REPLACE fire the delete trigger
+        self.connection.execute('PRAGMA recursive_triggers = ON')
+        self.connection.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(input: str, input_type: str, assembly: str, release: str, options: dict = None):
+        blob = json.dumps([normalize_input(input, input_type), input_type, assembly,
+                           str(release), options or {}], sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def get_many(self, keys):
+        keys = list(set(keys))
+        ret = {}
+        with self.lock:
+            # stay below sqlite's limit of host parameters per statement
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ','.join('?' * len(chunk))
+                for key, value in self.connection.execute(
+                        f"SELECT key, value FROM annotations WHERE key IN ({marks})", chunk):
+                    ret[key] = decode(value)
+                self.connection.execute(
+                    f"UPDATE annotations SET accessed = ? WHERE key IN ({marks})", [time()] + chunk)
+            self.connection.commit()
+            self.hits += len(ret)
+            self.misses += len(keys) - len(ret)
+        return ret
+
+    def put_many(self, values: dict, release: str):
+        now = time()
+        rows = []
+        for key, value in values.items():
+            blob = dumps(value)
+            rows.append((key, str(release), blob, len(blob), now))
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO annotations (key, release, value, size, accessed) VALUES (?, ?, ?, ?, ?)", rows)
+            self.connection.commit()
+        self.evict()
+
+    def __size(self):
+        return self.connection.execute(
+            "SELECT value FROM meta WHERE name = 'size'").fetchone()[0]
+
+    def size(self):
+        with self.lock:
+            return self.__size()
+
+    def evict(self, max_size=None):
+        """Removes the least recently used entries until the cache fits into max_size bytes."""
+        max_size = self.max_size if max_size is None else max_size
+        with self.lock:
+            excess = self.__size() - max_size
+            if excess <= 0:
+                return 0
+            keys = []
+            for key, size in self.connection.execute(
+                    "SELECT key, size FROM annotations ORDER BY accessed"):
+                keys.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            self.connection.executemany(
+                "DELETE FROM annotations WHERE key = ?", keys)
+            self.connection.commit()
+        log.debug(f"Evicted {len(keys)} entries from the annotation cache.")
+        return len(keys)
+
+    def invalidate(self, release=None):
+        """Removes all entries of the given release or everything if no release is given."""
+        with self.lock:
+            if release is None:
+                cursor = self.connection.execute("DELETE FROM annotations")
+            else:
+                cursor = self.connection.execute(
+                    "DELETE FROM annotations WHERE release = ?", (str(release),))
+            self.connection.commit()
+        return cursor.rowcount
+
+    def annotate(self, inputs: list, key, annotate, release: str, input_of=lambda input: input):
+        """
+        Returns the annotations of the inputs in input order. Cached annotations
+        are served directly, only the missing inputs are passed (deduplicated)
+        to `annotate`. Results are matched to their input by `result['input']`,
+        which must equal `input_of(input)`.
+        """
+        keys = [key(input) for input in inputs]
+        results = self.get_many(keys)
+
+        # one input per missing key is annotated, the others share its result
+        misses = {}
+        missing = set()
+        for input, _key in zip(inputs, keys):
+            if _key not in results and _key not in missing:
+                missing.add(_key)
+                misses.setdefault(input_of(input), (input, _key))
+        if misses:
+            fresh = {}
+            for result in annotate([input for input, _ in misses.values()]):
+                if result.get('input') in misses:
+                    fresh[misses[result['input']][1]] = result
+            self.put_many(fresh, release)
+            results.update(fresh)
+
+        ret = []
+        for input, _key in zip(inputs, keys):
+            if _key in results:
+                # copies of lazy results share the line until they are decoded
+                result = results[_key].copy()
+                result['input'] = input_of(input)
+                ret.append(result)
+        return ret
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -1,19 +1,47 @@
-from Bio.PDB.Polypeptide import three_to_one as biopython_three_to_one, one_to_three as biopython_one_to_three, aa3
+from functools import lru_cache
 import re
 
+# Built from biopython on first use (see _three_letter_regex), importing Bio is slow
+THREE_TO_ONE = {}
+# one case insensitive pass over all three letter codes instead of one re.sub per amino acid
+RE_THREE_LETTER = None
+RE_ONE_LETTER = re.compile(
+    r'(?P<prefix>p.)?(?P<from>[ACDEFGHIKLMNPQRSTVWY])(?P<codon>[0-9]+)(?P<to>[ACDEFGHIKLMNPQRSTVWY])(?P<postfix>.*)')
+# joins strings for batch conversion, it cannot be part of a three letter code
+BATCH_SEP = '\n'
 
+
+def _three_letter_regex():
+    global RE_THREE_LETTER
+    if RE_THREE_LETTER is None:
+        from Bio.PDB.Polypeptide import three_to_one as biopython_three_to_one, aa3
+        THREE_TO_ONE.update(
+            {aa_name: biopython_three_to_one(aa_name) for aa_name in aa3})
+        RE_THREE_LETTER = re.compile('|'.join(aa3), flags=re.I)
+    return RE_THREE_LETTER
+
+
+def _one_letter(match):
+    return THREE_TO_ONE[match.group(0).upper()]
+
+
+@lru_cache(maxsize=4096)
 def three_to_one(three_letter_string: str):
-    converted = three_letter_string
-    for aa_name in aa3:
-        converted = re.sub(aa_name, biopython_three_to_one(
-            aa_name), converted, flags=re.I)
-    return converted
+    return _three_letter_regex().sub(_one_letter, three_letter_string)
+
+
+def three_to_one_many(three_letter_strings: list):
+    """Converts a list of strings (e.g. HGVS.p) with a single regex pass."""
+    if not three_letter_strings:
+        return []
+    return _three_letter_regex().sub(_one_letter, BATCH_SEP.join(three_letter_strings)).split(BATCH_SEP)
 
 
+@lru_cache(maxsize=4096)
 def one_to_three(one_letter_string: str):
-    match = re.search(
-        r'(?P<prefix>p.)?(?P<from>[ACDEFGHIKLMNPQRSTVWY])(?P<codon>[0-9]+)(?P<to>[ACDEFGHIKLMNPQRSTVWY])(?P<postfix>.*)', one_letter_string)
+    match = RE_ONE_LETTER.search(one_letter_string)
     if match:
+        from Bio.PDB.Polypeptide import one_to_three as biopython_one_to_three
         _from = biopython_one_to_three(match.group('from')).capitalize()
         _to = biopython_one_to_three(match.group('to')).capitalize()
         return f"{match.group('prefix') if match.group('prefix') else ''}{_from}{match.group('codon')}{_to}{match.group('postfix') if match.group('postfix') else ''}"
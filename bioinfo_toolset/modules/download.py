@@ -0,0 +1,203 @@
+import gzip
+import hashlib
+import re
+import shutil
+import subprocess
+import tarfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from os import environ, makedirs, remove, replace
+from os.path import basename, exists, getsize, join
+from pathlib import Path
+
+import requests
+from friendlylog import colored_logger as log
+
+# Number of files downloaded at the same time
+DOWNLOAD_WORKERS = int(environ.get('BIT_DOWNLOAD_WORKERS', 4))
+# Bytes read and written at once while downloading, verifying and extracting
+CHUNK_SIZE = 1024 * 1024
+# Bytes summed at once by the pure python checksum
+SUM_CHUNK_SIZE = 16 * 1024 * 1024
+TIMEOUT = 60
+# Ensembl publishes the checksums of every directory in one of these files
+CHECKSUM_FILES = ['CHECKSUMS', 'MD5SUM']
+RE_MD5 = re.compile(r'[0-9a-f]{32}')
+# refuse absolute paths and links out of the target directory where supported
+EXTRACT_ARGS = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+
+
+def file_name(url: str):
+    return url.rstrip('/').rsplit('/', 1)[-1]
+
+
+def marker(dir: str, url: str):
+    """The file marking that url has been downloaded, verified and extracted into dir."""
+    return Path(join(dir, f".{file_name(url)}.done"))
+
+
+@lru_cache(maxsize=None)
+def checksums(directory: str):
+    """
+    Returns {file name: (algorithm, checksum)} of the checksum file of a
+    directory url. CHECKSUMS files hold the output of sum (BSD checksum and
+    1 KiB blocks), MD5SUM files the output of md5sum.
+    """
+    for name in CHECKSUM_FILES:
+        resp = requests.get(f"{directory}/{name}", timeout=TIMEOUT)
+        if resp.status_code == 404:
+            continue
+        resp.raise_for_status()
+        ret = {}
+        for line in resp.text.splitlines():
+            fields = line.split()
+            if len(fields) == 2 and RE_MD5.fullmatch(fields[0]):
+                ret[fields[1].lstrip('*')] = ('md5', fields[0])
+            elif len(fields) == 3 and fields[0].isdigit() and fields[1].isdigit():
+                ret[fields[2]] = ('sum', f"{int(fields[0])} {int(fields[1])}")
+        return ret
+    return {}
+
+
+@lru_cache(maxsize=None)
+def rotations():
+    """
+    The BSD checksum rotated right by one bit, indexed by the checksum plus
+    the last added byte, so the sum loop needs neither shifts nor a mask.
+    """
+    return [((value & 0xffff) >> 1) | ((value & 1) << 15) for value in range(0x10000 + 0x100)]
+
+
+def bsd_sum(file: str):
+    """Returns the BSD checksum and the number of 1 KiB blocks of a file like sum does."""
+    if shutil.which('sum'):
+        fields = subprocess.run(['sum', file], check=True,
+                                capture_output=True, text=True).stdout.split()
+        return f"{int(fields[0])} {int(fields[1])}"
+    # every step depends on the carry of the previous one, so the bytes are
+    # summed one by one, with a table lookup instead of the bit operations
+    rotate = rotations()
+    checksum = 0
+    size = 0
+    with open(file, 'rb') as inf:
+        for chunk in iter(lambda: inf.read(SUM_CHUNK_SIZE), b''):
+            size += len(chunk)
+            for byte in chunk:
+                checksum = rotate[checksum] + byte
+    return f"{checksum & 0xffff} {(size + 1023) // 1024}"
+
+
+def file_checksum(file: str, algorithm: str):
+    if algorithm == 'sum':
+        return bsd_sum(file)
+    md5 = hashlib.md5()
+    with open(file, 'rb') as inf:
+        for chunk in iter(lambda: inf.read(CHUNK_SIZE), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def download(url: str, file: str, expected: tuple = None, position: int = 0):
+    """
+    Downloads url to file. The data is written to file.part, an interrupted
+    download is resumed with a range request. The file is only moved into
+    place once it matches the expected (algorithm, checksum).
+    """
+    from tqdm import tqdm
+    part = f"{file}.part"
+    offset = getsize(part) if exists(part) else 0
+    headers = {'Range': f"bytes={offset}-"} if offset else {}
+    with requests.get(url, headers=headers, stream=True, timeout=TIMEOUT) as resp:
+        # 416: the part file is already complete
+        if resp.status_code != 416:
+            resp.raise_for_status()
+            if resp.status_code != 206:
+                # the server ignored the range, start over
+                offset = 0
+            total = int(resp.headers.get('Content-Length', 0)) + offset
+            with open(part, 'ab' if offset else 'wb') as outf, \
+                    tqdm(desc=file_name(url), total=total or None, initial=offset, unit='B',
+                         unit_scale=True, position=position, disable=None) as pbar:
+                for chunk in resp.raw.stream(CHUNK_SIZE, decode_content=False):
+                    outf.write(chunk)
+                    pbar.update(len(chunk))
+    if expected is not None:
+        algorithm, checksum = expected
+        actual = file_checksum(part, algorithm)
+        if actual != checksum:
+            remove(part)
+            raise Exception(
+                f"Checksum mismatch of {url}: expected {checksum}, got {actual} ({algorithm})")
+    replace(part, file)
+
+
+def extract(file: str, dir: str):
+    """
+    Extracts a .tar(.gz) or .gz file into dir. Archives are streamed, so the
+    memory used does not depend on their size.
+    """
+    name = basename(file)
+    if re.search(r'\.(tar|tar\.gz|tgz)$', name):
+        log.info(f"Untar {file} to {dir}...")
+        with tarfile.open(file, 'r|*') as tar:
+            tar.extractall(dir, **EXTRACT_ARGS)
+    elif name.endswith('.gz'):
+        target = join(dir, name[:-3])
+        log.info(f"Gunzip {file} to {target}...")
+        with gzip.open(file, 'rb') as inf, open(f"{target}.part", 'wb') as outf:
+            shutil.copyfileobj(inf, outf, CHUNK_SIZE)
+        replace(f"{target}.part", target)
+
+
+def install(url: str, dir: str, force: bool = False, position: int = 0, extractor=None):
+    """
+    Downloads, verifies and extracts url into dir and removes the archive.
+    A custom `extractor(file, dir)` takes over the downloaded file instead,
+    which is then kept. Returns False if the completion marker of url shows it
+    is already installed.
+    """
+    done = marker(dir, url)
+    if done.is_file() and not force:
+        log.info(f"{file_name(url)} is already installed, skipping.")
+        return False
+    file = join(dir, file_name(url))
+    if force:
+        for stale in [file, f"{file}.part"]:
+            if exists(stale):
+                remove(stale)
+    # a complete archive is left over if the extraction was interrupted
+    if not exists(file):
+        expected = checksums(url.rsplit('/', 1)[0]).get(file_name(url))
+        if expected is None:
+            log.warning(f"No checksum published for {url}, it is not verified.")
+        download(url, file, expected, position)
+    if extractor is None:
+        extract(file, dir)
+        remove(file)
+    else:
+        extractor(file, dir)
+    done.touch()
+    return True
+
+
+def install_all(urls: list, dir: str, workers: int = DOWNLOAD_WORKERS, force: bool = False, extractors: dict = None):
+    """
+    Installs the urls into dir with up to `workers` concurrent downloads.
+    `extractors` maps urls to custom extractors (see install). A failing file
+    does not stop the others, the failures are raised together.
+    """
+    extractors = extractors or {}
+    makedirs(dir, exist_ok=True)
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(install, url, dir, force, position, extractors.get(url)): url
+                   for position, url in enumerate(urls)}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as ex:
+                log.error(f"Cannot install {futures[future]}: {ex}")
+                failed.append(futures[future])
+    if failed:
+        raise Exception(
+            f"Cannot install {', '.join(failed)}, run again to resume.")
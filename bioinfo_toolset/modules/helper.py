@@ -1,5 +1,6 @@
 import json
-import yaml
+from collections import OrderedDict
+from threading import Lock
 
 
 def filter_dict(d):
@@ -22,6 +23,7 @@ def dj(o):
 
 def dy(fns, o):
     """execute function f in fns on o, returning a yaml block representing the test"""
+    import yaml
     r = {
         "in": o.as_dict(),
         "out": {f.__name__: as_str(f(o)) for f in fns}
@@ -33,3 +35,38 @@ def dy(fns, o):
 def inverse(_string: str):
     """invert a string: ex. ACT => TCA"""
     return _string[::-1]
+
+
+class LRUCache():
+    """Thread safe, bounded least recently used cache that counts its hits and misses."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.data:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return self.data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.data), 'maxsize': self.maxsize}
@@ -1,11 +1,10 @@
 import re
 import traceback
+from functools import lru_cache
+from typing import NamedTuple, Optional
 
-from hgvs.edit import Dup, Inv, NARefAlt
-from hgvs.parser import Parser
-
-from bioinfo_toolset.modules.vrs import VRS
-from bioinfo_toolset.modules.lookup import complement_allele_lookup
+from bioinfo_toolset.modules.reference import allele_at_position
+from bioinfo_toolset.modules.sequence import complement, reverse_complement
 
 from friendlylog import colored_logger as log
 
@@ -41,18 +40,126 @@ AC_MAP = {
 }
 
 RE_HGVS_G = r'([1-9]{1}(?:[0-9]{1})?|[XY]{1}):g\.(=|_|con|copy|del|dup|ins|inv|[0-9])'
+# Simple SNVs, deletions, insertions and delins, which do not need the grammar
+RE_HGVS_G_SIMPLE = re.compile(
+    r'(?P<chromosome>[1-9][0-9]?|[XY]):g\.(?P<start>[0-9]+)(?:'
+    r'(?P<ref>[ACGTNacgtn])>(?P<alt>[ACGTNacgtn])'
+    r'|(?:_(?P<end>[0-9]+))?(?:del(?P<deleted>[ACGTNacgtn]*)(?:ins(?P<inserted>[ACGTNacgtn]+))?'
+    r'|ins(?P<insertion>[ACGTNacgtn]+)))')
 RE_HGVS_C = r'(?:c\.)?(?P<position>[^ACTG]+)(?P<from_allele>[ACTG]+)>(?P<to_allele>[ACTG]+)'
+# The transcript change nomenclatures (substitution, change with alleles,
+# change without alleles), tried in order until one can be converted
 RE_TRANS_C = [
-    r'(?:c\.)?(?P<position>[^ACTG]+)(?P<from_allele>[ACTG]+)>(?P<to_allele>[ACTG]+)',
-    r'(?:c\.)?(?P<position>[0-9]+(?:_[0-9]+)?)(?P<type>(ins|delins|del|dub|inv|>))(?P<to_allele>[ACTG]+)',
-    r'(?:c\.)?(?P<position>[0-9+-]+(?:_[0-9+-]+)?)(?P<type>(del|dup|inv))(?P<num_alleles>[0-9]*)'
+    ('substitution', re.compile(r'(?:c\.)?(?P<position>[^ACTG]+)(?P<from_allele>[ACTG]+)>(?P<to_allele>[ACTG]+)')),
+    ('edit', re.compile(r'(?:c\.)?(?P<position>[0-9]+(?:_[0-9]+)?)(?P<type>ins|delins|del|dub|inv|>)(?P<to_allele>[ACTG]+)')),
+    ('range', re.compile(r'(?:c\.)?(?P<position>[0-9+-]+(?:_[0-9+-]+)?)(?P<type>del|dup|inv)(?P<num_alleles>[0-9]*)'))
 ]
+# A transcript position with an optional intronic offset, e.g. 673-2
+RE_TRANS_POSITION = re.compile(r'([+-]?[0-9]+)([+-][0-9]+)?')
 RE_POS_DELIM = r'_'
 
 
+class TranscriptChange(NamedTuple):
+    """A parsed transcript change, kind is one of 'substitution', 'edit' (with alleles) or 'range'."""
+    kind: str
+    position: str
+    length: Optional[int]
+    type: str
+    from_allele: str
+    to_allele: str
+    num_alleles: str
+
+
+def transcript_position(position: str):
+    """Returns the value of a transcript position, intronic offsets are added (673-2 -> 671)."""
+    match = RE_TRANS_POSITION.fullmatch(position)
+    if not match:
+        raise ValueError(f"Invalid transcript position {position}")
+    return int(match.group(1)) + int(match.group(2) or 0)
+
+
+@lru_cache(maxsize=4096)
+def transcript_change_candidates(transcript_change: str):
+    """
+    Returns a TranscriptChange for every nomenclature the transcript change
+    matches with valid positions, in the order of RE_TRANS_C.
+    """
+    ret = []
+    for kind, rex in RE_TRANS_C:
+        match = rex.match(transcript_change)
+        if not match:
+            continue
+        groups = match.groupdict()
+        position = groups['position']
+        length = None
+        if '_' in position:
+            try:
+                start, end = map(transcript_position, re.split(RE_POS_DELIM, position))
+            except ValueError as ex:
+                log.debug(ex)
+                continue
+            length = end - start
+        ret.append(TranscriptChange(kind, position, length, groups.get('type', '>'), groups.get('from_allele', ''),
+                                    groups.get('to_allele', ''), groups.get('num_alleles', '')))
+    return tuple(ret)
+
+
+def parse_transcript_change(transcript_change: str):
+    """
+    Parses a transcript change like c.1642_1643delinsGC into a
+    TranscriptChange. Returns None if no nomenclature matches.
+    """
+    candidates = transcript_change_candidates(transcript_change)
+    return candidates[0] if candidates else None
+
+
+def parse_simple_g(hgvs_str: str):
+    """
+    Parses a simple hgvs g string (SNV, del, ins, delins) without the hgvs
+    grammar into the same dict as Hgvs.parse. Returns None for any other syntax.
+    """
+    match = RE_HGVS_G_SIMPLE.fullmatch(hgvs_str)
+    if not match or match.group('chromosome') not in AC_MAP:
+        return None
+    chromosome = match.group('chromosome')
+    start = int(match.group('start'))
+    end = int(match.group('end')) if match.group('end') else start
+    if match.group('alt') is not None:
+        ref, alt = match.group('ref'), match.group('alt')
+    elif match.group('insertion') is not None:
+        ref, alt = None, match.group('insertion')
+    elif match.group('inserted') is not None:
+        ref, alt = match.group('deleted'), match.group('inserted')
+    elif start <= end:
+        ref, alt = match.group('deleted'), None
+    else:
+        return None
+    return {
+        'chromosome': chromosome,
+        'start': start,
+        'end': end,
+        'ref': ref,
+        'alt': alt,
+        'region': f"{chromosome}:{start}-{end}/{alt if alt else 'DEL'}",
+        'identifier': f"{chromosome}_{start}_{end}{'_' + ref if ref else ''}_{'-/' + alt if start > end else alt if alt else 'DEL'}"
+    }
+
+
+def parse_transcript_changes(transcript_changes):
+    """Parses a column of transcript changes, unparsable changes are None."""
+    return [parse_transcript_change(transcript_change) for transcript_change in transcript_changes]
+
+
 class Hgvs:
-    hgvsparser = Parser()
-    vrs = VRS()
+    # the hgvs grammar is expensive to build and is created on first use
+    hgvsparser = None
+
+    @classmethod
+    def parser(cls):
+        if cls.hgvsparser is None:
+            from hgvs.parser import Parser
+            cls.hgvsparser = Parser()
+        return cls.hgvsparser
 
     @staticmethod
     def __refseq_g_accession(hgvs_g_str):
@@ -61,71 +168,67 @@ class Hgvs:
 
     @classmethod
     def from_transcript_change(cls, chromosome: str, position: int, transcript_change: str, GRCh37: bool = False):
-        for rex in RE_TRANS_C:
-            if re.match(rex, transcript_change):
-                try:
-                    position = int(position)
-                    transcript_change_info = re.search(rex, transcript_change)
-                    if '_' in transcript_change_info.group('position'):
-                        start, end = list(map(lambda p: int(eval(p)), re.split(RE_POS_DELIM, transcript_change_info.group(
-                            'position'))))
-                        position_part = f"{position}_{position + end - start}"
+        for change in transcript_change_candidates(transcript_change):
+            try:
+                position = int(position)
+                if change.length is not None:
+                    position_part = f"{position}_{position + change.length}"
+                else:
+                    position_part = position
+                if change.kind == 'substitution':
+                    # we found a change nomenclature
+                    reference_allele = allele_at_position(
+                        'GRCh37' if GRCh37 else 'GRCh38', chromosome, position - 1, position - 1 + len(change.from_allele))
+                    complement_allele = complement(reference_allele)
+                    ref = reference_allele
+                    if change.from_allele == reference_allele:
+                        alt = change.to_allele
+                    elif inverse(change.from_allele) == reference_allele:
+                        alt = inverse(change.to_allele)
+                    # Sanity check it should then be the to_allele
+                    elif change.from_allele == complement_allele:
+                        # we need to invert the values (because its on the backwards strand)
+                        alt = complement(change.to_allele)
+                    elif inverse(change.from_allele) == complement_allele:
+                        alt = reverse_complement(change.to_allele)
                     else:
-                        position_part = position
-                    if 'from_allele' in transcript_change_info.re.groupindex:
-                        # we found a change nomenclature
-                        reference_allele = cls.vrs.allele_at_position(
-                            'GRCh37' if GRCh37 else 'GRCh38', chromosome, position - 1, position - 1 + len(transcript_change_info.group('from_allele')))
-                        complement_allele = complement_allele_lookup(
+                        log.warning(
+                            f"Something must be wrong the from allele ({change.from_allele}) does neather correspond to the reference allele ({reference_allele}) not to the complement allele ({complement_allele}): {chromosome}:{position} {transcript_change}")
+                        ref = change.from_allele
+                        alt = change.to_allele
+
+                    return cls.parse(f"{chromosome}:g.{position_part}{ref}>{alt}")
+                # we found a insertion, deletion...
+                elif change.type in ['ins', 'delins']:
+                    # VEP requirement: An insertion (of any size) is indicated by start coordinate = end coordinate + 1
+                    position_part = f"{position + 1}_{position}"
+                    return cls.parse(f"{chromosome}:g.{position_part}{change.type}{change.to_allele}")
+                elif change.type in ['del', 'dup', 'inv']:
+                    if change.kind == 'edit':
+                        reference_allele = allele_at_position(
+                            'GRCh37' if GRCh37 else 'GRCh38', chromosome, position, position + len(change.to_allele))
+                        complement_allele = reverse_complement(
                             reference_allele)
-                        ref = reference_allele
-                        if transcript_change_info.group('from_allele') == reference_allele:
-                            alt = transcript_change_info.group(
-                                'to_allele')
-                        elif inverse(transcript_change_info.group('from_allele')) == reference_allele:
-                            alt = inverse(transcript_change_info.group(
-                                'to_allele'))
-                        # Sanity check it should then be the to_allele
-                        elif transcript_change_info.group('from_allele') == complement_allele:
-                            # we need to invert the values (because its on the backwards strand)
-                            alt = complement_allele_lookup(transcript_change_info.group(
-                                'to_allele'))
-                        elif inverse(transcript_change_info.group('from_allele')) == complement_allele:
-                            alt = inverse(complement_allele_lookup(transcript_change_info.group(
-                                'to_allele')))
-                        else:
-                            log.warning(
-                                f"Something must be wrong the from allele ({transcript_change_info.group('from_allele')}) does neather correspond to the reference allele ({reference_allele}) not to the complement allele ({complement_allele}): {chromosome}:{position} {transcript_change}")
-                            ref = transcript_change_info.group('from_allele')
-                            alt = transcript_change_info.group('to_allele')
-
-                        return cls.parse(f"{chromosome}:g.{position_part}{ref}>{alt}")
-                    elif 'type' in transcript_change_info.re.groupindex:
-                        # we found a insertion, deletion...
-                        if transcript_change_info.group('type') in ['ins', 'delins']:
-                            # VEP requirement: An insertion (of any size) is indicated by start coordinate = end coordinate + 1
-                            position_part = f"{position + 1}_{position}"
-                            return cls.parse(f"{chromosome}:g.{position_part}{transcript_change_info.group('type')}{transcript_change_info.group('to_allele')}")
-                        elif transcript_change_info.group('type') in ['del', 'dup', 'inv']:
-                            if 'to_allele' in transcript_change_info.re.groupindex:
-                                reference_allele = cls.vrs.allele_at_position(
-                                    'GRCh37' if GRCh37 else 'GRCh38', chromosome, position, position + len(transcript_change_info.group('to_allele')))
-                                complement_allele = complement_allele_lookup(inverse(cls.vrs.allele_at_position(
-                                    'GRCh37' if GRCh37 else 'GRCh38', chromosome, position, position + len(transcript_change_info.group('to_allele')))))
-                                if transcript_change_info.group('to_allele') == reference_allele:
-                                    position_part = f"{position + 1}_{position + len(transcript_change_info.group('to_allele'))}"
-                                elif transcript_change_info.group('to_allele') == complement_allele:
-                                    position_part = f"{position + 1}_{position + len(transcript_change_info.group('to_allele'))}"
-                            return cls.parse(f"{chromosome}:g.{position_part}{transcript_change_info.group('type')}")
-                        elif transcript_change_info.group('type') in ['>']:
-                            return cls.parse(f"{chromosome}:g.{position_part}delins{transcript_change_info.group('to_allele')}")
-                except Exception as ex:
-                    log.error(ex)
-                    traceback.print_exc()
+                        if change.to_allele == reference_allele:
+                            position_part = f"{position + 1}_{position + len(change.to_allele)}"
+                        elif change.to_allele == complement_allele:
+                            position_part = f"{position + 1}_{position + len(change.to_allele)}"
+                    return cls.parse(f"{chromosome}:g.{position_part}{change.type}")
+                elif change.type in ['>']:
+                    return cls.parse(f"{chromosome}:g.{position_part}delins{change.to_allele}")
+            except Exception as ex:
+                log.error(ex)
+                traceback.print_exc()
         log.error(
             f"Cannot get variant from {chromosome}:{position}:{transcript_change}: No regex matched.")
         return None
 
+    @classmethod
+    def from_transcript_changes(cls, changes, GRCh37: bool = False):
+        """Converts a column of (chromosome, position, transcript change) triples, see from_transcript_change."""
+        return [cls.from_transcript_change(chromosome, position, transcript_change, GRCh37)
+                for chromosome, position, transcript_change in changes]
+
     @ classmethod
     def parse_c(cls, hgvs_str):
         """Parses a hgvs c string. A hgvs string at the transcript level."""
@@ -141,9 +244,17 @@ class Hgvs:
     @ classmethod
     def parse(cls, hgvs_str):
         """Parses a hgvs g string. A hgvs string at the gene level."""
+        ret = parse_simple_g(hgvs_str)
+        if ret is not None:
+            return ret
+        return cls.parse_grammar(hgvs_str)
+
+    @ classmethod
+    def parse_grammar(cls, hgvs_str):
+        """Parses a hgvs g string with the full hgvs grammar."""
         if re.match(RE_HGVS_G, hgvs_str):
             try:
-                ret = cls.hgvsparser.parse(
+                ret = cls.parser().parse(
                     cls.__refseq_g_accession(hgvs_str))
 
                 # if isinstance(ret.posedit.edit, NARefAlt):
@@ -1,11 +1,254 @@
-from liftover import get_lifter
+import gzip
+import re
+from collections import defaultdict
+from functools import lru_cache
+from os import makedirs
+from os.path import expanduser, join, exists
+
+import numpy as np
+from friendlylog import colored_logger as log
+
+CHAIN_CACHE = expanduser('~/.liftover')
+CHAIN_URL = 'https://hgdownload.cse.ucsc.edu/goldenPath/{}/liftOver/{}'
+
+RE_CHR_PREFIX = re.compile(r'^chr', flags=re.I)
+
+
+def normalize_chromosome(chromosome):
+    return RE_CHR_PREFIX.sub('', str(chromosome))
+
+
+def chain_file(_from, to):
+    """Returns the path of the UCSC chain file from -> to, downloads it if missing."""
+    _from = _from[0].lower() + _from[1:]
+    to = to[0].upper() + to[1:]
+    basename = f"{_from}To{to}.over.chain.gz"
+    path = join(CHAIN_CACHE, basename)
+    if not exists(path):
+        from liftover.download_file import download_file
+        makedirs(CHAIN_CACHE, exist_ok=True)
+        log.info(f"Downloading {basename}...")
+        download_file(CHAIN_URL.format(_from, basename), path)
+    return path
+
+
+class ChainIndex():
+    """
+    Interval index over the aligned blocks of a chain file. Positions are
+    0-based (as in the liftover package). The blocks of every source
+    chromosome are kept in numpy arrays sorted by start, which are searched
+    with np.searchsorted.
+    """
+
+    def __init__(self, path):
+        self.chains = []
+        blocks = defaultdict(list)
+        with (gzip.open(path, 'rt') if path.endswith('.gz') else open(path, 'r')) as inf:
+            for line in inf:
+                fields = line.split()
+                if not fields:
+                    continue
+                if fields[0] == 'chain':
+                    t_pos, t_end = int(fields[5]), int(fields[6])
+                    q_pos, q_end = int(fields[10]), int(fields[11])
+                    chain_id = fields[12] if len(fields) > 12 else len(self.chains)
+                    chain = len(self.chains)
+                    # (query chromosome, query size, query strand)
+                    self.chains.append(
+                        (fields[7], int(fields[8]), fields[9]))
+                    current = blocks[normalize_chromosome(fields[2])]
+                else:
+                    size = int(fields[0])
+                    current.append((t_pos, t_pos + size, q_pos, chain))
+                    if len(fields) == 3:
+                        t_pos += size + int(fields[1])
+                        q_pos += size + int(fields[2])
+                    elif (t_pos + size, q_pos + size) != (t_end, q_end):
+                        # the last block has to end where the chain header says
+                        raise ValueError(f"Chain {chain_id} in {path} ends at "
+                                         f"{t_pos + size}/{q_pos + size} instead of {t_end}/{q_end}")
+
+        # query chromosome, size and strand per chain as arrays for lift()
+        self.q_chromosomes = np.array(
+            [chain[0] for chain in self.chains] + [''], dtype=object)
+        self.q_sizes = np.array([chain[1] for chain in self.chains] + [0], dtype=np.int64)
+        self.q_reverse = np.array(
+            [chain[2] == '-' for chain in self.chains] + [False])
+
+        self.index = {}
+        for chromosome, chrom_blocks in blocks.items():
+            chrom_blocks.sort()
+            starts, ends, q_starts, chains = (np.array(column, dtype=np.int64)
+                                              for column in zip(*chrom_blocks))
+            # running maximum of the block ends, to find overlapping blocks
+            max_ends = np.maximum.accumulate(ends)
+            self.index[chromosome] = (
+                starts, ends, max_ends, q_starts, chains)
+
+    def __blocks(self, chromosome, position):
+        """Returns (chain, block index) of all blocks containing the position, best chain first."""
+        if chromosome not in self.index:
+            return []
+        starts, ends, max_ends, _, chains = self.index[chromosome]
+        ret = []
+        i = int(np.searchsorted(starts, position, side='right')) - 1
+        while i >= 0 and max_ends[i] > position:
+            if ends[i] > position:
+                ret.append((int(chains[i]), i))
+            i -= 1
+        # chain files are sorted by score, so the first chain is the best one
+        return sorted(ret)
+
+    def __map(self, chromosome, chain, block, position):
+        starts, _, _, q_starts, _ = self.index[chromosome]
+        q_chromosome, q_size, q_strand = self.chains[chain]
+        q_position = int(q_starts[block]) + position - int(starts[block])
+        if q_strand == '-':
+            q_position = q_size - q_position - 1
+        return q_chromosome, q_position, q_strand
+
+    def lift(self, chromosome, positions):
+        """
+        Lifts an array of positions on one chromosome and returns the chain
+        index per position (-1 if unmapped) and the lifted positions.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        chains = np.full(len(positions), -1, dtype=np.int64)
+        lifted = np.full(len(positions), -1, dtype=np.int64)
+        chromosome = normalize_chromosome(chromosome)
+        if chromosome not in self.index or len(positions) == 0:
+            return chains, lifted
+        starts, ends, max_ends, q_starts, block_chains = self.index[chromosome]
+        blocks = np.searchsorted(starts, positions, side='right') - 1
+        safe = np.maximum(blocks, 0)
+        # without an overlapping earlier block, the block found is the only candidate
+        previous_end = np.where(blocks > 0, max_ends[np.maximum(blocks - 1, 0)], 0)
+        simple = previous_end <= positions
+        hit = simple & (blocks >= 0) & (ends[safe] > positions)
+        chains[hit] = block_chains[safe[hit]]
+        lifted[hit] = q_starts[safe[hit]] + positions[hit] - starts[safe[hit]]
+        reverse = hit & self.q_reverse[chains]
+        lifted[reverse] = self.q_sizes[chains[reverse]] - lifted[reverse] - 1
+        # overlapping blocks (rare) are resolved position by position
+        for i in np.flatnonzero(~simple):
+            matches = self.__blocks(chromosome, int(positions[i]))
+            if matches:
+                chain, block = matches[0]
+                chains[i] = chain
+                lifted[i] = self.__map(
+                    chromosome, chain, block, int(positions[i]))[1]
+        return chains, lifted
+
+    def query(self, chromosome, position: int):
+        """Returns all (chromosome, position, strand) matches of the position."""
+        chromosome = normalize_chromosome(chromosome)
+        return [self.__map(chromosome, chain, block, position)
+                for chain, block in self.__blocks(chromosome, position)]
+
+    def query_interval(self, chromosome, start: int, end: int):
+        """
+        Lifts the half open interval [start, end) and returns
+        (chromosome, start, end, strand) or None if start and end are not
+        mapped by the same chain.
+        """
+        chromosome = normalize_chromosome(chromosome)
+        last = max(start, end - 1)
+        end_blocks = dict(self.__blocks(chromosome, last))
+        for chain, block in self.__blocks(chromosome, start):
+            if chain in end_blocks:
+                q_chromosome, q_start, strand = self.__map(
+                    chromosome, chain, block, start)
+                _, q_last, _ = self.__map(
+                    chromosome, chain, end_blocks[chain], last)
+                return q_chromosome, min(q_start, q_last), max(q_start, q_last) + 1, strand
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_index(_from, to):
+    """Returns the chain index of an assembly pair, it is only built once per process."""
+    return ChainIndex(chain_file(_from, to))
+
+
+def liftover_array(_from, to, chromosomes, positions):
+    """
+    Lifts arrays of chromosomes and 0-based positions. Returns arrays of the
+    lifted chromosomes, positions and strands, unmapped positions get the
+    chromosome '', the position -1 and the strand ''.
+    """
+    index = get_index(_from, to)
+    chromosomes = np.asarray(chromosomes).astype(str)
+    positions = np.asarray(positions, dtype=np.int64)
+    chains = np.full(len(positions), -1, dtype=np.int64)
+    lifted = np.full(len(positions), -1, dtype=np.int64)
+    for chromosome in np.unique(chromosomes):
+        mask = chromosomes == chromosome
+        chains[mask], lifted[mask] = index.lift(chromosome, positions[mask])
+    # the extra last entry of the chain arrays stands for unmapped (-1)
+    strands = np.where(chains < 0, '', np.where(
+        index.q_reverse[chains], '-', '+')).astype(object)
+    return index.q_chromosomes[chains], lifted, strands
 
 
 def liftover(_from, to, chromosome, position):
-    converter = get_lifter(_from, to)
-    target = converter[chromosome][position]
-    if len(target) > 0:
-        return target[0][0].replace('chr', ''), int(target[0][1])
+    chromosomes, positions, _ = liftover_array(
+        _from, to, [str(chromosome)], [position])
+    if chromosomes[0]:
+        return chromosomes[0].replace('chr', ''), int(positions[0])
     else:
         raise ValueError(
             f"No conversion results found for chr{chromosome}:{position} ({_from} -> {to})")
+
+
+def liftover_interval(_from, to, chromosome, start, end):
+    target = get_index(_from, to).query_interval(chromosome, start, end)
+    if target is None:
+        raise ValueError(
+            f"No conversion results found for chr{chromosome}:{start}-{end} ({_from} -> {to})")
+    return target[0].replace('chr', ''), target[1], target[2]
+
+
+def lift_records(_from, to, lines, file_format='bed', unmapped=None):
+    """
+    Lifts the records of a BED (0-based, half open), VCF (1-based) or TSV
+    (chromosome, 1-based start and optional end) file line by line and yields
+    the lifted lines. Records that cannot be lifted are written to `unmapped`
+    (a writable file) if given. Header and comment lines are passed through.
+    """
+    index = get_index(_from, to)
+    for line in lines:
+        if line.startswith('#') or line.startswith('track') or line.startswith('browser') or not line.strip():
+            yield line
+            continue
+        fields = line.rstrip('\n').split('\t')
+        chromosome = fields[0]
+        if file_format == 'bed':
+            start, end = int(fields[1]), int(fields[2])
+        elif file_format == 'vcf':
+            start = int(fields[1]) - 1
+            end = start + len(fields[3])
+        else:
+            start = int(fields[1]) - 1
+            end = int(fields[2]) if len(fields) > 2 and fields[2].isdigit() else start + 1
+        target = index.query_interval(chromosome, start, end)
+        # alleles on the reverse strand cannot be lifted without the
+        # reference (the anchor base changes), so these are unmapped
+        if target is None or (file_format == 'vcf' and target[3] == '-'):
+            if unmapped is not None:
+                unmapped.write(line if line.endswith('\n') else line + '\n')
+            continue
+        q_chromosome, q_start, q_end, strand = target
+        # keep the chromosome naming of the input
+        fields[0] = q_chromosome if chromosome.lower().startswith(
+            'chr') else normalize_chromosome(q_chromosome)
+        if file_format == 'bed':
+            fields[1], fields[2] = str(q_start), str(q_end)
+            if strand == '-' and len(fields) > 5 and fields[5] in ('+', '-'):
+                fields[5] = '+' if fields[5] == '-' else '-'
+        elif file_format == 'vcf':
+            fields[1] = str(q_start + 1)
+        else:
+            fields[1] = str(q_start + 1)
+            if len(fields) > 2 and fields[2].isdigit():
+                fields[2] = str(q_end)
+        yield '\t'.join(fields) + '\n'
@@ -1,13 +1,5 @@
-_complement_allele_lookup = {
-    'A': 'T',
-    'C': 'G',
-    'G': 'C',
-    'T': 'A'
-}
+from bioinfo_toolset.modules.sequence import complement
 
 
 def complement_allele_lookup(reference_allele):
-    complement_allele = ''
-    for a in reference_allele:
-        complement_allele += _complement_allele_lookup[a]
-    return complement_allele
+    return complement(reference_allele)
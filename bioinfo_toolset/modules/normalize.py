@@ -0,0 +1,237 @@
+from typing import NamedTuple
+
+from friendlylog import colored_logger as log
+
+from bioinfo_toolset.modules.reference import RE_CHR_PREFIX
+
+# Bases read around an indel at once, the window grows if a shift runs past it
+WINDOW = 100
+SHIFTS = ['left', 'right']
+
+
+class Variant(NamedTuple):
+    """A normalized variant in VCF style: 1-based position, indels with their anchor base."""
+    chromosome: str
+    position: int
+    ref: str
+    alt: str
+
+    def key(self):
+        return f"{self.chromosome}-{self.position}-{self.ref}-{self.alt}"
+
+    def vcf(self, id='.'):
+        return '\t'.join([self.chromosome, str(self.position), id, self.ref, self.alt])
+
+
+def trim(position: int, ref: str, alt: str):
+    """
+    Removes the bases ref and alt share at their end, then at their start.
+    Returns the 0-based start and the remaining (possibly empty) alleles.
+    """
+    while ref and alt and ref[-1] == alt[-1]:
+        ref, alt = ref[:-1], alt[:-1]
+    prefix = 0
+    while prefix < len(ref) and prefix < len(alt) and ref[prefix] == alt[prefix]:
+        prefix += 1
+    return position - 1 + prefix, ref[prefix:], alt[prefix:]
+
+
+def trim_vcf(position: int, ref: str, alt: str):
+    """
+    Trims the bases ref and alt share at their end, then at their start, but
+    keeps one base of each as VCF does. No reference is needed for this.
+    """
+    while len(ref) > 1 and len(alt) > 1 and ref[-1] == alt[-1]:
+        ref, alt = ref[:-1], alt[:-1]
+    while len(ref) > 1 and len(alt) > 1 and ref[0] == alt[0]:
+        ref, alt = ref[1:], alt[1:]
+        position += 1
+    return position, ref, alt
+
+
+class Window():
+    """A stretch of one chromosome read by fetch(start, end) (0-based), extended on demand."""
+
+    def __init__(self, fetch, start: int, end: int):
+        self.fetch = fetch
+        self.start = max(0, start)
+        self.sequence = fetch(self.start, end).upper()
+        # a short read means the chromosome ends there
+        self.complete = len(self.sequence) < end - self.start
+
+    @property
+    def end(self):
+        return self.start + len(self.sequence)
+
+    def base(self, position: int):
+        """The base at the 0-based position, '' outside of the chromosome."""
+        if position < 0:
+            return ''
+        if position < self.start:
+            start = max(0, min(position, self.start - len(self.sequence)) - WINDOW)
+            self.sequence = self.fetch(start, self.start).upper() + self.sequence
+            self.start = start
+        elif position >= self.end and not self.complete:
+            end = max(position + 1, self.end + len(self.sequence)) + WINDOW
+            more = self.fetch(self.end, end).upper()
+            self.complete = len(more) < end - self.end
+            self.sequence += more
+        return self.sequence[position - self.start] if position < self.end else ''
+
+    def sequence_at(self, start: int, end: int):
+        """The bases of [start, end), the window is extended to cover them."""
+        if end <= start:
+            return ''
+        self.base(start)
+        self.base(end - 1)
+        return self.sequence[max(0, start - self.start):end - self.start]
+
+
+def shift_indel(start: int, ref: str, alt: str, window: Window, shift: str = 'left'):
+    """
+    Moves a trimmed indel (one allele empty) to its leftmost or rightmost
+    equivalent position by rotating the inserted or deleted bases.
+    """
+    deletion = bool(ref)
+    sequence = ref or alt
+    if shift == 'left':
+        while window.base(start - 1) == sequence[-1]:
+            sequence = sequence[-1] + sequence[:-1]
+            start -= 1
+    else:
+        # the base following the deleted bases or the insertion point
+        end = start + len(sequence) if deletion else start
+        while window.base(end) == sequence[0]:
+            sequence = sequence[1:] + sequence[0]
+            start += 1
+            end += 1
+    return (start, sequence, '') if deletion else (start, '', sequence)
+
+
+def normalize_in(chromosome: str, position: int, ref: str, alt: str, window: Window = None, shift: str = 'left'):
+    """Normalizes one variant, the window of its chromosome is only read for indels."""
+    start, ref, alt = trim(position, ref.upper(), alt.upper())
+    if ref and alt:
+        # substitutions have a single representation
+        return Variant(chromosome, start + 1, ref, alt)
+    if not ref and not alt:
+        raise ValueError(f"{chromosome}:{position} is not a variant, the alleles are equal")
+    if ref and window.sequence_at(start, start + len(ref)) != ref:
+        raise ValueError(
+            f"The reference allele {ref} does not match the reference {window.sequence_at(start, start + len(ref))} at {chromosome}:{start + 1}")
+    start, ref, alt = shift_indel(start, ref, alt, window, shift)
+    if start > 0:
+        anchor = window.base(start - 1)
+        return Variant(chromosome, start, anchor + ref, anchor + alt)
+    # at the start of the chromosome the following base is the anchor
+    anchor = window.base(start + len(ref))
+    return Variant(chromosome, 1, ref + anchor, alt + anchor)
+
+
+def reference_fetch(assembly: str, chromosome: str):
+    from bioinfo_toolset.modules.reference import allele_at_position
+    return lambda start, end: allele_at_position(assembly, chromosome, start, end)
+
+
+def normalize(chromosome: str, position: int, ref: str, alt: str, assembly: str = 'GRCh38', shift: str = 'left', fetch=None):
+    """
+    Returns the normalized Variant of a VCF style variant (1-based position):
+    the shared bases are trimmed and indels are left (or right, 3') aligned
+    against the reference of the assembly, the local fasta if installed,
+    the seqrepo otherwise.
+    """
+    chromosome = RE_CHR_PREFIX.sub('', str(chromosome))
+    fetch = fetch or reference_fetch(assembly, chromosome)
+    start = int(position) - 1
+    return normalize_in(chromosome, int(position), ref, alt,
+                        Window(fetch, start - WINDOW, start + len(ref) + WINDOW), shift)
+
+
+def normalize_many(variants, assembly: str = 'GRCh38', shift: str = 'left', fetch=None):
+    """
+    Normalizes (chromosome, position, ref, alt) tuples in bulk, in the input
+    order. Repeated variants are normalized once and neighbouring indels share
+    one read of the reference. Variants which cannot be normalized are None.
+    `fetch(chromosome, start, end)` replaces the reference of the assembly.
+    """
+    variants = [(RE_CHR_PREFIX.sub('', str(chromosome)), int(position), ref.upper(), alt.upper())
+                for chromosome, position, ref, alt in variants]
+    done = {}
+    indels = []
+    for variant in set(variants):
+        chromosome, position, ref, alt = variant
+        start, trimmed_ref, trimmed_alt = trim(position, ref, alt)
+        if trimmed_ref and trimmed_alt:
+            done[variant] = Variant(chromosome, start + 1, trimmed_ref, trimmed_alt)
+        else:
+            indels.append((chromosome, start, start + len(trimmed_ref), variant))
+
+    # indels less than two windows apart share one window
+    clusters = []
+    for chromosome, start, end, variant in sorted(indels):
+        if clusters and clusters[-1][0] == chromosome and start - clusters[-1][2] <= 2 * WINDOW:
+            clusters[-1][2] = max(clusters[-1][2], end)
+            clusters[-1][3].append(variant)
+        else:
+            clusters.append([chromosome, start, end, [variant]])
+    for chromosome, start, end, members in clusters:
+        chromosome_fetch = (lambda start, end, chromosome=chromosome: fetch(chromosome, start, end)) \
+            if fetch is not None else reference_fetch(assembly, chromosome)
+        try:
+            window = Window(chromosome_fetch, start - WINDOW, end + WINDOW)
+        except KeyError as ex:
+            # the reference does not have the contig (e.g. M for MT, decoys)
+            log.error(f"Cannot normalize the variants on {chromosome}: {ex}")
+            done.update(dict.fromkeys(members))
+            continue
+        for variant in members:
+            try:
+                done[variant] = normalize_in(*variant, window=window, shift=shift)
+            except (ValueError, KeyError) as ex:
+                log.error(ex)
+                done[variant] = None
+    return [done[variant] for variant in variants]
+
+
+def normalize_vcf_lines(lines, assembly: str = 'GRCh38', shift: str = 'left', fetch=None):
+    """
+    Returns the tab separated vcf lines with their variant normalized (see
+    normalize_many), the other columns are kept. Multi allelic, symbolic and
+    unparsable lines are returned as they are.
+    """
+    lines = list(lines)
+    parsed = []
+    for line in lines:
+        fields = line.split('\t')
+        if len(fields) < 5 or not fields[1].isdigit() or not fields[3].isalpha() or not fields[4].isalpha():
+            parsed.append(None)
+        else:
+            parsed.append((fields[0], int(fields[1]), fields[3], fields[4]))
+    normalized = iter(normalize_many([variant for variant in parsed if variant is not None], assembly, shift, fetch))
+    ret = []
+    for line, variant in zip(lines, parsed):
+        if variant is not None:
+            variant = next(normalized)
+        if variant is None:
+            ret.append(line)
+        else:
+            fields = line.split('\t')
+            # the chromosome is written as it was, e.g. with its chr prefix
+            ret.append('\t'.join([fields[0], str(variant.position), fields[2], variant.ref, variant.alt] + fields[5:]))
+    return ret
+
+
+def from_hgvs(parsed: dict, assembly: str = 'GRCh38', shift: str = 'left', fetch=None):
+    """Returns the normalized Variant of a variant parsed by Hgvs.parse (SNV, del, ins, delins)."""
+    chromosome = RE_CHR_PREFIX.sub('', str(parsed['chromosome']))
+    fetch = fetch or reference_fetch(assembly, chromosome)
+    start, end = int(parsed['start']), int(parsed['end'])
+    ref, alt = parsed.get('ref'), parsed.get('alt') or ''
+    if ref is None:
+        # an insertion between two bases, hgvs writes start_start+1, VEP start=end+1
+        start = min(start, end)
+        anchor = fetch(start - 1, start).upper()
+        return normalize(chromosome, start, anchor, anchor + alt, assembly, shift, fetch)
+    if not ref:
+        ref = fetch(start - 1, end).upper()
+    return normalize(chromosome, start, ref, alt, assembly, shift, fetch)
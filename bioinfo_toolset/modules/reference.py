@@ -0,0 +1,81 @@
+import gzip
+import re
+import shutil
+from functools import lru_cache
+from os import remove, replace
+from os.path import exists
+from threading import Lock
+
+from friendlylog import colored_logger as log
+
+RE_CHR_PREFIX = re.compile(r'^chr', flags=re.I)
+INDEX_SUFFIXES = ['.fai', '.gzi']
+
+
+def is_indexed(fasta: str):
+    """True if the bgzipped fasta file has its .fai and .gzi indexes."""
+    return exists(fasta) and all(exists(fasta + suffix) for suffix in INDEX_SUFFIXES)
+
+
+def bgzip_and_index(fasta: str, dir: str = None):
+    """
+    Recompresses a gzipped (or plain) fasta.gz file in place with bgzip and
+    builds its .fai and .gzi indexes, so VEP and Reference read it by random
+    access without decompressing it.
+    """
+    import pysam
+    from bioinfo_toolset.modules.download import CHUNK_SIZE
+    if not fasta.endswith('.gz'):
+        raise ValueError(f"Cannot bgzip {fasta}, the file must end with .gz")
+    tmp = f"{fasta}.bgzf"
+    log.info(f"Bgzip and index {fasta}...")
+    with open(fasta, 'rb') as raw:
+        compressed = raw.read(2) == b'\x1f\x8b'
+    # bgzip files are gzip files, so a half finished former run is read as well
+    with (gzip.open(fasta, 'rb') if compressed else open(fasta, 'rb')) as inf, pysam.BGZFile(tmp, 'wb') as outf:
+        shutil.copyfileobj(inf, outf, CHUNK_SIZE)
+    for suffix in INDEX_SUFFIXES:
+        if exists(fasta + suffix):
+            remove(fasta + suffix)
+    replace(tmp, fasta)
+    pysam.faidx(fasta)
+
+
+class Reference():
+    """Random access to the sequences of an indexed (bgzipped) fasta file."""
+
+    def __init__(self, fasta: str):
+        import pysam
+        self.file = fasta
+        self.fasta = pysam.FastaFile(fasta)
+        # pysam file handles must not be shared between threads
+        self.lock = Lock()
+
+    def fetch(self, chromosome: str, start: int, end: int):
+        """Returns the (upper case) sequence of the 0-based half open interval [start, end)."""
+        with self.lock:
+            return self.fasta.fetch(RE_CHR_PREFIX.sub('', str(chromosome)), start, end).upper()
+
+    def close(self):
+        with self.lock:
+            self.fasta.close()
+
+
+@lru_cache(maxsize=None)
+def get_reference(assembly: str):
+    """Returns the Reference of the fasta installed by populate-cache or None if it is not indexed."""
+    from bioinfo_toolset.modules.vep_offline import local_fasta
+    fasta = local_fasta(assembly)
+    return Reference(fasta) if fasta else None
+
+
+def allele_at_position(assembly: str, chromosome: str, start: int, end: int):
+    """
+    Returns the reference allele of [start, end) (0-based). The local fasta is
+    used if it is installed, the seqrepo otherwise.
+    """
+    reference = get_reference(assembly)
+    if reference is not None:
+        return reference.fetch(chromosome, start, end)
+    from bioinfo_toolset.modules.vrs import VRS
+    return VRS.get_instance().allele_at_position(assembly, chromosome, start, end)
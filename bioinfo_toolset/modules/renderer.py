@@ -0,0 +1,277 @@
+from os import environ
+
+import click
+
+from bioinfo_toolset.modules.formatter import (
+    format_allele_string, format_change_position, format_position, format_protein_position, transcript_name)
+
+RENDER_FORMATS = ['text', 'tsv']
+# Visible width of the key column of the text output
+KEY_WIDTH = 23
+RESET = '\x1b[0m'
+BOLD = '\x1b[1m'
+COLORS = {
+    'blue': '\x1b[34m',
+    'green': '\x1b[32m',
+    'cyan': '\x1b[36m',
+    'white': '\x1b[97m',
+}
+
+VARIANT_KEYS = [
+    'assembly_name',
+    'id',
+    'seq_region_name',
+    'start',
+    'end',
+    'variant_class',
+    'allele_string',
+    'strand',
+    'somatic',
+    'most_severe_consequence',
+    'clin_sig',
+    'frequencies',
+    'phenotype_or_disease',
+    'var_synonyms',
+    'vrs'
+]
+TRANSCRIPT_KEYS = [
+    'source',
+    'transcript_id',
+    'gene_symbol',
+    'gene_id',
+    'variant_allele',
+    'hgvsg',
+    'hgvsc',
+    'hgvsp',
+    'hgnc_id',
+    'amino_acids',
+    'impact',
+    'consequence_terms',
+    'codons',
+    'biotype',
+    'polyphen_score',
+    'strand',
+    'sift_score',
+    'sift_prediction',
+    'flags'
+]
+VALUE_FORMATTERS = {
+    'allele_string': format_allele_string
+}
+
+# Columns of the tsv output, one row per shown transcript (or per variant
+# without any), values of lists are comma separated.
+TSV_VARIANT_COLUMNS = ['input', 'assembly_name', 'seq_region_name', 'start', 'end', 'allele_string',
+                       'variant_class', 'most_severe_consequence', 'vrs']
+TSV_TRANSCRIPT_COLUMNS = ['transcript_id', 'gene_symbol', 'gene_id', 'biotype', 'canonical', 'impact',
+                          'consequence_terms', 'hgvsc', 'hgvsp', 'hgvsg', 'amino_acids', 'codons',
+                          'sift_prediction', 'sift_score', 'polyphen_prediction', 'polyphen_score']
+TSV_COLUMNS = TSV_VARIANT_COLUMNS + ['colocated_ids'] + TSV_TRANSCRIPT_COLUMNS + \
+    ['transcript_name', 'cdna_position', 'cds_position', 'protein_position']
+
+
+def use_color(file):
+    """Colors are used on terminals only, unless NO_COLOR or FORCE_COLOR is set."""
+    if 'NO_COLOR' in environ:
+        return False
+    if 'FORCE_COLOR' in environ:
+        return True
+    return hasattr(file, 'isatty') and file.isatty()
+
+
+def shown_transcripts(result, all_transcripts=False):
+    return [transcript for transcript in result.get('transcript_consequences', [])
+            if all_transcripts or transcript.get('canonical') == 1]
+
+
+class TextRenderer():
+    """
+    Renders VEP results as the human readable `bit vep` text output. Every
+    record is built from precomputed line templates and written at once.
+    `lift(result)` returns the (assembly, chromosome, position) of the
+    lifted variant, which is shown below the variant.
+    """
+
+    def __init__(self, output: str = '-', color: bool = None, details: bool = False, all_transcripts: bool = False,
+                 lift=None, flush: bool = False):
+        self.file = click.open_file(output, 'w')
+        self.stdout = output == '-'
+        self.color = use_color(self.file) if color is None else color
+        self.details = details
+        self.all_transcripts = all_transcripts
+        self.lift = lift
+        self.flush = flush
+        self.templates = {}
+
+    def __paint(self, text, color, bold=False):
+        if not self.color:
+            return text
+        return f"{BOLD if bold else ''}{COLORS[color]}{text}{RESET}"
+
+    def __heads(self, indent, highlight):
+        """The line starts up to the value per key, built once per key, indent and highlight."""
+        key = (indent, highlight)
+        if key not in self.templates:
+            # the key column is padded before it is colored
+            template = ' ' * max(1, indent * 4) + \
+                self.__paint(f"{{:<{KEY_WIDTH}}}", 'cyan', highlight) + ' : ' + \
+                (f"{BOLD if highlight else ''}{COLORS['white']}" if self.color else '')
+            self.templates[key] = (template, {}, f"{RESET if self.color else ''}\n")
+        return self.templates[key]
+
+    @staticmethod
+    def __value(value, indent):
+        if isinstance(value, list):
+            if not value:
+                return ''
+            if isinstance(value[0], (str, dict)):
+                return ', '.join([str(val) for val in value])
+            return str(value)
+        if isinstance(value, dict):
+            lines = []
+            for key, val in value.items():
+                line = f"{key}: "
+                if isinstance(val, list):
+                    line += ', '.join([str(v) for v in val])
+                elif isinstance(val, dict):
+                    line += ''.join([f"\n{' ' * (indent * 4 + 30)}{k}: {v}" for k, v in val.items()])
+                else:
+                    line += str(val)
+                lines.append(line)
+            return f"\n{' ' * (indent * 4 + 24)}".join(lines)
+        return str(value)
+
+    def __items(self, out, record, ids, indent=0, highlight=False, computed=()):
+        template, heads, tail = self.__heads(indent, highlight)
+        for id, value in [(id, record[id]) for id in ids if id in record] + list(computed):
+            head = heads.get(id)
+            if head is None:
+                head = heads[id] = template.format(id)
+            if id in VALUE_FORMATTERS:
+                value = VALUE_FORMATTERS[id](value)
+            out += (head, value if type(value) is str else self.__value(value, indent), tail)
+
+    def __splitter(self, out, indent=0):
+        out.append(' ' * max(1, indent * 4) + '---\n')
+
+    def __variant(self, out, variant, indent=0):
+        if self.details:
+            ids = [id for id in variant.keys() if id != 'transcript_consequences']
+        else:
+            ids = VARIANT_KEYS
+        self.__items(out, variant, ids, indent)
+
+    def __transcript(self, out, transcript, indent=0):
+        self.__items(out, transcript, transcript.keys() if self.details else TRANSCRIPT_KEYS, indent,
+                     transcript.get('canonical') == 1, computed=[
+                         ('cds_position', format_position(transcript, 'cds')),
+                         ('cdna_position', format_position(transcript, 'cdna')),
+                         ('protein_position', format_protein_position(transcript)),
+                         ('transcript_name', transcript_name(transcript)[0])])
+
+    def render(self, result):
+        """Returns the text of one result."""
+        out = [self.__paint(f"Result for {result['input']}", 'blue', True), '\n']
+        allele_string = format_allele_string(result['allele_string'])
+        out += [self.__paint(f"{result['assembly_name']}: {result['id']} -> {result['seq_region_name']}:{format_change_position(result)} ({allele_string})", 'green', True), '\n']
+        if self.lift is not None:
+            assembly, chromosome, position = self.lift(result)
+            out += [self.__paint(f"{assembly}: {result['id']} -> {chromosome}:{format_change_position(position)} ({allele_string})", 'green', True), '\n']
+        self.__variant(out, result)
+
+        if 'colocated_variants' in result:
+            out += [self.__paint(f"Colocated variants ({len(result['colocated_variants'])}):", 'cyan'), '\n']
+            for colocated_variant in result['colocated_variants']:
+                self.__variant(out, colocated_variant, indent=1)
+                self.__splitter(out, indent=1)
+
+        if 'transcript_consequences' in result:
+            out += [self.__paint(f"Transcript consequences ({len(result['transcript_consequences'])}{' / only canonical shown' if not self.all_transcripts else ''}):", 'cyan'), '\n']
+            for transcript in shown_transcripts(result, self.all_transcripts):
+                self.__transcript(out, transcript, indent=1)
+                self.__splitter(out, indent=1)
+        return ''.join(out)
+
+    def write(self, result):
+        self.file.write(self.render(result))
+        if self.flush:
+            self.file.flush()
+
+    def close(self):
+        # stdout stays open for anything written after the results
+        if self.stdout:
+            self.file.flush()
+        else:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def tsv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        value = ','.join([str(val) for val in value])
+    # tabs and line breaks would break the rows
+    return str(value).replace('\t', ' ').replace('\n', ' ')
+
+
+class TsvRenderer():
+    """Renders VEP results as tab separated rows of TSV_COLUMNS with a header line."""
+
+    def __init__(self, output: str = '-', all_transcripts: bool = False, flush: bool = False):
+        self.file = click.open_file(output, 'w')
+        self.stdout = output == '-'
+        self.all_transcripts = all_transcripts
+        self.flush = flush
+        self.file.write('\t'.join(TSV_COLUMNS) + '\n')
+
+    def rows(self, result):
+        variant = [tsv_value(result.get(column)) for column in TSV_VARIANT_COLUMNS]
+        variant.append(tsv_value([colocated.get('id') for colocated in result.get('colocated_variants', [])]))
+        transcripts = shown_transcripts(result, self.all_transcripts)
+        if not transcripts:
+            return [variant + [''] * (len(TSV_COLUMNS) - len(variant))]
+        return [variant +
+                [tsv_value(transcript.get(column)) for column in TSV_TRANSCRIPT_COLUMNS] +
+                [tsv_value(transcript_name(transcript)[0]),
+                 tsv_value(format_position(transcript, 'cdna')),
+                 tsv_value(format_position(transcript, 'cds')),
+                 tsv_value(format_protein_position(transcript))]
+                for transcript in transcripts]
+
+    def render(self, result):
+        return ''.join(['\t'.join(row) + '\n' for row in self.rows(result)])
+
+    def write(self, result):
+        self.file.write(self.render(result))
+        if self.flush:
+            self.file.flush()
+
+    def close(self):
+        # stdout stays open for anything written after the results
+        if self.stdout:
+            self.file.flush()
+        else:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def renderer(output_format: str, output: str = None, details: bool = False, all_transcripts: bool = False,
+             lift=None, flush: bool = False):
+    """Returns the renderer of the text or tsv output."""
+    if output_format == 'text':
+        return TextRenderer(output or '-', details=details, all_transcripts=all_transcripts, lift=lift, flush=flush)
+    if output_format == 'tsv':
+        return TsvRenderer(output or '-', all_transcripts=all_transcripts, flush=flush)
+    raise ValueError(
+        f"Unknown output format '{output_format}', use one of {', '.join(RENDER_FORMATS)}")
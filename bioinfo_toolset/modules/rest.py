@@ -0,0 +1,117 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from os import environ
+from threading import Lock
+from time import monotonic, sleep
+
+import requests
+from requests.adapters import HTTPAdapter
+from friendlylog import colored_logger as log
+
+API = 'https://rest.ensembl.org'
+OLD_API = 'https://grch37.rest.ensembl.org'
+# Number of keep-alive connections kept per host
+POOL_SIZE = int(environ.get('BIT_REST_POOL_SIZE', 10))
+# Seconds to wait for a response
+TIMEOUT = float(environ.get('BIT_REST_TIMEOUT', 60))
+# Ensembl allows 15 requests per second and client
+RATE_LIMIT = float(environ.get('BIT_REST_RATE_LIMIT', 15))
+MAX_RETRIES = 5
+
+
+class RateLimiter():
+    """Spaces calls to wait() so that at most `rate` calls per second pass."""
+
+    def __init__(self, rate=RATE_LIMIT):
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next = 0
+        self.lock = Lock()
+
+    def wait(self):
+        with self.lock:
+            now = monotonic()
+            slot = max(self.next, now)
+            self.next = slot + self.interval
+        if slot > now:
+            sleep(slot - now)
+
+
+limiter = RateLimiter()
+_session = None
+_session_lock = Lock()
+
+
+def session():
+    """Returns the keep-alive session shared by all Ensembl REST modules."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE,
+                                  pool_maxsize=POOL_SIZE)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+            _session.headers.update({
+                'Content-Type': 'application/json',
+                'Accept': 'application/json',
+                'Accept-Encoding': 'gzip, deflate'
+            })
+        return _session
+
+
+def chunks(inputs: list, size: int):
+    return [inputs[i:i + size] for i in range(0, len(inputs), size)]
+
+
+def base_url(GRCh37=False):
+    return API if not GRCh37 else OLD_API
+
+
+def retry_delay(retry_after, attempt):
+    """
+    Returns the seconds to wait before the next attempt, as given by a
+    Retry-After header in seconds or as HTTP date, else 2 ** attempt.
+    """
+    if retry_after:
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:
+            pass
+        try:
+            date = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            date = None
+        if date is not None:
+            if date.tzinfo is None:
+                date = date.replace(tzinfo=timezone.utc)
+            return max((date - datetime.now(timezone.utc)).total_seconds(), 0)
+    return 2 ** attempt
+
+
+def request(method, url, retries=MAX_RETRIES, **kwargs):
+    """
+    Sends a rate limited request through the shared session and returns the
+    json response. Rate limited (429) and server errors are retried,
+    honouring Retry-After.
+    """
+    for attempt in range(retries + 1):
+        limiter.wait()
+        resp = session().request(method, url, timeout=TIMEOUT, **kwargs)
+        if resp.ok:
+            return resp.json()
+        if attempt < retries and (resp.status_code == 429 or resp.status_code >= 500):
+            delay = retry_delay(resp.headers.get('Retry-After'), attempt)
+            log.warning(
+                f"Response error {resp.status_code}, retrying in {delay}s ({attempt + 1}/{retries})...")
+            sleep(delay)
+            continue
+        log.error(f"Response error {resp.status_code}: {resp.content}")
+        resp.raise_for_status()
+
+
+def get(url, params=None, **kwargs):
+    return request('GET', url, params=params, **kwargs)
+
+
+def post(url, body, params=None, **kwargs):
+    return request('POST', url, params=params, json=body, **kwargs)
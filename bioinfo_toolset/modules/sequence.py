@@ -0,0 +1,49 @@
+# IUPAC nucleotide codes, upper and lower case. Other characters (e.g. '-')
+# are kept as they are.
+_BASES = 'ACGTUNRYKMSWBDHVacgtunrykmswbdhv'
+_COMPLEMENTS = 'TGCAANYRMKSWVHDBtgcaanyrmkswvhdb'
+COMPLEMENT = str.maketrans(_BASES, _COMPLEMENTS)
+BYTES_COMPLEMENT = bytes.maketrans(_BASES.encode(), _COMPLEMENTS.encode())
+# joins alleles for bulk operations, it is not a base
+_SEP = '|'
+
+
+def complement(sequence: str):
+    """complement a sequence: ex. ACTG => TGAC"""
+    return sequence.translate(COMPLEMENT)
+
+
+def reverse_complement(sequence: str):
+    """reverse complement a sequence: ex. ACTG => CAGT"""
+    return sequence.translate(COMPLEMENT)[::-1]
+
+
+def complement_bytes(sequence: bytes):
+    return sequence.translate(BYTES_COMPLEMENT)
+
+
+def reverse_complement_bytes(sequence: bytes):
+    return sequence.translate(BYTES_COMPLEMENT)[::-1]
+
+
+def complement_array(alleles):
+    """complement all alleles of a list or numpy array, returns a numpy array"""
+    import numpy as np
+    alleles = list(alleles)
+    if not alleles:
+        return np.array([], dtype=str)
+    return np.array(_SEP.join(alleles).translate(COMPLEMENT).split(_SEP))
+
+
+def reverse_complement_array(alleles):
+    """
+    reverse complement all alleles of a list or numpy array, returns a numpy
+    array. The alleles are joined, translated and reversed as one string, so
+    the work is done in linear time regardless of the allele lengths.
+    """
+    import numpy as np
+    alleles = list(alleles)
+    if not alleles:
+        return np.array([], dtype=str)
+    # reversing the joined string reverses every allele and their order
+    return np.array(_SEP.join(alleles).translate(COMPLEMENT)[::-1].split(_SEP)[::-1])
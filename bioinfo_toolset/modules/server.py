@@ -0,0 +1,451 @@
+import json
+import re
+import socket
+from collections import Counter
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import islice
+from os import chmod, environ, makedirs, remove, umask
+from os.path import dirname, exists, expanduser, join
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Queue
+from socketserver import ThreadingMixIn, UnixStreamServer
+from threading import Lock, Semaphore, Thread
+from time import monotonic
+from urllib.parse import urlsplit
+
+from friendlylog import colored_logger as log
+
+from bioinfo_toolset.modules.vep_offline import FIELD_SEP, RE_FIELD_SEP, VEP_OPTIONS
+from bioinfo_toolset.modules.vep_result import LazyResult, dumps
+
+# Unix socket the daemon listens on and the clients connect to by default
+SERVER_SOCKET = expanduser(environ.get(
+    'BIT_SERVER_SOCKET', join(Path.home(), '.bit', 'bit.sock')))
+# Maximal number of lines annotated in one VEP run
+SERVER_BATCH_SIZE = int(environ.get('BIT_SERVER_BATCH_SIZE', 5000))
+# Seconds a request waits for further requests to join its batch
+SERVER_BATCH_DELAY = float(environ.get('BIT_SERVER_BATCH_DELAY', 0.2))
+# Number of batches annotated at the same time
+SERVER_WORKERS = 2
+# Maximal size of a request body in bytes, clients send large inputs in
+# requests of SERVER_BATCH_SIZE lines
+SERVER_MAX_REQUEST_SIZE = int(environ.get('BIT_SERVER_MAX_REQUEST_SIZE', 64 * 1024 ** 2))
+# Only the owner may connect to the Unix socket
+SOCKET_MODE = 0o600
+NDJSON = 'application/x-ndjson'
+# Values of VEP options sent by clients, they end up in the VEP command line
+RE_OPTION_VALUE = re.compile(r'^[\w.,:+-]*$')
+
+
+def input_of(line: str):
+    """The input VEP reports for a vcf line."""
+    return RE_FIELD_SEP.sub(FIELD_SEP, line.strip())
+
+
+def check_options(options):
+    """Raises a ValueError unless options only sets the editable VEP_OPTIONS to plain values."""
+    if not isinstance(options, dict):
+        raise ValueError('The options must be an object')
+    for key, value in options.items():
+        if key not in VEP_OPTIONS:
+            raise ValueError(f"Unknown VEP option '{key}', use one of {', '.join(VEP_OPTIONS)}")
+        if not isinstance(value, (bool, int, float, str)) or not RE_OPTION_VALUE.match(str(value)):
+            raise ValueError(f"Invalid value of the VEP option '{key}': {value}")
+
+
+class Job():
+    """
+    The lines of one request and the queue its results are streamed through.
+    Results arrive in the order of the batch and are passed on in the order
+    of the lines.
+    """
+    DONE = object()
+
+    def __init__(self, lines: list, GRCh37: bool, options: dict):
+        self.lines = lines
+        self.keys = [input_of(line) for line in lines]
+        self.GRCh37 = GRCh37
+        self.options = options
+        # only requests for the same assembly and options are batched together
+        self.group = (GRCh37, json.dumps(options, sort_keys=True))
+        self.results = Queue()
+        self.pending = {}
+        # lines of every key not passed on yet
+        self.remaining = Counter(self.keys)
+        self.released = 0
+
+    def deliver(self, result: dict):
+        key = result.get('input')
+        if not self.remaining[key]:
+            # the lines of the key were passed on already (or are not part of
+            # this request), a late result has no place in the order any more
+            log.warning(f"Dropping a late result of {key}")
+            return
+        self.pending.setdefault(key, []).append(result)
+        while self.released < len(self.keys) and self.keys[self.released] in self.pending:
+            self.__release()
+
+    def finish(self, end=DONE):
+        """Passes on the remaining results, VEP skips the lines it cannot read."""
+        while self.released < len(self.keys):
+            self.__release()
+        self.results.put(end)
+
+    def __release(self):
+        key = self.keys[self.released]
+        for result in self.pending.get(key, []):
+            self.results.put(result)
+        self.remaining[key] -= 1
+        if not self.remaining[key]:
+            self.pending.pop(key, None)
+        self.released += 1
+
+    def __iter__(self):
+        while True:
+            result = self.results.get()
+            if result is Job.DONE:
+                return
+            if isinstance(result, Exception):
+                raise result
+            yield result
+
+
+class Batcher():
+    """
+    Collects concurrent requests into batches of up to `batch_size` lines,
+    waiting at most `delay` seconds for requests to join, and annotates every
+    batch with a single `annotate(lines, GRCh37, options)` call. Lines
+    requested more than once in a batch are annotated once. A batch is only
+    collected once one of the `workers` is free, so requests arriving while
+    all of them are busy join the next batch.
+    """
+
+    def __init__(self, annotate, batch_size=SERVER_BATCH_SIZE, delay=SERVER_BATCH_DELAY, workers=SERVER_WORKERS):
+        self.annotate = annotate
+        self.batch_size = batch_size
+        self.delay = delay
+        self.queue = Queue()
+        self.batches = 0
+        self.lines = 0
+        self.lock = Lock()
+        self.slots = Semaphore(max(1, workers))
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.collector = Thread(target=self.__work, daemon=True)
+        self.collector.start()
+
+    def submit(self, lines: list, GRCh37: bool = False, options: dict = None):
+        job = Job(lines, GRCh37, options or {})
+        self.queue.put(job)
+        return job
+
+    def __collect(self):
+        job = self.queue.get()
+        if job is None:
+            return None
+        jobs = [job]
+        size = len(job.lines)
+        others = []
+        deadline = monotonic() + self.delay
+        while size < self.batch_size:
+            timeout = deadline - monotonic()
+            if timeout <= 0:
+                break
+            try:
+                other = self.queue.get(timeout=timeout)
+            except Empty:
+                break
+            if other is None:
+                # stop after this batch
+                self.queue.put(None)
+                break
+            if other.group == job.group and size + len(other.lines) <= self.batch_size:
+                jobs.append(other)
+                size += len(other.lines)
+            else:
+                others.append(other)
+        # requests not fitting into this batch are left to the next one
+        for other in others:
+            self.queue.put(other)
+        return jobs
+
+    def __work(self):
+        while True:
+            self.slots.acquire()
+            jobs = self.__collect()
+            if jobs is None:
+                return
+            self.executor.submit(self.__run, jobs).add_done_callback(
+                lambda _: self.slots.release())
+
+    def __run(self, jobs):
+        receivers = {}
+        lines = []
+        for job in jobs:
+            for line in job.lines:
+                key = input_of(line)
+                if key not in receivers:
+                    receivers[key] = []
+                    lines.append(line)
+                if job not in receivers[key]:
+                    receivers[key].append(job)
+        with self.lock:
+            self.batches += 1
+            self.lines += len(lines)
+        log.debug(f"Annotating {len(lines)} lines of {len(jobs)} requests...")
+        end = Job.DONE
+        try:
+            for result in self.annotate(lines, jobs[0].GRCh37, jobs[0].options):
+                for job in receivers.get(result.get('input'), []):
+                    job.deliver(result)
+        except Exception as ex:
+            log.error(f"Cannot annotate batch: {ex}")
+            end = ex
+        for job in jobs:
+            job.finish(end)
+
+    def close(self):
+        self.queue.put(None)
+        self.collector.join()
+        self.executor.shutdown(wait=True)
+
+
+class Service():
+    """
+    The state shared by all requests of the daemon: the VEP workers, the
+    annotation cache, the seqrepo access and the batcher.
+    """
+
+    def __init__(self, vep=None, cache=None, batch_size=SERVER_BATCH_SIZE, delay=SERVER_BATCH_DELAY, workers=SERVER_WORKERS):
+        if vep is None:
+            from bioinfo_toolset.modules.vep_offline import OfflineVep
+            vep = OfflineVep()
+        self.vep = vep
+        self.cache = cache
+        self.batcher = Batcher(self.annotate, batch_size, delay, workers)
+        self.started = monotonic()
+
+    def annotate(self, lines: list, GRCh37: bool, options: dict):
+        if self.cache is not None:
+            return self.vep.evaluate(lines, GRCh37=GRCh37, result_cache=self.cache, **options)
+        return self.vep.evaluate_iter(lines, GRCh37=GRCh37, **options)
+
+    def identify(self, records: list):
+        from bioinfo_toolset.modules.vrs import VRS
+        return VRS.get_instance().identify_many(records)
+
+    def status(self):
+        return {
+            'status': 'ok',
+            'uptime': round(monotonic() - self.started, 1),
+            'batches': self.batcher.batches,
+            'lines': self.batcher.lines,
+            'cache': {'hits': self.cache.hits, 'misses': self.cache.misses} if self.cache is not None else None
+        }
+
+    def close(self):
+        self.batcher.close()
+        self.vep.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    POST /vep {"input": [vcf lines], "GRCh37": false, "options": {}} streams
+    one json result per line, POST /vrs {"records": [...]} returns the VRS ids
+    and GET /health the state of the daemon. Bodies are limited to
+    SERVER_MAX_REQUEST_SIZE bytes and options to the editable VEP_OPTIONS.
+    """
+    server_version = 'bit'
+
+    def __send_json(self, status, value):
+        payload = json.dumps(value).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.__send_json(200, self.server.service.status())
+        else:
+            self.__send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        length = self.headers.get('Content-Length', '0')
+        if not length.isdigit():
+            self.close_connection = True
+            self.__send_json(400, {'error': f"Invalid Content-Length {length}"})
+            return
+        size = int(length)
+        if size > SERVER_MAX_REQUEST_SIZE:
+            self.close_connection = True
+            self.__send_json(413, {'error': f"The request has {size} bytes, the limit is {SERVER_MAX_REQUEST_SIZE}"})
+            return
+        try:
+            body = json.loads(self.rfile.read(size) or b'{}')
+        except ValueError as ex:
+            self.__send_json(400, {'error': f"Invalid json: {ex}"})
+            return
+        if not isinstance(body, dict):
+            self.__send_json(400, {'error': f"The body must be a json object, got {type(body).__name__}"})
+            return
+        if self.path == '/vep':
+            lines, GRCh37, options = body.get('input', []), body.get('GRCh37', False), body.get('options', {})
+            try:
+                if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+                    raise ValueError('The input must be a list of vcf lines')
+                if not isinstance(GRCh37, bool):
+                    raise ValueError(f"GRCh37 must be true or false, got {GRCh37!r}")
+                check_options(options)
+            except ValueError as ex:
+                self.__send_json(400, {'error': str(ex)})
+                return
+            job = self.server.service.batcher.submit(lines, GRCh37, options)
+            self.send_response(200)
+            self.send_header('Content-Type', NDJSON)
+            self.end_headers()
+            try:
+                for result in job:
+                    self.wfile.write(dumps(result) + b'\n')
+                    self.wfile.flush()
+            except Exception as ex:
+                # the status is already sent, the error is the last line
+                self.wfile.write(json.dumps({'error': str(ex)}).encode() + b'\n')
+        elif self.path == '/vrs':
+            try:
+                self.__send_json(200, {'ids': self.server.service.identify(body.get('records', []))})
+            except Exception as ex:
+                self.__send_json(500, {'error': str(ex)})
+        else:
+            self.__send_json(404, {'error': f"Unknown path {self.path}"})
+
+    def address_string(self):
+        # clients of a Unix socket have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: Service, socket_path: str = SERVER_SOCKET, port: int = None):
+    """Creates the server on 127.0.0.1:port if a port is given, on the Unix socket otherwise."""
+    if port is not None:
+        server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    else:
+        makedirs(dirname(socket_path) or '.', exist_ok=True)
+        if exists(socket_path):
+            remove(socket_path)
+        # the socket is created without access for others, not only changed after
+        mask = umask(0o777 & ~SOCKET_MODE)
+        try:
+            server = UnixHTTPServer(socket_path, Handler)
+        finally:
+            umask(mask)
+        chmod(socket_path, SOCKET_MODE)
+    server.service = service
+    return server
+
+
+def serve(service: Service, socket_path: str = SERVER_SOCKET, port: int = None):
+    server = make_server(service, socket_path, port)
+    log.info(f"Serving on {f'http://127.0.0.1:{port}' if port is not None else socket_path}...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if port is None and exists(socket_path):
+            remove(socket_path)
+
+
+class UnixHTTPConnection(HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class Client():
+    """
+    Client of the bit daemon. The address is a Unix socket (a path or
+    unix:///path) or a http://127.0.0.1:port url.
+    """
+
+    def __init__(self, address: str = None, request_size: int = SERVER_BATCH_SIZE):
+        self.address = address or SERVER_SOCKET
+        self.request_size = request_size
+
+    def __connection(self):
+        if self.address.startswith('http://'):
+            url = urlsplit(self.address)
+            return HTTPConnection(url.hostname, url.port)
+        path = self.address[len('unix://'):] if self.address.startswith(
+            'unix://') else self.address
+        return UnixHTTPConnection(path)
+
+    def __request(self, method, path, body=None):
+        connection = self.__connection()
+        try:
+            connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                               headers={'Content-Type': 'application/json'})
+        except OSError as ex:
+            connection.close()
+            raise Exception(f"Cannot connect to the bit server at {self.address}: {ex}")
+        response = connection.getresponse()
+        if response.status != 200:
+            message = response.read().decode()
+            connection.close()
+            raise Exception(f"bit server error {response.status}: {message}")
+        return connection, response
+
+    def vep(self, input, GRCh37=False, **options):
+        """
+        Annotates the vcf lines (any iterable) on the server and yields the
+        results as they arrive. The lines are read and sent in requests of
+        `request_size` lines, so a large input is never held as a whole.
+        """
+        input = iter(input)
+        while True:
+            lines = list(islice(input, self.request_size))
+            if not lines:
+                return
+            connection, response = self.__request(
+                'POST', '/vep', {'input': lines, 'GRCh37': GRCh37, 'options': options})
+            try:
+                for line in response:
+                    result = LazyResult(line)
+                    if set(result) == {'error'}:
+                        raise Exception(f"bit server error: {result['error']}")
+                    yield result
+            finally:
+                connection.close()
+
+    def identify_many(self, records: list):
+        connection, response = self.__request(
+            'POST', '/vrs', {'records': [list(record) for record in records]})
+        try:
+            return json.loads(response.read())['ids']
+        finally:
+            connection.close()
+
+    def health(self):
+        connection, response = self.__request('GET', '/health')
+        try:
+            return json.loads(response.read())
+        finally:
+            connection.close()
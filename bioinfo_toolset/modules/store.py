@@ -0,0 +1,145 @@
+import heapq
+import re
+from functools import lru_cache
+from os import environ, makedirs, replace
+from os.path import dirname, exists, expanduser, join
+from pathlib import Path
+from threading import Lock
+
+from friendlylog import colored_logger as log
+
+from bioinfo_toolset.modules.download import CHUNK_SIZE
+from bioinfo_toolset.modules.vep_result import LazyResult, dumps
+
+# Directory of the annotation store, one file per assembly
+STORE_DIR = expanduser(environ.get(
+    'BIT_STORE_DIR', join(Path.home(), '.bit', 'store')))
+# Results per Store.ingest call of bit store ingest, every call rewrites the store
+STORE_BATCH_SIZE = int(environ.get('BIT_STORE_BATCH_SIZE', 500000))
+HEADER = b'#chromosome\tstart\tend\tinput\tresult\n'
+RE_CHR_PREFIX = re.compile(r'^chr', flags=re.I)
+RE_REGION = re.compile(r'^(?:chr)?([^:\s]+)(?::([\d,]+)(?:-([\d,]+))?)?$', flags=re.I)
+
+
+def parse_region(region: str):
+    """
+    Returns the chromosome, start and end (1-based, inclusive) of a region
+    like 17:7570000-7590000, chr17:7,577,120 or 17. A missing end means up to
+    the end of the chromosome.
+    """
+    match = RE_REGION.match(region.strip())
+    if match is None:
+        raise ValueError(f"Invalid region '{region}', use chromosome[:start[-end]]")
+    chromosome, start, end = match.groups()
+    start = int(start.replace(',', '')) if start else 1
+    end = int(end.replace(',', '')) if end else (start if match.group(2) else None)
+    if end is not None and end < start:
+        raise ValueError(f"Invalid region '{region}', the end is before the start")
+    return chromosome, start, end
+
+
+def chromosome_key(chromosome: str):
+    """Sorts the numeric chromosomes numerically, followed by the others (MT, X, Y, ...) by name."""
+    return (0, int(chromosome), '') if chromosome.isdigit() else (1, 0, chromosome)
+
+
+def record(result):
+    """Returns the sort key and the store line of a VEP result."""
+    chromosome = RE_CHR_PREFIX.sub('', str(result['seq_region_name']))
+    # insertions are reported with start = end + 1
+    start, end = sorted((int(result['start']), int(result['end'])))
+    input = ' '.join(str(result.get('input', '')).split())
+    line = b'\t'.join([chromosome.encode(), b'%d' % start, b'%d' % end,
+                      input.encode(), dumps(result)]) + b'\n'
+    return (chromosome_key(chromosome), start, end, input), line
+
+
+class Store():
+    """
+    The annotations of one assembly in a position sorted, bgzipped file
+    with a tabix index. Regions are read by random access, without
+    decompressing the whole file.
+    """
+
+    def __init__(self, assembly: str = 'GRCh38', dir: str = STORE_DIR):
+        self.assembly = assembly
+        self.path = join(dir, f"{assembly}.tsv.gz")
+        self.lock = Lock()
+        self.tabix = None
+
+    def __records(self):
+        import pysam
+        if not exists(self.path):
+            return
+        with pysam.BGZFile(self.path, 'rb') as inf:
+            # the lines are read without their line break
+            for line in inf:
+                if not line or line.startswith(b'#'):
+                    continue
+                chromosome, start, end, input, _ = line.split(b'\t', 4)
+                yield (chromosome_key(chromosome.decode()), int(start), int(end), input.decode()), line + b'\n'
+
+    def __close(self):
+        if self.tabix is not None:
+            self.tabix.close()
+            self.tabix = None
+
+    def ingest(self, results):
+        """
+        Merges the results into the store. A result replaces the stored one
+        of the same position and input. The store is rewritten, so results
+        are best ingested in large batches. Returns the number of results stored.
+        """
+        import pysam
+        latest = dict(record(result) for result in results)
+        if not latest:
+            return 0
+        makedirs(dirname(self.path) or '.', exist_ok=True)
+        tmp = f"{self.path}.tmp.gz"
+        with self.lock:
+            last = None
+            buffer = [HEADER]
+            size = 0
+            with pysam.BGZFile(tmp, 'wb') as outf:
+                # on equal keys the new record comes first and replaces the stored one
+                for key, _, line in heapq.merge(((key, 0, line) for key, line in sorted(latest.items())),
+                                                ((key, 1, line) for key, line in self.__records())):
+                    if key != last:
+                        buffer.append(line)
+                        size += len(line)
+                        last = key
+                        if size >= CHUNK_SIZE:
+                            outf.write(b''.join(buffer))
+                            buffer = []
+                            size = 0
+                outf.write(b''.join(buffer))
+            pysam.tabix_index(tmp, force=True, seq_col=0, start_col=1, end_col=2,
+                              meta_char='#', zerobased=False, index=f"{tmp}.tbi")
+            self.__close()
+            replace(tmp, self.path)
+            replace(f"{tmp}.tbi", f"{self.path}.tbi")
+        log.debug(f"Stored {len(latest)} annotations in {self.path}.")
+        return len(latest)
+
+    def query(self, region: str):
+        """Returns the stored results overlapping the region as LazyResults."""
+        import pysam
+        chromosome, start, end = parse_region(region)
+        with self.lock:
+            if self.tabix is None:
+                if not exists(f"{self.path}.tbi"):
+                    return []
+                self.tabix = pysam.TabixFile(self.path)
+            if chromosome not in self.tabix.contigs:
+                return []
+            lines = list(self.tabix.fetch(chromosome, max(start - 1, 0), end))
+        return [LazyResult(line.split('\t', 4)[4]) for line in lines]
+
+    def close(self):
+        with self.lock:
+            self.__close()
+
+
+@lru_cache(maxsize=None)
+def get_store(assembly: str = 'GRCh38'):
+    return Store(assembly)
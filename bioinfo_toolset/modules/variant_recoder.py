@@ -1,19 +1,33 @@
-import requests
-from friendlylog import colored_logger as log
+from concurrent.futures import ThreadPoolExecutor
 
-API = 'https://rest.ensembl.org'
-OLD_API = 'https://grch37.rest.ensembl.org'
+from bioinfo_toolset.modules import rest
+
+# The Ensembl REST api accepts up to 200 ids per POST request
+BATCH_SIZE = 200
+BATCH_WORKERS = 4
 
 
 def recode(input, species='human', GRCh37=False):
-    req = f"{API if not GRCh37 else OLD_API}/variant_recoder/{species}/{input}"
+    req = f"{rest.base_url(GRCh37)}/variant_recoder/{species}/{input}"
     # log.debug(f"Request: {req}")
-    resp = requests.get(req, headers={
-        'Content-Type': 'application/json'
-    })
-    if resp.ok:
-        # log.debug(resp.json())
-        return resp.json()
-    else:
-        log.error(f"Response error {resp.status_code}: {resp.content}")
-        resp.raise_for_status()
+    return rest.get(req)
+
+
+def recode_batch(inputs: list, species='human', GRCh37=False, batch_size=BATCH_SIZE, workers=BATCH_WORKERS):
+    """
+    Recodes many inputs with batched POST requests, sending up to `workers`
+    batches concurrently. Returns a dict mapping every input to its records,
+    the records have the same form as the ones returned by recode().
+    """
+    req = f"{rest.base_url(GRCh37)}/variant_recoder/{species}"
+    inputs = list(dict.fromkeys(inputs))
+    ret = {input: [] for input in inputs}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for records in executor.map(lambda batch: rest.post(req, {'ids': batch}),
+                                    rest.chunks(inputs, batch_size)):
+            for record in records:
+                for allele in record.values():
+                    if isinstance(allele, dict) and allele.get('input') in ret:
+                        ret[allele['input']].append(record)
+                        break
+    return ret
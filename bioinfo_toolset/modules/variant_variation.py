@@ -1,19 +1,7 @@
-import requests
-from friendlylog import colored_logger as log
-
-API = 'https://rest.ensembl.org'
-OLD_API = 'https://grch37.rest.ensembl.org'
+from bioinfo_toolset.modules import rest
 
 
 def recode(input, species='human', GRCh37=False):
-    req = f"{API if not GRCh37 else OLD_API}/variation/{species}/{input}"
+    req = f"{rest.base_url(GRCh37)}/variation/{species}/{input}"
     # log.debug(f"Request: {req}")
-    resp = requests.get(req, headers={
-        'Content-Type': 'application/json'
-    })
-    if resp.ok:
-        # log.debug(resp.json())
-        return resp.json()
-    else:
-        log.error(f"Response error {resp.status_code}: {resp.content}")
-        resp.raise_for_status()
+    return rest.get(req)
@@ -1,12 +1,23 @@
-import requests
-from friendlylog import colored_logger as log
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from os import environ
 
-API = 'https://rest.ensembl.org'
-OLD_API = 'https://grch37.rest.ensembl.org'
+from bioinfo_toolset.modules import rest
 
+# Release of the REST VEP used to key cached annotations, asked from the server if not set
+REST_RELEASE = environ.get('BIT_VEP_REST_RELEASE')
+# The Ensembl REST api accepts up to 200 variants per POST request
+BATCH_SIZE = 200
+BATCH_WORKERS = 4
+# Name of the list in the POST body per input type
+BATCH_KEYS = {
+    'hgvs': 'hgvs_notations',
+    'id': 'ids',
+    'region': 'variants'
+}
 
-def vep(input, species='human', input_type='hgvs', GRCh37=False, refseq=False):
-    req = f"{API if not GRCh37 else OLD_API}/vep/{species}/{input_type}/{input}"
+
+def params(refseq=False):
     params = {
         'canonical': True,
         'hgvs': True,
@@ -17,14 +28,65 @@ def vep(input, species='human', input_type='hgvs', GRCh37=False, refseq=False):
     }
     if refseq:
         params['refseq'] = True
+    return params
+
+
+@lru_cache(maxsize=None)
+def rest_release(base_url: str):
+    """The Ensembl release of the REST server (e.g. '110'), asked once per process."""
+    if REST_RELEASE:
+        return REST_RELEASE
+    return str(rest.get(f"{base_url}/info/software")['release'])
+
+
+def vep(input, species='human', input_type='hgvs', GRCh37=False, refseq=False, cache=None):
+    if cache is not None:
+        # the REST api can return several results per input, so the whole
+        # response is cached under the key of the input
+        release = rest_release(rest.base_url(GRCh37))
+        key = cache.key(input, input_type, 'GRCh37' if GRCh37 else 'GRCh38',
+                        release, dict(params(refseq), species=species))
+        cached = cache.get_many([key])
+        if key in cached:
+            return cached[key]
+        results = vep(input, species, input_type, GRCh37, refseq)
+        cache.put_many({key: results}, release)
+        return results
 
+    req = f"{rest.base_url(GRCh37)}/vep/{species}/{input_type}/{input}"
     # log.debug(f"Request: {req} {params}")
-    resp = requests.get(req, headers={
-        'Content-Type': 'application/json'
-    }, params=params)
-    if resp.ok:
-        # log.debug(resp.json())
-        return resp.json()
-    else:
-        log.error(f"Response error {resp.status_code}: {resp.content}")
-        resp.raise_for_status()
+    return rest.get(req, params=params(refseq))
+
+
+def vep_batch(inputs: list, species='human', input_type='hgvs', GRCh37=False, refseq=False, cache=None,
+              batch_size=BATCH_SIZE, workers=BATCH_WORKERS, base_url=None):
+    """
+    Annotates many inputs with batched POST requests, sending up to `workers`
+    batches concurrently. Region inputs must be in VCF or ensembl default
+    format (e.g. '21 26960070 rs116645811 G A'). The results are returned in
+    input order.
+    """
+    if cache is not None:
+        release = rest_release(base_url or rest.base_url(GRCh37))
+        return cache.annotate(
+            inputs,
+            key=lambda input: cache.key(input, input_type, 'GRCh37' if GRCh37 else 'GRCh38',
+                                        release, dict(params(refseq), species=species)),
+            annotate=lambda misses: vep_batch(misses, species, input_type, GRCh37, refseq,
+                                              batch_size=batch_size, workers=workers, base_url=base_url),
+            release=release)
+
+    url = f"{base_url or rest.base_url(GRCh37)}/vep/{species}/{input_type}"
+
+    def annotate(batch):
+        results = rest.post(
+            url, {BATCH_KEYS[input_type]: batch}, params(refseq))
+        # the api does not guarantee the order of the results
+        order = {input: idx for idx, input in enumerate(batch)}
+        return sorted(results, key=lambda result: order.get(result.get('input'), len(order)))
+
+    ret = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for results in executor.map(annotate, rest.chunks(inputs, batch_size)):
+            ret.extend(results)
+    return ret
@@ -1,37 +1,98 @@
 from pathlib import Path
-from os import makedirs, remove, environ
+from os import makedirs, remove, environ, close
 from os.path import join, splitext
 from tempfile import mkstemp
-import json
 import re
 from friendlylog import colored_logger as log
 from datetime import datetime as dt
-from threading import Thread
+from threading import Thread, Condition
+from time import time, sleep
+import atexit
 from sys import stdout
-from urllib.request import urlretrieve
-import tarfile
-import gzip
-from tqdm import tqdm
-from subprocess import Popen, PIPE, STDOUT
-from shutil import move
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from uuid import uuid4
+
+from bioinfo_toolset.modules.download import DOWNLOAD_WORKERS, file_name, install_all, marker
+from bioinfo_toolset.modules.normalize import normalize_vcf_lines
+from bioinfo_toolset.modules.reference import bgzip_and_index, get_reference, is_indexed
+from bioinfo_toolset.modules.vep_result import LazyResult
 
-import docker
 
 IMAGE = 'ensemblorg/ensembl-vep:{}'
 VEP_DATA = environ.get('BIT_VEP_DATA', join(Path.home(), 'vep_data'))
 REAL_VEP_DATA = environ.get('BIT_REAL_VEP_DATA', VEP_DATA)
 DATA = '/opt/vep/.vep'
-INSTALLED = Path(join(VEP_DATA, '.installed'))
+# The flag former versions set once the caches were installed
+INSTALLED = '.installed'
+# Number of warm VEP containers kept running (0 disables pooling)
+POOL_SIZE = int(environ.get('BIT_VEP_POOL_SIZE', 0))
+# Seconds an idle pooled container is kept before it is stopped
+POOL_IDLE_TIMEOUT = int(environ.get('BIT_VEP_POOL_IDLE_TIMEOUT', 300))
+# Lines looked up in the annotation cache at once when streaming, the
+# missing ones of each chunk are annotated in one VEP run
+STREAM_CHUNK_SIZE = int(environ.get('BIT_STREAM_CHUNK_SIZE', 20000))
+# Seconds between checks for new output while VEP is running
+POLL_INTERVAL = 0.1
+FIELD_SEP = '\t'
+RE_FIELD_SEP = re.compile(r'[ ]+')
+# The version line of `vep --help`, e.g. "ensembl-vep          : 106.1"
+RE_VEP_VERSION = re.compile(r'ensembl-vep\s*:\s*(\S+)')
+# The VEP release per image, asked once per process
+vep_releases = {}
+
+# Ensembl FTP server (or a mirror) the caches are downloaded from
+ENSEMBL_FTP = environ.get('BIT_ENSEMBL_FTP', 'https://ftp.ensembl.org/pub')
 
 CACHE = {
-    'GRCh37': 'http://ftp.ensembl.org/pub/release-{}/variation/indexed_vep_cache/homo_sapiens_merged_vep_{}_GRCh37.tar.gz',
-    'GRCh38': 'http://ftp.ensembl.org/pub/release-{}/variation/indexed_vep_cache/homo_sapiens_merged_vep_{}_GRCh38.tar.gz',
+    'GRCh37': '{ftp}/release-{release}/variation/indexed_vep_cache/homo_sapiens_merged_vep_{release}_GRCh37.tar.gz',
+    'GRCh38': '{ftp}/release-{release}/variation/indexed_vep_cache/homo_sapiens_merged_vep_{release}_GRCh38.tar.gz',
 }
 
 # The last GRCh37 fasta file is in release 75:
 FASTA = {
-    'GRCh37': 'http://ftp.ensembl.org/pub/release-75/fasta/homo_sapiens/dna/Homo_sapiens.GRCh37.75.dna.primary_assembly.fa.gz',
-    'GRCh38': 'http://ftp.ensembl.org/pub/release-{}/fasta/homo_sapiens/dna/Homo_sapiens.GRCh38.dna.primary_assembly.fa.gz'
+    'GRCh37': '{ftp}/release-75/fasta/homo_sapiens/dna/Homo_sapiens.GRCh37.75.dna.primary_assembly.fa.gz',
+    'GRCh38': '{ftp}/release-{release}/fasta/homo_sapiens/dna/Homo_sapiens.GRCh38.dna.primary_assembly.fa.gz'
+}
+
+# Editable VEP arguments with default values (copy this to the README),
+# clients of bit serve may only pass these
+VEP_OPTIONS = {
+    'af': True,
+    'af_1kg': True,
+    'af_gnomad': True,
+    'appris': True,
+    'biotype': True,
+    'canonical': True,
+    'ccds': True,
+    'domains': True,
+    'flag_pick': True,
+    'force_overwrite': True,
+    'gene_phenotype': True,
+    'hgvs': True,
+    'hgvsg': True,
+    'json': True,
+    'mane': True,
+    'max_af': True,
+    'mirna': True,
+    'numbers': True,
+    'offline': True,
+    'polyphen': 'b',
+    'protein': True,
+    'pubmed': True,
+    'regulatory': True,
+    'shift_3prime': '1',
+    'shift_genomic': '1',
+    'shift_length': True,
+    'show_ref_allele': True,
+    'sift': 'b',
+    'symbol': True,
+    'tsl': True,
+    'uniprot': True,
+    'use_given_ref': True,
+    'var_synonyms': True,
+    'variant_class': True,
+    'xref_refseq': True
 }
 
 INDICATORS = ['\\', '|', '/', '|']
@@ -44,155 +105,236 @@ def next_indicator():
     return INDICATORS[indicator_idx]
 
 
+def cache_urls(release, ftp=ENSEMBL_FTP):
+    """The urls of the VEP caches and FASTA files of both assemblies."""
+    return [template.format(ftp=ftp, release=release)
+            for template in [CACHE['GRCh37'], CACHE['GRCh38'], FASTA['GRCh37'], FASTA['GRCh38']]]
+
+
+def local_fasta(assembly):
+    """The bgzipped fasta of the assembly installed by populate_cache or None if it is not indexed."""
+    fasta = join(VEP_DATA, file_name(FASTA[assembly]))
+    return fasta if is_indexed(fasta) else None
+
+
+def vep_image():
+    return IMAGE.format(environ.get('VEP_RELEASE', 'latest'))
+
+
+def container_name(prefix='vep'):
+    # the uuid part keeps names unique when containers are started concurrently
+    return f"{prefix}_{dt.now().strftime('%Y-%m-%d_%H_%M_%S_%f')}_{uuid4().hex[:8]}"
+
+
+def vcf_lines(file):
+    """Yields the data lines of a vcf file without reading the whole file."""
+    with open(file, 'r') as inf:
+        for line in inf:
+            if not line.startswith('#'):
+                yield line.strip()
+
+
+def shard(input: list, shards: int):
+    """
+    Splits the input lines into at most `shards` contiguous, size balanced
+    parts. Header lines (#) are repeated at the start of every part.
+    """
+    header = [line for line in input if line.startswith('#')]
+    lines = [line for line in input if not line.startswith('#')] if header else input
+    shards = max(1, min(shards, len(lines)))
+    size, rest = divmod(len(lines), shards)
+    ret = []
+    start = 0
+    for i in range(shards):
+        end = start + size + (1 if i < rest else 0)
+        ret.append(header + lines[start:end])
+        start = end
+    return ret
+
+
+class VepPool():
+    """
+    Keeps up to `size` long-lived VEP containers running and hands them out to
+    jobs. Jobs are run with `docker exec` inside a warm container, so container
+    creation and teardown is only paid once. Containers idle for longer than
+    `idle_timeout` seconds are stopped.
+    """
+
+    def __init__(self, client, size=POOL_SIZE, idle_timeout=POOL_IDLE_TIMEOUT):
+        if size < 1:
+            raise ValueError(f"Pool size must be at least 1, got {size}")
+        self.client = client
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.count = 0
+        self.idle = []
+        self.closed = False
+        self.condition = Condition()
+        self.reaper = Thread(target=self.__reap, daemon=True)
+        self.reaper.start()
+        atexit.register(self.close)
+
+    def __start_container(self):
+        return self.client.containers.run(
+            vep_image(),
+            name=container_name('vep_pool'),
+            auto_remove=True,
+            detach=True,
+            volumes={REAL_VEP_DATA: {'bind': DATA, 'mode': 'rw'}},
+            command='sleep infinity'
+        )
+
+    def __stop_container(self, container):
+        import docker
+        try:
+            container.stop(timeout=1)
+        except docker.errors.APIError as ex:
+            log.warning(f"Cannot stop pooled container {container.name}: {ex}")
+
+    def __reap(self):
+        while True:
+            with self.condition:
+                if self.closed:
+                    return
+                self.condition.wait(timeout=max(1, self.idle_timeout / 4))
+                now = time()
+                expired = [container for container, since in self.idle
+                           if now - since > self.idle_timeout]
+                self.idle = [(container, since) for container, since in self.idle
+                             if now - since <= self.idle_timeout]
+                self.count -= len(expired)
+                self.condition.notify_all()
+            for container in expired:
+                self.__stop_container(container)
+
+    def acquire(self):
+        with self.condition:
+            while not self.closed and not self.idle and self.count >= self.size:
+                self.condition.wait()
+            if self.closed:
+                raise Exception('VEP pool is closed')
+            if self.idle:
+                return self.idle.pop()[0]
+            # reserve the slot before starting the container outside of the lock
+            self.count += 1
+        try:
+            return self.__start_container()
+        except Exception:
+            self.discard()
+            raise
+
+    def release(self, container):
+        with self.condition:
+            if self.closed:
+                self.count -= 1
+            else:
+                self.idle.append((container, time()))
+                container = None
+            self.condition.notify_all()
+        if container is not None:
+            self.__stop_container(container)
+
+    def discard(self, container=None):
+        with self.condition:
+            self.count -= 1
+            self.condition.notify_all()
+        if container is not None:
+            self.__stop_container(container)
+
+    def run(self, command):
+        container = self.acquire()
+        try:
+            exec_id = self.client.api.exec_create(
+                container.id, command, stdout=True, stderr=True, tty=True)
+            for output in self.client.api.exec_start(exec_id, stream=True):
+                stdout.write(output.decode('utf-8'))
+            exit_code = self.client.api.exec_inspect(exec_id)['ExitCode']
+        except Exception:
+            self.discard(container)
+            raise
+        self.release(container)
+        if exit_code != 0:
+            raise Exception(
+                f"VEP exited with code {exit_code} in container {container.name}")
+
+    def close(self):
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            idle = self.idle
+            self.idle = []
+            self.count -= len(idle)
+            self.condition.notify_all()
+        for container, _ in idle:
+            self.__stop_container(container)
+
+
 class OfflineVep():
-    def __init__(self):
+    def __init__(self, pool_size=POOL_SIZE, idle_timeout=POOL_IDLE_TIMEOUT):
+        # docker is slow to import, so it is only loaded once VEP is used
+        import docker
         self.client = docker.client.from_env()
         makedirs(VEP_DATA, exist_ok=True)
+        self.pool = VepPool(self.client, pool_size,
+                            idle_timeout) if pool_size else None
 
-    def __rsync_and_extract(self, url, force=False):
-        # replace http with rsync
-        url = re.sub(r'http(s)?://', r'rsync://', url)
-        # change the location of the file
-        url = re.sub(r'rsync://ftp.ensembl.org/',
-                     r'rsync://ftp.ensembl.org/ensembl/', url)
-        local_file = join(VEP_DATA, re.sub(r'.*/', '', url))
-        if force or not Path(local_file).is_file():
-            command = ['rsync', '-ahP', url, VEP_DATA]
-            log.info(f"Executing '{' '.join(command)}'...")
-            with Popen(command, shell=False,
-                       stdout=PIPE, stderr=STDOUT, bufsize=1, universal_newlines=True) as rsync:
-                nl = r'\n'
-                for line in rsync.stdout:
-                    print(
-                        f"{re.sub(r'.*/', '', url)}: {re.sub(nl, '', line)}", end='\r')
-                    # stdout.flush()
-            if rsync.returncode == 0:
-                self.__unzip(local_file, VEP_DATA)
-            else:
-                raise Exception(
-                    f"Error rsyncing file '{url}'': {rsync.returncode}")
-        else:
-            log.warning(
-                f"File {local_file} already exists, skipping.")
-
-    def __unzip(self, file, dir):
+    def populate_cache(self, release, force=False, workers=DOWNLOAD_WORKERS):
+        """
+        Downloads, verifies and extracts the VEP caches and FASTA files of
+        both assemblies. Installed files are skipped, interrupted ones resumed.
+        """
+        installed = Path(join(VEP_DATA, INSTALLED))
+        if installed.is_file() and not force:
+            # installations of former versions are taken as complete
+            for url in cache_urls(release):
+                marker(VEP_DATA, url).touch()
+            installed.unlink()
+        log.info('Populating VEP cache...')
         try:
-            if splitext(file)[1] == '.gz':
-                log.info(f"Gunzip {file}...")
-                with gzip.open(file, 'r') as gz:
-                    file_content = gz.read()
-                    file = splitext(file)[0]
-                    new_file = join(dir, re.sub(r'.*/', '', file))
-                    if not Path(new_file).is_file():
-                        with open(file, 'wb') as decompressed:
-                            decompressed.write(file_content)
-                        move(file, new_file)
-                    file = new_file
-            if splitext(file)[1] == '.tar':
-                log.info(f"Untar {file} to {dir}...")
-                with tarfile.open(file) as tar:
-                    tar.extractall(dir)
+            # the fasta files are bgzipped and indexed instead of decompressed
+            fastas = [template.format(ftp=ENSEMBL_FTP, release=release)
+                      for template in FASTA.values()]
+            install_all(cache_urls(release), VEP_DATA, workers, force,
+                        extractors={url: bgzip_and_index for url in fastas})
         except Exception as ex:
-            raise Exception(f"Cannot unzip file {file}: {ex}")
+            raise Exception(f"Error populating cache: {ex}")
 
-    def __download_and_extract(self, url, force=False):
-        local_file = join(VEP_DATA, re.sub(r'.*/', '', url))
-
-        if force or not Path(local_file).is_file():
-            try:
-                with tqdm(desc=re.sub(r'.*/', '', url), unit='B', unit_scale=True) as pbar:
-                    def report_hook(_, block_size, total_size):
-                        pbar.total = total_size
-                        pbar.update(block_size)
-                    urlretrieve(url, local_file, report_hook)
-                self.__unzip(local_file, VEP_DATA)
-            except Exception as ex:
-                raise Exception(
-                    f"Error downloading or extracting file '{url}': {ex}")
-        else:
-            log.warning(
-                f"File {local_file} already exists, skipping.")
-
-    def populate_cache(self, release, force=False):
-        if not INSTALLED.is_file() or force:
-            log.info('Populating VEP cache...')
-            try:
-                self.__rsync_and_extract(
-                    CACHE['GRCh37'].format(release, release), force=True)
-                self.__rsync_and_extract(
-                    CACHE['GRCh38'].format(release, release), force=True)
-                self.__rsync_and_extract(
-                    FASTA['GRCh37'], force=True)
-                self.__rsync_and_extract(
-                    FASTA['GRCh38'].format(release), force=True)
-                INSTALLED.touch()
-            except Exception as ex:
-                raise Exception(f"Error populating cache: {ex}")
-        else:
-            log.info('VEP cache is already polpulated, doing nothing.')
+    def vep_release(self):
+        """
+        The release of the VEP in the image (e.g. 106.1), which keys the cached
+        annotations. A newly pulled `latest` image gets its own entries.
+        """
+        image = vep_image()
+        if image not in vep_releases:
+            output = self.client.containers.run(image, command='./vep --help', remove=True)
+            match = RE_VEP_VERSION.search(output.decode('utf-8', 'replace'))
+            if match is None:
+                raise Exception(f"Cannot read the VEP release of {image}")
+            vep_releases[image] = match.group(1)
+        return vep_releases[image]
 
     def __convert_path(self, local_file):
         return local_file.replace(VEP_DATA, DATA)
 
-    def evaluate(self, input: list, GRCh37=False, **kwargs):
-        assembly = 'GRCh38' if not GRCh37 else 'GRCh37'
-        (_, input_file) = mkstemp(suffix='.vcf', dir=VEP_DATA)
-        with open(input_file, 'w') as inf:
-            sep = '\t'
-            for line in input:
-                # print('--line--', f"{re.sub(r'[ ]+', tab, line)}\n")
-                inf.write(f"{re.sub(r'[ ]+', sep, line)}\n")
-        (_, output_file) = mkstemp(suffix='.json', dir=VEP_DATA)
+    def __command(self, input_file, output_file, assembly, kwargs):
+        # the bgzipped and indexed fasta, or the decompressed one of older caches
+        fasta = local_fasta(assembly) or join(
+            VEP_DATA, splitext(file_name(FASTA[assembly]))[0])
         # Arguments for the control flow
         vep_args = {
             'cache': True,
             'merged': True,
             'dir_cache': f"{DATA}/",
             'dir_plugins': f"{DATA}/Plugins/",
-            'fasta': join(DATA, splitext(re.sub(r'.*/', '', FASTA[assembly]))[0]),
+            'fasta': self.__convert_path(fasta),
             # This is autodetected: 'format': 'vcf' if vcf_format else 'ensembl',
             'input_file': self.__convert_path(input_file),
             'output_file': self.__convert_path(output_file),
             'assembly': assembly,
         }
-        # Editable arguments with default values (copy this to the README)
-        vep_args.update({
-            'af': True,
-            'af_1kg': True,
-            'af_gnomad': True,
-            'appris': True,
-            'biotype': True,
-            'canonical': True,
-            'ccds': True,
-            'domains': True,
-            'flag_pick': True,
-            'force_overwrite': True,
-            'gene_phenotype': True,
-            'hgvs': True,
-            'hgvsg': True,
-            'json': True,
-            'mane': True,
-            'max_af': True,
-            'mirna': True,
-            'numbers': True,
-            'offline': True,
-            'polyphen': 'b',
-            'protein': True,
-            'pubmed': True,
-            'regulatory': True,
-            'shift_3prime': '1',
-            'shift_genomic': '1',
-            'shift_length': True,
-            'show_ref_allele': True,
-            'sift': 'b',
-            'symbol': True,
-            'tsl': True,
-            'uniprot': True,
-            'use_given_ref': True,
-            'var_synonyms': True,
-            'variant_class': True,
-            'xref_refseq': True
-        })
+        # Editable arguments with default values
+        vep_args.update(VEP_OPTIONS)
 
         # TODO: Plugins
         # vep_args.update({
@@ -204,43 +346,162 @@ class OfflineVep():
         command = './vep '
         command += ' '.join([f"--{key} {str(value) if value != True else ''}" for key,
                              value in vep_args.items() if value])
-        self.run(command)
+        return command
 
-        with open(output_file, 'r') as outf:
-            ret = []
-            for line in outf.readlines():
-                # print(line)
-                ret.append(json.loads(line))
+    def __write_input(self, input):
+        (fd, input_file) = mkstemp(suffix='.vcf', dir=VEP_DATA)
+        with open(fd, 'w') as inf:
+            for line in input:
+                # header values may contain spaces
+                inf.write(f"{line if line.startswith('#') else RE_FIELD_SEP.sub(FIELD_SEP, line)}\n")
+        return input_file
+
+    def __follow(self, output_file, runner):
+        """
+        Yields the json lines VEP appends to the output file as LazyResults
+        until the runner is done.
+        """
+        with open(output_file, 'rb') as outf:
+            pending = b''
+            while True:
+                # check before reading, so nothing written in between is missed
+                finished = not runner.is_alive()
+                line = outf.readline()
+                while line:
+                    if line.endswith(b'\n'):
+                        yield LazyResult(pending + line)
+                        pending = b''
+                    else:
+                        pending += line
+                    line = outf.readline()
+                if finished:
+                    break
+                sleep(POLL_INTERVAL)
+            if pending.strip():
+                yield LazyResult(pending)
+
+    def evaluate_iter(self, input, GRCh37=False, result_cache=None, **kwargs):
+        """
+        Annotates the input lines (any iterable) and yields the VEP results
+        one by one as soon as VEP writes them. With a result_cache the input is
+        read in chunks of STREAM_CHUNK_SIZE lines, cached results are yielded
+        directly and the missing lines of a chunk are annotated in one run.
+        """
+        if result_cache is not None:
+            yield from self.__cached_iter(input, GRCh37, kwargs, result_cache)
+            return
+        assembly = 'GRCh38' if not GRCh37 else 'GRCh37'
+        input_file = self.__write_input(input)
+        (fd, output_file) = mkstemp(suffix='.json', dir=VEP_DATA)
+        close(fd)
+        command = self.__command(input_file, output_file, assembly, kwargs)
+
+        errors = []
+
+        def run():
+            try:
+                self.run(command)
+            except Exception as ex:
+                errors.append(ex)
+
+        runner = Thread(target=run, daemon=True)
+        runner.start()
+        try:
+            yield from self.__follow(output_file, runner)
+            if errors:
+                raise errors[0]
+        finally:
+            runner.join()
+            remove(input_file)
+            remove(output_file)
 
-        remove(input_file)
-        remove(output_file)
+    def __cached_iter(self, input, GRCh37, kwargs, result_cache):
+        input = iter(input)
+        while True:
+            chunk = list(islice(input, STREAM_CHUNK_SIZE))
+            if not chunk:
+                return
+            yield from self.__cached(chunk, GRCh37, kwargs, result_cache,
+                                     lambda misses: list(self.evaluate_iter(misses, GRCh37, **kwargs)))
 
-        # log.debug(ret)
+    def __cached(self, input: list, GRCh37, kwargs, result_cache, annotate):
+        assembly = 'GRCh38' if not GRCh37 else 'GRCh37'
+        release = self.vep_release()
+        canonical = {}
+        if get_reference(assembly) is not None:
+            # indels are keyed left aligned, so their representations share
+            # one annotation, the seqrepo is too slow to be asked per line
+            canonical = dict(zip(input, normalize_vcf_lines(
+                [RE_FIELD_SEP.sub(FIELD_SEP, line) for line in input], assembly)))
+        return result_cache.annotate(
+            input,
+            key=lambda line: result_cache.key(
+                canonical.get(line, line), 'vcf', assembly, release, kwargs),
+            annotate=annotate,
+            release=release,
+            # VEP reports the line as written to the input file
+            input_of=lambda line: RE_FIELD_SEP.sub(FIELD_SEP, line))
+
+    def evaluate(self, input: list, GRCh37=False, result_cache=None, **kwargs):
+        """
+        Annotates the input lines. If a result_cache (AnnotationCache) is given,
+        only lines without a cached annotation are sent to VEP.
+        """
+        if result_cache is not None:
+            return self.__cached(input, GRCh37, kwargs, result_cache,
+                                 lambda misses: self.evaluate(misses, GRCh37, **kwargs))
+        return list(self.evaluate_iter(input, GRCh37=GRCh37, **kwargs))
+
+    def evaluate_parallel(self, input: list, jobs: int, GRCh37=False, result_cache=None, **kwargs):
+        """
+        Splits the input into `jobs` shards, annotates them in concurrent VEP
+        containers and returns the results in input order.
+        """
+        if result_cache is not None:
+            return self.__cached(input, GRCh37, kwargs, result_cache,
+                                 lambda misses: self.evaluate_parallel(misses, jobs, GRCh37, **kwargs))
+        shards = shard(input, jobs)
+        if len(shards) < 2:
+            return self.evaluate(input, GRCh37=GRCh37, **kwargs)
+        log.info(f"Running VEP on {len(input)} lines in {len(shards)} shards...")
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            futures = [executor.submit(self.evaluate, part, GRCh37, **kwargs)
+                       for part in shards]
+            ret = []
+            # VEP keeps the input order within a shard, so concatenating
+            # the shards in order restores the overall input order
+            for future in futures:
+                ret.extend(future.result())
         return ret
 
     def run(self, command):
         # log.debug(f"Running command: {command}...")
+        if self.pool is not None:
+            self.pool.run(command)
+            return
 
-        def run_container():
-            container = self.client.containers.run(
-                IMAGE.format(environ.get('VEP_RELEASE', 'latest')),
-                name=f"vep_{dt.now().strftime('%Y-%m-%d_%H_%M_%S_%f')}",
-                auto_remove=True,
-                remove=True,
-                tty=True,
-                stdout=True,
-                stderr=True,
-                stream=True,
-                detach=True,
-                volumes={REAL_VEP_DATA: {'bind': DATA, 'mode': 'rw'}},
-                command=command
-            )
+        container = self.client.containers.run(
+            vep_image(),
+            name=container_name(),
+            tty=True,
+            stdout=True,
+            stderr=True,
+            detach=True,
+            volumes={REAL_VEP_DATA: {'bind': DATA, 'mode': 'rw'}},
+            command=command
+        )
+        try:
             for output in container.logs(stdout=True, stderr=True,
                                          stream=True, timestamps=True, follow=True):
                 stdout.write(output.decode('utf-8'))
+            # the container is removed afterwards, so its exit code can be read
+            exit_code = container.wait()['StatusCode']
+        finally:
+            container.remove(force=True)
+        if exit_code != 0:
+            raise Exception(
+                f"VEP exited with code {exit_code} in container {container.name}")
 
-            container.wait()
-
-        runner = Thread(target=run_container)
-        runner.start()
-        runner.join()
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
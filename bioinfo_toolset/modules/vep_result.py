@@ -0,0 +1,103 @@
+import json
+from collections.abc import Mapping, MutableMapping
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """Decodes json (str or bytes), with orjson if it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _default(value):
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value):
+    """
+    Encodes value as compact json bytes, with orjson if it is installed.
+    Unchanged LazyResults are returned as they were read.
+    """
+    if isinstance(value, LazyResult) and value.pristine:
+        return value.raw
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, default=_default, separators=(',', ':')).encode()
+
+
+def decode(data):
+    """Returns a LazyResult of a json object and the decoded value of anything else."""
+    raw = data.encode() if isinstance(data, str) else bytes(data)
+    if raw.lstrip()[:1] == b'{':
+        return LazyResult(raw)
+    return loads(raw)
+
+
+class LazyResult(MutableMapping):
+    """
+    A VEP result read from its json line. The line is decoded once, when a
+    field is first accessed, and kept until the result is changed, so results
+    which are only passed on are neither decoded nor encoded again.
+    """
+    __slots__ = ('raw', 'tree', 'pristine')
+
+    def __init__(self, raw):
+        self.raw = (raw.encode() if isinstance(raw, str) else bytes(raw)).strip()
+        self.tree = None
+        # False once the result may differ from the raw line
+        self.pristine = True
+
+    @property
+    def fields(self):
+        if self.tree is None:
+            tree = loads(self.raw)
+            if not isinstance(tree, dict):
+                raise ValueError(f"A VEP result must be a json object, got {type(tree).__name__}")
+            self.tree = tree
+        return self.tree
+
+    def __changed(self):
+        self.raw = None
+        self.pristine = False
+
+    def __getitem__(self, key):
+        value = self.fields[key]
+        if self.pristine and isinstance(value, (list, dict)):
+            # nested values can be changed in place
+            self.__changed()
+        return value
+
+    def __setitem__(self, key, value):
+        self.fields[key] = value
+        self.__changed()
+
+    def __delitem__(self, key):
+        del self.fields[key]
+        self.__changed()
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __repr__(self):
+        return repr(self.fields)
+
+    def copy(self):
+        """A shallow copy which shares the raw line, decoded only if it was already."""
+        ret = LazyResult.__new__(LazyResult)
+        ret.raw = self.raw
+        ret.tree = None if self.tree is None else dict(self.tree)
+        ret.pristine = self.pristine
+        return ret
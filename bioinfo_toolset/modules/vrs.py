@@ -1,12 +1,12 @@
 # pipenv install "jsonschema<4.0" is required
 # from bioinfo_toolset.modules.helper import dj
-import docker
+import hashlib
+import json
+from base64 import urlsafe_b64encode
+from concurrent.futures import ProcessPoolExecutor
 from os import environ
-from bioutils import sequences
-from bioutils.seqfetcher import fetch_seq
-from ga4gh.core import ga4gh_identify
-from ga4gh.vrs import models
-from ga4gh.vrs.dataproxy import SeqRepoRESTDataProxy
+
+from bioinfo_toolset.modules.helper import LRUCache
 
 # Use 'docker run --rm biocommons/seqrepo seqrepo pull'
 # to update seqrepo to the latest version.
@@ -18,6 +18,42 @@ SEQREPO_DATA = environ.get(
 SEQREPO_REST_SERVICE_URL = f"http://{SEQREPO_HOST}:{SEQREPO_PORT}/seqrepo"
 SEQREPO_IMAGE = 'biocommons/seqrepo-rest-service'
 CONTAINER_NAME = 'seqrepo_rest'
+# 'rest' queries the seqrepo-rest-service container, 'local' reads the
+# seqrepo directory (SEQREPO_DATA) directly without docker
+SEQREPO_BACKEND = environ.get('BIT_SEQREPO_BACKEND', 'rest')
+BACKENDS = ['rest', 'local']
+# Number of translated sequence identifiers kept in memory
+IDENTIFIER_CACHE_SIZE = int(environ.get('BIT_VRS_IDENTIFIER_CACHE_SIZE', 1024))
+# Sequences are fetched and cached in aligned blocks of this many bases
+SEQUENCE_BLOCK_SIZE = int(environ.get('BIT_VRS_BLOCK_SIZE', 4096))
+# Number of sequence blocks kept in memory (4096 blocks of 4 kb are 16 MB)
+SEQUENCE_CACHE_BLOCKS = int(environ.get('BIT_VRS_CACHE_BLOCKS', 4096))
+# Fetches spanning more blocks are passed through without caching
+MAX_CACHED_FETCH_BLOCKS = 16
+
+
+# Number of alleles digested per task when identify_many uses a process pool
+DIGEST_CHUNK_SIZE = 10000
+
+
+def sha512t24u(blob: bytes):
+    """The ga4gh digest: base64url of the first 24 bytes of the sha512 hash."""
+    return urlsafe_b64encode(hashlib.sha512(blob).digest()[:24]).decode('ascii')
+
+
+def allele_digests(alleles: list):
+    """
+    Digests (sequence digest, start, end, allele) tuples into ga4gh allele ids
+    by building the canonical serializations of ga4gh_serialize directly.
+    """
+    ret = []
+    for sequence_digest, start, end, allele in alleles:
+        location = ('{"interval":{"end":%d,"start":%d,"type":"SimpleInterval"},'
+                    '"sequence_id":"%s","type":"SequenceLocation"}' % (end, start, sequence_digest))
+        blob = ('{"location":"%s","state":{"sequence":%s,"type":"SequenceState"},"type":"Allele"}' % (
+            sha512t24u(location.encode()), json.dumps(allele)))
+        ret.append(f"ga4gh:VA.{sha512t24u(blob.encode())}")
+    return ret
 
 
 class VRS():
@@ -29,13 +65,30 @@ class VRS():
             cls.instance = VRS()
         return cls.instance
 
-    def __init__(self):
-        self.client = docker.client.from_env()
-        self.start_seqrepo_rest()
-        self.seqrepo = SeqRepoRESTDataProxy(
-            base_url=SEQREPO_REST_SERVICE_URL)
+    def __init__(self, backend=SEQREPO_BACKEND):
+        if backend not in BACKENDS:
+            raise ValueError(
+                f"Unknown seqrepo backend '{backend}', use one of {', '.join(BACKENDS)}")
+        self.backend = backend
+        self.identifiers = LRUCache(IDENTIFIER_CACHE_SIZE)
+        self.blocks = LRUCache(SEQUENCE_CACHE_BLOCKS)
+        self.lengths = {}
+        # docker and ga4gh are imported on first use, they are slow to import
+        if backend == 'local':
+            from biocommons.seqrepo import SeqRepo
+            from ga4gh.vrs.dataproxy import SeqRepoDataProxy
+            self.client = None
+            self.seqrepo = SeqRepoDataProxy(SeqRepo(SEQREPO_DATA))
+        else:
+            import docker
+            from ga4gh.vrs.dataproxy import SeqRepoRESTDataProxy
+            self.client = docker.client.from_env()
+            self.start_seqrepo_rest()
+            self.seqrepo = SeqRepoRESTDataProxy(
+                base_url=SEQREPO_REST_SERVICE_URL)
 
     def start_seqrepo_rest(self):
+        import docker
         container = None
         try:
             container = self.client.containers.get(CONTAINER_NAME)
@@ -70,8 +123,10 @@ class VRS():
         # sequence_id = 'GRCh38:19'
         # print('sequence_id', sequence_id)
         # print(self.seqrepo.translate_sequence_identifier(sequence_id, "ga4gh"))
+        from ga4gh.core import ga4gh_identify
+        from ga4gh.vrs import models
         try:
-            _sequence_id = self.seqrepo.translate_sequence_identifier(sequence_id, "ga4gh")[
+            _sequence_id = self.translate_sequence_identifier(sequence_id, "ga4gh")[
                 0]
             _interval = models.SimpleInterval(start=start, end=end)
             _location = models.SequenceLocation(
@@ -81,12 +136,87 @@ class VRS():
             _allele = models.Allele(location=_location, state=_state)
             # dj(_allele)
         except Exception as ex:
+            if self.backend == 'local':
+                raise Exception(
+                    f"Cannot query local seqrepo in '{SEQREPO_DATA}': {ex}")
             raise Exception(
                 f"Cannot query local seqrepo server. Check if the container '{CONTAINER_NAME}' is running: {ex}")
 
         return ga4gh_identify(_allele)
 
+    def identify_many(self, records, processes: int = 1):
+        """
+        Calculates the VRS ids of many (sequence_id, allele, start, end) records
+        (end is optional, as in identify()). The sequence ids are translated once
+        per sequence and the digests are calculated across `processes` processes.
+        The ids are identical to the ones of identify().
+        """
+        digests = {}
+        alleles = []
+        for record in records:
+            sequence_id, allele, start, end = (tuple(record) + (None,))[:4]
+            if end is None or start == end:
+                end = start
+                start = start - 1
+            if sequence_id not in digests:
+                try:
+                    digests[sequence_id] = self.translate_sequence_identifier(
+                        sequence_id, "ga4gh")[0].split('.', 1)[1]
+                except Exception as ex:
+                    raise Exception(
+                        f"Cannot translate sequence id '{sequence_id}' using the {self.backend} seqrepo: {ex}")
+            alleles.append((digests[sequence_id], int(start), int(end), allele))
+
+        if processes < 2 or len(alleles) <= DIGEST_CHUNK_SIZE:
+            return allele_digests(alleles)
+        ret = []
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for ids in executor.map(allele_digests, [alleles[i:i + DIGEST_CHUNK_SIZE]
+                                                     for i in range(0, len(alleles), DIGEST_CHUNK_SIZE)]):
+                ret.extend(ids)
+        return ret
+
+    def translate_sequence_identifier(self, identifier: str, namespace: str = None):
+        key = (identifier, namespace)
+        ret = self.identifiers.get(key)
+        if ret is None:
+            ret = self.seqrepo.translate_sequence_identifier(
+                identifier, namespace)
+            self.identifiers.put(key, ret)
+        return ret
+
+    def __length(self, identifier: str):
+        if identifier not in self.lengths:
+            self.lengths[identifier] = self.seqrepo.get_metadata(identifier)[
+                'length']
+        return self.lengths[identifier]
+
+    def __block(self, identifier: str, block: int):
+        key = (identifier, block)
+        ret = self.blocks.get(key)
+        if ret is None:
+            start = block * SEQUENCE_BLOCK_SIZE
+            end = min(start + SEQUENCE_BLOCK_SIZE, self.__length(identifier))
+            ret = self.seqrepo.get_sequence(
+                identifier=identifier, start=start, end=end)
+            self.blocks.put(key, ret)
+        return ret
+
     def allele_at_position(self, assembly: str, chromosome: str, start: int, end: int):
-        allele = self.seqrepo.get_sequence(
-            identifier=f"{assembly}:{chromosome}", start=start, end=end)
-        return allele
+        identifier = f"{assembly}:{chromosome}"
+        first = start // SEQUENCE_BLOCK_SIZE
+        last = (end - 1) // SEQUENCE_BLOCK_SIZE
+        if start < 0 or end <= start or last - first >= MAX_CACHED_FETCH_BLOCKS:
+            return self.seqrepo.get_sequence(
+                identifier=identifier, start=start, end=end)
+        sequence = ''.join(self.__block(identifier, block)
+                           for block in range(first, last + 1))
+        offset = first * SEQUENCE_BLOCK_SIZE
+        return sequence[start - offset:end - offset]
+
+    def cache_info(self):
+        """Returns the hit and miss counters of the identifier and sequence caches."""
+        return {
+            'identifiers': self.identifiers.info(),
+            'sequence_blocks': self.blocks.info()
+        }
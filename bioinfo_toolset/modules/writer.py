@@ -0,0 +1,232 @@
+import json
+from os import environ, makedirs
+from os.path import join
+
+import click
+
+from bioinfo_toolset.modules.vep_result import dumps
+
+OUTPUT_FORMATS = ['text', 'tsv', 'jsonl', 'parquet', 'arrow']
+# Rows buffered per table before they are written as one row group (record batch)
+ROW_GROUP_SIZE = int(environ.get('BIT_ROW_GROUP_SIZE', 50000))
+# File extension per columnar format, arrow is written in the IPC stream
+# format, which allows the dictionaries to grow from batch to batch
+EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrows'}
+
+# (column, type) per table. dict columns are dictionary encoded, the plural
+# types are lists and json columns hold nested values as json strings.
+VARIANT_COLUMNS = [
+    ('input', 'string'),
+    ('id', 'string'),
+    ('assembly_name', 'dict'),
+    ('seq_region_name', 'dict'),
+    ('start', 'int'),
+    ('end', 'int'),
+    ('strand', 'int'),
+    ('allele_string', 'string'),
+    ('variant_class', 'dict'),
+    ('most_severe_consequence', 'dict'),
+    ('vrs', 'string'),
+]
+TRANSCRIPT_COLUMNS = [
+    ('input', 'string'),
+    ('transcript_id', 'string'),
+    ('gene_id', 'dict'),
+    ('gene_symbol', 'dict'),
+    ('biotype', 'dict'),
+    ('consequence_terms', 'dicts'),
+    ('impact', 'dict'),
+    ('canonical', 'bool'),
+    ('strand', 'int'),
+    ('hgvsc', 'string'),
+    ('hgvsp', 'string'),
+    ('hgvsg', 'strings'),
+    ('cdna_start', 'int'),
+    ('cdna_end', 'int'),
+    ('cds_start', 'int'),
+    ('cds_end', 'int'),
+    ('protein_start', 'int'),
+    ('protein_end', 'int'),
+    ('amino_acids', 'dict'),
+    ('codons', 'string'),
+    ('sift_prediction', 'dict'),
+    ('sift_score', 'float'),
+    ('polyphen_prediction', 'dict'),
+    ('polyphen_score', 'float'),
+]
+COLOCATED_COLUMNS = [
+    ('input', 'string'),
+    ('id', 'string'),
+    ('start', 'int'),
+    ('end', 'int'),
+    ('strand', 'int'),
+    ('allele_string', 'string'),
+    ('clin_sig', 'dicts'),
+    ('somatic', 'bool'),
+    ('phenotype_or_disease', 'bool'),
+    ('pubmed', 'ints'),
+    ('frequencies', 'json'),
+]
+TABLES = {
+    'variants': VARIANT_COLUMNS,
+    'transcript_consequences': TRANSCRIPT_COLUMNS,
+    'colocated_variants': COLOCATED_COLUMNS,
+}
+
+CONVERTERS = {
+    'int': int,
+    'float': float,
+    'bool': bool,
+    'json': json.dumps,
+    'strings': lambda values: [str(value) for value in values],
+    'dicts': lambda values: [str(value) for value in values],
+    'ints': lambda values: [int(value) for value in values],
+}
+
+
+def row(record: dict, columns: list, input: str):
+    ret = {'input': input}
+    for name, _type in columns[1:]:
+        value = record.get(name)
+        if value is not None and _type in CONVERTERS:
+            if _type in ['strings', 'dicts', 'ints'] and not isinstance(value, list):
+                value = [value]
+            value = CONVERTERS[_type](value)
+        ret[name] = value
+    return ret
+
+
+def flatten(result: dict):
+    """Returns the rows of a VEP result per table, all rows are keyed by the input."""
+    input = result.get('input')
+    return {
+        'variants': [row(result, VARIANT_COLUMNS, input)],
+        'transcript_consequences': [row(transcript, TRANSCRIPT_COLUMNS, input)
+                                    for transcript in result.get('transcript_consequences', [])],
+        'colocated_variants': [row(colocated, COLOCATED_COLUMNS, input)
+                               for colocated in result.get('colocated_variants', [])]
+    }
+
+
+def schema(columns: list):
+    import pyarrow as pa
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    types = {
+        'string': pa.string(),
+        'json': pa.string(),
+        'dict': dictionary,
+        'int': pa.int64(),
+        'float': pa.float64(),
+        'bool': pa.bool_(),
+        'strings': pa.list_(pa.string()),
+        'dicts': pa.list_(dictionary),
+        'ints': pa.list_(pa.int64()),
+    }
+    return pa.schema([(name, types[_type]) for name, _type in columns])
+
+
+class JsonlWriter():
+    """Writes one VEP result per line to output (- for stdout)."""
+
+    def __init__(self, output: str = '-'):
+        self.file = click.open_file(output, 'wb')
+        self.stdout = output == '-'
+
+    def write(self, result: dict):
+        self.file.write(dumps(result) + b'\n')
+
+    def close(self):
+        # stdout stays open for anything written after the results
+        if self.stdout:
+            self.file.flush()
+        else:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TableWriter():
+    """
+    Writes VEP results flattened into the tables variants,
+    transcript_consequences and colocated_variants, one parquet or arrow
+    file each in the output directory. Rows are written in batches of
+    `row_group_size` while the results stream in.
+    """
+
+    def __init__(self, output: str, output_format: str = 'parquet', row_group_size: int = ROW_GROUP_SIZE):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise Exception(
+                f"The {output_format} output requires pyarrow, install it with 'pip install pyarrow'")
+        makedirs(output, exist_ok=True)
+        self.output = output
+        self.output_format = output_format
+        self.row_group_size = row_group_size
+        self.schemas = {table: schema(columns)
+                        for table, columns in TABLES.items()}
+        self.rows = {table: [] for table in TABLES}
+        self.writers = {}
+        self.files = {}
+
+    def paths(self):
+        return {table: join(self.output, f"{table}.{EXTENSIONS[self.output_format]}") for table in TABLES}
+
+    def __writer(self, table):
+        if table not in self.writers:
+            file = self.paths()[table]
+            if self.output_format == 'parquet':
+                import pyarrow.parquet as pq
+                self.writers[table] = pq.ParquetWriter(
+                    file, self.schemas[table], compression='zstd')
+            else:
+                import pyarrow as pa
+                self.files[table] = pa.OSFile(file, 'wb')
+                self.writers[table] = pa.ipc.new_stream(
+                    self.files[table], self.schemas[table])
+        return self.writers[table]
+
+    def __flush(self, table):
+        import pyarrow as pa
+        if self.rows[table] or table not in self.writers:
+            self.__writer(table).write_table(pa.Table.from_pylist(
+                self.rows[table], schema=self.schemas[table]))
+            self.rows[table] = []
+
+    def write(self, result: dict):
+        for table, rows in flatten(result).items():
+            self.rows[table].extend(rows)
+            if len(self.rows[table]) >= self.row_group_size:
+                self.__flush(table)
+
+    def close(self):
+        # every table is written, empty ones with their schema only
+        for table in TABLES:
+            self.__flush(table)
+        for writer in self.writers.values():
+            writer.close()
+        for file in self.files.values():
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def writer(output_format: str, output: str = None):
+    """Returns the writer of an output format other than text."""
+    if output_format == 'jsonl':
+        return JsonlWriter(output or '-')
+    if output_format in EXTENSIONS:
+        if output is None or output == '-':
+            raise Exception(
+                f"The {output_format} output is written to a directory, set it with --output")
+        return TableWriter(output, output_format)
+    raise ValueError(
+        f"Unknown output format '{output_format}', use one of {', '.join(OUTPUT_FORMATS)}")
@@ -0,0 +1,82 @@
+import json
+from unittest import TestCase, mock
+
+from click.testing import CliRunner
+
+from bioinfo_toolset.bit import cli
+from bioinfo_toolset.modules import vep_offline
+
+
+def results(count, consumed):
+    for i in range(count):
+        consumed.append(i)
+        yield {'input': f"7\t{100 + i}\t.\tA\tT", 'id': '.', 'assembly_name': 'GRCh38', 'seq_region_name': '7',
+               'start': 100 + i, 'end': 100 + i, 'allele_string': 'A/T',
+               'transcript_consequences': [{'transcript_id': 'ENST1', 'canonical': 1, 'hgvsc': f"ENST1:c.{i}A>T"}]}
+
+
+class TestVep(TestCase):
+    def test_stream_in_chunks(self):
+        """--stream with -e and --vrs processes the results chunk by chunk"""
+        consumed = []
+        calls = []
+
+        def recode_batch(inputs, species, GRCh37):
+            calls.append(('recode', len(consumed), len(inputs)))
+            return {input: [{'T': {'input': input, 'hgvsg': [f"g.{input}"]}}] for input in inputs}
+
+        def identify_many(records, processes=1):
+            calls.append(('vrs', len(consumed), len(records)))
+            return [f"ga4gh:VA.{start}" for _, _, start, _ in records]
+
+        with mock.patch.object(vep_offline, 'OfflineVep') as offline_vep, \
+                mock.patch.object(vep_offline, 'STREAM_CHUNK_SIZE', 2), \
+                mock.patch('bioinfo_toolset.modules.variant_recoder.recode_batch', side_effect=recode_batch), \
+                mock.patch('bioinfo_toolset.modules.vrs.VRS.get_instance') as get_instance:
+            offline_vep.return_value.evaluate_iter.return_value = results(5, consumed)
+            get_instance.return_value.identify_many.side_effect = identify_many
+            run = CliRunner().invoke(cli, ['vep', '-t', 'vcf_file', '--stream', '-e', '--vrs', '-f', 'jsonl', 'in.vcf'])
+        self.assertEqual(0, run.exit_code, run.output)
+        # no result beyond the chunk being processed is read
+        self.assertEqual([('recode', 2, 2), ('vrs', 2, 2), ('recode', 4, 2), ('vrs', 4, 2), ('recode', 5, 1), ('vrs', 5, 1)],
+                         calls)
+        self.assertIn('"vrs":"ga4gh:VA.104"', run.output.replace(' ', ''))
+        self.assertIn('"hgvsg":["g.ENST1:c.4A>T"]', run.output.replace(' ', ''))
+
+
+class TestHgvs(TestCase):
+    def test_output(self):
+        """Only parsed variants are printed, --normalize needs --parse or --transcript"""
+        variant = 'NC_000007.14:g.140753336A>T'
+        parsed = {'chromosome': '7', 'start': 140753336, 'end': 140753336, 'ref': 'A', 'alt': 'T'}
+        run = CliRunner().invoke(cli, ['hgvs', '-n', variant])
+        self.assertEqual(2, run.exit_code)
+        self.assertIn('--normalize needs --parse or --transcript', run.output)
+        with mock.patch('bioinfo_toolset.modules.hgvs.Hgvs.parse', side_effect=[None, parsed, parsed]), \
+                mock.patch('bioinfo_toolset.modules.normalize.from_hgvs') as from_hgvs:
+            from_hgvs.return_value.vcf.return_value = '7\t140753336\t.\tA\tT'
+            self.assertEqual('', CliRunner().invoke(cli, ['hgvs', variant]).output)
+            self.assertEqual('', CliRunner().invoke(cli, ['hgvs', '-p', variant]).output)
+            self.assertIn("'start': 140753336", CliRunner().invoke(cli, ['hgvs', '-p', variant]).output)
+            run = CliRunner().invoke(cli, ['hgvs', '-p', '-n', variant])
+        self.assertEqual((0, '7\t140753336\t.\tA\tT\n'), (run.exit_code, run.output))
+        from_hgvs.assert_called_once_with(parsed, 'GRCh38')
+
+
+class TestStore(TestCase):
+    def test_ingest_in_batches(self):
+        """The input is ingested in batches per assembly"""
+        lines = [json.dumps(result) for result in results(5, [])]
+        lines.insert(2, json.dumps({'assembly_name': 'GRCh37', 'seq_region_name': '7', 'start': 1, 'end': 1}))
+        batches = []
+
+        def get_store(assembly):
+            store = mock.Mock()
+            store.ingest.side_effect = lambda batch: batches.append((assembly, len(batch))) or len(batch)
+            return store
+
+        with mock.patch('bioinfo_toolset.modules.store.STORE_BATCH_SIZE', 2), \
+                mock.patch('bioinfo_toolset.modules.store.get_store', side_effect=get_store):
+            run = CliRunner().invoke(cli, ['store', 'ingest', '-'], input='\n'.join(lines) + '\n')
+        self.assertEqual(0, run.exit_code, run.output)
+        self.assertEqual([('GRCh38', 2), ('GRCh38', 2), ('GRCh37', 1), ('GRCh38', 1)], batches)
@@ -0,0 +1,81 @@
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from bioinfo_toolset.modules.cache import AnnotationCache
+
+
+class TestAnnotationCache(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.cache = AnnotationCache(join(self.tmp.name, 'cache.sqlite'))
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def key(self, line):
+        return self.cache.key(line, 'vcf', 'GRCh38', '106', {})
+
+    def test_key_is_normalized(self):
+        """Equal variants written differently share a key"""
+        self.assertEqual(self.key('chr7 140753336 . a t'),
+                         self.key('7\t140753336\t.\tA\tT\t.\t.\t.'))
+        self.assertNotEqual(self.key('7 140753336 . A T'),
+                            self.cache.key('7 140753336 . A T', 'vcf', 'GRCh37', '106', {}))
+        # shared padding bases are trimmed
+        self.assertEqual(self.key('7 140753335 . AT AC'), self.key('7 140753336 . T C'))
+        # VEP detects ids and hgvs in vcf input as well
+        self.assertEqual(self.key('rs699'), self.key(' rs699\n'))
+        self.assertEqual(self.key('chr7:g.140753336A>T'), self.key('7:g.140753336A>T'))
+        self.assertNotEqual(self.key('7 140753336 A'), self.key('7 140753336 T'))
+
+    def test_annotate_only_misses(self):
+        """Only inputs missing in the cache are annotated"""
+        annotated = []
+
+        def annotate(lines):
+            annotated.extend(lines)
+            return [{'input': line, 'most_severe_consequence': 'missense_variant'} for line in lines]
+
+        first = self.cache.annotate(
+            ['7 140753336 . A T'], self.key, annotate, '106')
+        second = self.cache.annotate(
+            ['7 140753336 . A T', '12 25245350 . C A', '12 25245350 . C A'], self.key, annotate, '106')
+        self.assertEqual(['7 140753336 . A T', '12 25245350 . C A'], annotated)
+        self.assertEqual(1, len(first))
+        self.assertEqual(['7 140753336 . A T', '12 25245350 . C A', '12 25245350 . C A'],
+                         [result['input'] for result in second])
+
+    def test_evict_and_invalidate(self):
+        """The least recently used entries are evicted and releases can be invalidated"""
+        self.cache.put_many({'a': {'v': 1}}, '105')
+        self.cache.put_many({'b': {'v': 2}}, '106')
+        self.cache.get_many(['a'])
+        self.cache.evict(self.cache.size() - 1)
+        self.assertEqual(['a'], list(self.cache.get_many(['a', 'b'])))
+        self.assertEqual(1, self.cache.invalidate('105'))
+        self.assertEqual(0, self.cache.size())
+
+    def test_size(self):
+        """The total size follows inserts, replacements and deletes and survives reopening"""
+        self.cache.put_many({'a': {'v': 1}, 'b': {'v': 2}}, '105')
+        self.cache.put_many({'a': {'v': 'replaced'}}, '106')
+        expected = self.cache.connection.execute("SELECT SUM(size) FROM annotations").fetchone()[0]
+        self.assertEqual(expected, self.cache.size())
+        self.cache.invalidate('105')
+        self.cache.close()
+        self.cache = AnnotationCache(join(self.tmp.name, 'cache.sqlite'))
+        self.assertEqual(len(b'{"v":"replaced"}'), self.cache.size())
+        self.cache.invalidate()
+        self.assertEqual(0, self.cache.size())
+
+    def test_size_of_existing_cache(self):
+        """The total of a cache written before the size was kept is counted once"""
+        self.cache.connection.executescript("DROP TABLE meta; DROP TRIGGER annotations_insert;")
+        self.cache.connection.execute(
+            "INSERT INTO annotations (key, release, value, size, accessed) VALUES ('a', '105', '{}', 2, 0)")
+        self.cache.connection.commit()
+        self.cache.close()
+        self.cache = AnnotationCache(join(self.tmp.name, 'cache.sqlite'))
+        self.assertEqual(2, self.cache.size())
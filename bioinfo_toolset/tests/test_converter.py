@@ -1,6 +1,6 @@
 from unittest import TestCase
 
-from bioinfo_toolset.modules.converter import one_to_three, three_to_one
+from bioinfo_toolset.modules.converter import one_to_three, three_to_one, three_to_one_many
 
 
 class TestThreeToOne(TestCase):
@@ -13,6 +13,18 @@ class TestThreeToOne(TestCase):
         for three, expected in cases.items():
             self.assertEqual(expected, three_to_one(three))
 
+    def test_three_to_one_many(self):
+        cases = {
+            'p.Val600Glu': 'p.V600E',
+            'p.Asp698GlufsTer22': 'p.D698EfsTer22',
+            'ENSP00000288602.7:p.VAL600glu': 'ENSP00000288602.7:p.V600E',
+            'p.Arg175His': 'p.R175H',
+            '': ''
+        }
+
+        self.assertEqual(list(cases.values()),
+                         three_to_one_many(list(cases.keys())))
+
     def test_one_to_three(self):
         cases = {
             'p.V600E': 'p.Val600Glu',
@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import io
+import tarfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import exists, join
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase, mock
+
+from bioinfo_toolset.modules import download
+from bioinfo_toolset.modules.download import bsd_sum, install_all, marker
+
+
+def tar_gz(files: dict):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+class StubFtpHandler(BaseHTTPRequestHandler):
+    """Serves the files dict and honours single range requests."""
+    files = {}
+    requests = []
+
+    def do_GET(self):
+        StubFtpHandler.requests.append((self.path, self.headers.get('Range')))
+        if self.path not in StubFtpHandler.files:
+            self.send_response(404)
+            self.end_headers()
+            return
+        content = StubFtpHandler.files[self.path]
+        start = 0
+        if self.headers.get('Range'):
+            start = int(self.headers['Range'][len('bytes='):].split('-')[0])
+            if start >= len(content):
+                self.send_response(416)
+                self.end_headers()
+                return
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        self.wfile.write(content[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+class TestDownload(TestCase):
+    def setUp(self):
+        self.cache = tar_gz({'homo_sapiens/110_GRCh38/info.txt': b'cache info\n' * 1000})
+        self.fasta = gzip.compress(b'>1\n' + b'ACGT' * 10000 + b'\n')
+        StubFtpHandler.files = {
+            '/cache/cache.tar.gz': self.cache,
+            '/cache/MD5SUM': f"{hashlib.md5(self.cache).hexdigest()}  cache.tar.gz\n".encode(),
+            '/fasta/genome.fa.gz': self.fasta,
+        }
+        StubFtpHandler.requests = []
+        download.checksums.cache_clear()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubFtpHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.urls = [f"{self.base_url}/cache/cache.tar.gz",
+                     f"{self.base_url}/fasta/genome.fa.gz"]
+        self.dir = TemporaryDirectory()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def test_install_all(self):
+        """Archives are verified, extracted, removed and marked as installed"""
+        with TemporaryDirectory() as tmp:
+            with open(join(tmp, 'genome.fa.gz'), 'wb') as outf:
+                outf.write(self.fasta)
+            checksum = bsd_sum(join(tmp, 'genome.fa.gz'))
+        StubFtpHandler.files['/fasta/CHECKSUMS'] = f"{checksum} genome.fa.gz\n".encode()
+
+        install_all(self.urls, self.dir.name, workers=2)
+        with open(join(self.dir.name, 'homo_sapiens/110_GRCh38/info.txt'), 'rb') as inf:
+            self.assertEqual(b'cache info\n' * 1000, inf.read())
+        with open(join(self.dir.name, 'genome.fa'), 'rb') as inf:
+            self.assertEqual(gzip.decompress(self.fasta), inf.read())
+        self.assertFalse(exists(join(self.dir.name, 'cache.tar.gz')))
+        self.assertTrue(all(marker(self.dir.name, url).is_file() for url in self.urls))
+
+        # installed files are not downloaded again
+        StubFtpHandler.requests = []
+        install_all(self.urls, self.dir.name)
+        self.assertEqual([], StubFtpHandler.requests)
+
+    def test_resume(self):
+        """A partial download is continued with a range request"""
+        with open(join(self.dir.name, 'cache.tar.gz.part'), 'wb') as outf:
+            outf.write(self.cache[:100])
+        install_all(self.urls[:1], self.dir.name)
+        self.assertIn(('/cache/cache.tar.gz', 'bytes=100-'), StubFtpHandler.requests)
+        self.assertTrue(exists(join(self.dir.name, 'homo_sapiens/110_GRCh38/info.txt')))
+
+    def test_checksum_mismatch(self):
+        """A corrupt download fails, is removed and does not stop the other files"""
+        StubFtpHandler.files['/cache/MD5SUM'] = f"{'0' * 32}  cache.tar.gz\n".encode()
+        with self.assertRaises(Exception):
+            install_all(self.urls, self.dir.name, workers=2)
+        self.assertFalse(exists(join(self.dir.name, 'cache.tar.gz.part')))
+        self.assertFalse(marker(self.dir.name, self.urls[0]).is_file())
+        self.assertTrue(marker(self.dir.name, self.urls[1]).is_file())
+
+    def test_bsd_sum(self):
+        """The python checksum equals the one of sum (BSD), including the 16 bit wrap"""
+        with TemporaryDirectory() as tmp:
+            checksums = []
+            for name, content in [('empty', b''), ('ff', b'\xff' * 5000), ('fasta', self.fasta)]:
+                with open(join(tmp, name), 'wb') as outf:
+                    outf.write(content)
+                with mock.patch.object(download.shutil, 'which', return_value=None):
+                    checksums.append(bsd_sum(join(tmp, name)))
+        self.assertEqual(['0 0', '7673 5'], checksums[:2])
+        if download.shutil.which('sum'):
+            with TemporaryDirectory() as tmp:
+                with open(join(tmp, 'fasta'), 'wb') as outf:
+                    outf.write(self.fasta)
+                self.assertEqual(bsd_sum(join(tmp, 'fasta')), checksums[2])
@@ -1,8 +1,18 @@
 from unittest import TestCase
-from bioinfo_toolset.modules.helper import inverse
+from bioinfo_toolset.modules.helper import inverse, LRUCache
 
 
 class Test_Helper(TestCase):
     def test_inverse(self):
         """Test inverse a string"""
         self.assertEqual('GTCA', inverse('ACTG'))
+
+    def test_lru_cache(self):
+        """Test the least recently used entry is evicted first"""
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(1, cache.get('a'))
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual({'hits': 1, 'misses': 1, 'size': 2, 'maxsize': 2}, cache.info())
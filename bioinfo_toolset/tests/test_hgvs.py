@@ -1,6 +1,7 @@
 from pprint import pprint
-from unittest import TestCase
-from bioinfo_toolset.modules.hgvs import Hgvs
+from unittest import TestCase, mock
+from bioinfo_toolset.modules.hgvs import Hgvs, parse_simple_g, parse_transcript_change, parse_transcript_changes, \
+    transcript_change_candidates
 
 
 class TestHgvs(TestCase):
@@ -24,3 +25,36 @@ class TestHgvs(TestCase):
 
             self.assertEqual(
                 expected_region, result['region'], 'region is not correct')
+
+    def test_parse_transcript_change(self):
+        change = parse_transcript_change('c.673-2A>G')
+        self.assertEqual(('substitution', '673-2', None, '>', 'A', 'G'), change[:6])
+        change = parse_transcript_change('1642_1643GT>AA')
+        self.assertEqual(1, change.length)
+        change = parse_transcript_change('2178_2180delATC')
+        self.assertEqual(('edit', 'del', 'ATC', 2), (change.kind, change.type, change.to_allele, change.length))
+        change = parse_transcript_change('c.673-2_680+5dup')
+        self.assertEqual(('range', 'dup', 14), (change.kind, change.type, change.length))
+        self.assertIsNone(parse_transcript_change('p.Arg12Cys'))
+        self.assertEqual([None, None], parse_transcript_changes(['foo', '1*2_3delA>T']))
+
+    def test_transcript_change_fallback(self):
+        """Changes matching several nomenclatures fall back to the next one"""
+        self.assertEqual([('substitution', '100del', '>'), ('edit', '100', 'del'), ('range', '100', 'del')],
+                         [change[:2] + (change.type,) for change in transcript_change_candidates('c.100delA>G')])
+        # the substitution position is invalid, the change is read as deletion
+        change = parse_transcript_change('100del_101AG>TC')
+        self.assertEqual(('range', '100', 'del'), (change.kind, change.position, change.type))
+        with mock.patch('bioinfo_toolset.modules.hgvs.allele_at_position', side_effect=Exception('no reference')), \
+                mock.patch.object(Hgvs, 'parse', side_effect=lambda hgvs_str: hgvs_str):
+            self.assertEqual('17:g.1000del', Hgvs.from_transcript_change('17', 1000, 'c.100delA>G'))
+
+    def test_parse_simple_g(self):
+        for hgvs_str in ['7:g.140453136A>T', '7:g.140453136a>t', '13:g.28942737_28942739del',
+                         '13:g.28942737_28942739delATC', '13:g.100delA', '8:g.37555624_37555623insCGA',
+                         '8:g.100_101insCGA', '5:g.149439278_149439301delinsGC', '5:g.100_102delATCinsGC',
+                         '1:g.102_100delinsA', 'X:g.0100N>A']:
+            self.assertEqual(self.hgvs.parse_grammar(hgvs_str),
+                             parse_simple_g(hgvs_str), hgvs_str)
+        for hgvs_str in ['X:g.100_101dup', '1:g.100A>TT', '1:g.100_101A>T', '1:g.102_100del', '25:g.100A>T']:
+            self.assertIsNone(parse_simple_g(hgvs_str), hgvs_str)
@@ -0,0 +1,75 @@
+from io import StringIO
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+
+from bioinfo_toolset.modules.liftover import ChainIndex, lift_records, liftover_array, get_index
+
+# chr1 maps forward to chrA with a gap, chr2 maps to the reverse strand of chrB
+CHAIN = """chain 1000 chr1 100000 + 100 3650 chrA 120000 + 200 3740 1
+1000\t50\t10
+2000\t0\t30
+500
+
+chain 900 chr2 100000 + 5000 12100 chrB 90000 - 1000 8000 2
+3000\t100\t0
+4000
+
+"""
+
+
+class TestLiftover(TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.path = join(self.tmp.name, 'test.over.chain')
+        with open(self.path, 'w') as outf:
+            outf.write(CHAIN)
+        self.index = ChainIndex(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_corrupt_chain(self):
+        """Test chains whose blocks do not add up to the header span are rejected"""
+        with open(self.path, 'w') as outf:
+            outf.write(CHAIN.replace('200 3740 1', '200 3750 1'))
+        with self.assertRaises(ValueError):
+            ChainIndex(self.path)
+
+    def test_query(self):
+        """Test positions are lifted within blocks and not within gaps"""
+        self.assertEqual([('chrA', 300, '+')], self.index.query('1', 200))
+        self.assertEqual([('chrA', 1210, '+')], self.index.query('chr1', 1150))
+        self.assertEqual([], self.index.query('1', 1120))
+        self.assertEqual([('chrB', 88999, '-')], self.index.query('2', 5000))
+
+    def test_query_interval(self):
+        """Test intervals are lifted as a whole"""
+        self.assertEqual(('chrA', 300, 1220, '+'),
+                         self.index.query_interval('1', 200, 1160))
+        self.assertEqual(('chrB', 88990, 89000, '-'),
+                         self.index.query_interval('2', 5000, 5010))
+        self.assertIsNone(self.index.query_interval('1', 50, 200))
+
+    def test_lift_records(self):
+        """Test records are lifted and unmapped records are reported"""
+        get_index.cache_clear()
+        unmapped = StringIO()
+        with patch('bioinfo_toolset.modules.liftover.chain_file', return_value=self.path):
+            lines = list(lift_records('hg19', 'hg38', [
+                '#header\n', 'chr1\t200\t1160\tx\n', 'chr1\t10\t20\ty\n'], 'bed', unmapped))
+        get_index.cache_clear()
+        self.assertEqual(['#header\n', 'chrA\t300\t1220\tx\n'], lines)
+        self.assertEqual('chr1\t10\t20\ty\n', unmapped.getvalue())
+
+    def test_liftover_array(self):
+        """Test arrays of positions are lifted like single positions"""
+        get_index.cache_clear()
+        chromosomes = ['1', 'chr1', '1', '2', 'X']
+        positions = [200, 1150, 1120, 5000, 10]
+        with patch('bioinfo_toolset.modules.liftover.chain_file', return_value=self.path):
+            lifted = liftover_array('hg19', 'hg38', chromosomes, positions)
+        get_index.cache_clear()
+        self.assertEqual([('chrA', 300, '+'), ('chrA', 1210, '+'), ('', -1, ''), ('chrB', 88999, '-'), ('', -1, '')],
+                         [(c, int(p), s) for c, p, s in zip(*lifted)])
@@ -0,0 +1,68 @@
+from unittest import TestCase
+
+from bioinfo_toolset.modules.normalize import (
+    Variant, from_hgvs, normalize, normalize_many, normalize_vcf_lines, trim, trim_vcf)
+
+# 1-based: GGG at 1-3, CACACA at 4-9, TTT at 12-14
+REFERENCE = 'GGGCACACACATTT' + 'ACGT' * 50
+
+
+def fetch(start, end):
+    return REFERENCE[start:end]
+
+
+def fetch_chromosome(chromosome, start, end):
+    if chromosome != '1':
+        raise KeyError(f"sequence '{chromosome}' not present")
+    return REFERENCE[start:end]
+
+
+class TestNormalize(TestCase):
+    def test_trim(self):
+        self.assertEqual((100, 'T', 'C'), trim(100, 'AT', 'AC'))
+        self.assertEqual((3, 'CA', ''), trim(4, 'CAC', 'C'))
+        self.assertEqual((101, 'T', 'C'), trim_vcf(100, 'AT', 'AC'))
+        self.assertEqual((4, 'CAC', 'C'), trim_vcf(4, 'CAC', 'C'))
+
+    def test_shift_deletion(self):
+        """Every representation of the CA deletion in the repeat becomes the same"""
+        for position, ref, alt in [(3, 'GCA', 'G'), (5, 'ACA', 'A'), (7, 'ACA', 'A'), (6, 'CAC', 'C')]:
+            self.assertEqual(Variant('1', 3, 'GCA', 'G'), normalize('chr1', position, ref, alt, fetch=fetch))
+            self.assertEqual(Variant('1', 9, 'ACA', 'A'), normalize('1', position, ref, alt, shift='right', fetch=fetch))
+
+    def test_shift_insertion(self):
+        self.assertEqual(Variant('1', 3, 'G', 'GCA'), normalize('1', 7, 'A', 'ACA', fetch=fetch))
+        self.assertEqual(Variant('1', 11, 'A', 'ACA'), normalize('1', 7, 'A', 'ACA', shift='right', fetch=fetch))
+        # at the start of the chromosome the following base is the anchor
+        self.assertEqual(Variant('1', 1, 'G', 'GG'), normalize('1', 2, 'G', 'GG', fetch=fetch))
+
+    def test_substitution(self):
+        self.assertEqual(Variant('1', 5, 'A', 'T'), normalize('1', 4, 'CA', 'CT', fetch=fetch))
+        with self.assertRaises(ValueError):
+            normalize('1', 5, 'GA', 'G', fetch=fetch)
+
+    def test_normalize_many(self):
+        """Results keep the input order, unnormalizable variants are None"""
+        self.assertEqual([Variant('1', 3, 'GCA', 'G'), Variant('1', 3, 'GCA', 'G'), None, Variant('1', 13, 'T', 'G')],
+                         normalize_many([('1', 7, 'ACA', 'A'), ('1', 5, 'ACA', 'A'), ('1', 5, 'GA', 'G'), ('1', 13, 't', 'g')],
+                                        fetch=fetch_chromosome))
+
+    def test_missing_contig(self):
+        """Variants on a contig the reference does not have are left unnormalized"""
+        self.assertEqual([None, Variant('1', 3, 'GCA', 'G'), Variant('M', 8, 'A', 'G')],
+                         normalize_many([('chrM', 7, 'ACA', 'A'), ('1', 7, 'ACA', 'A'), ('chrM', 8, 'A', 'G')],
+                                        fetch=fetch_chromosome))
+
+    def test_normalize_vcf_lines(self):
+        self.assertEqual(['1\t3\trs1\tGCA\tG\t.\tPASS', '1\t7\t.\tA\tC,T'],
+                         normalize_vcf_lines(['1\t7\trs1\tACA\tA\t.\tPASS', '1\t7\t.\tA\tC,T'], fetch=fetch_chromosome))
+        # the chr prefix and values with spaces are kept
+        self.assertEqual(['chr1\t3\t.\tGCA\tG\t.\tPASS\tNOTE=two words', 'chrM\t7\t.\tACA\tA'],
+                         normalize_vcf_lines(['chr1\t5\t.\tACA\tA\t.\tPASS\tNOTE=two words', 'chrM\t7\t.\tACA\tA'],
+                                             fetch=fetch_chromosome))
+
+    def test_from_hgvs(self):
+        self.assertEqual(Variant('1', 3, 'GCA', 'G'),
+                         from_hgvs({'chromosome': '1', 'start': 6, 'end': 7, 'ref': '', 'alt': ''}, fetch=fetch))
+        self.assertEqual(Variant('1', 3, 'G', 'GCA'),
+                         from_hgvs({'chromosome': '1', 'start': 9, 'end': 10, 'ref': None, 'alt': 'CA'}, fetch=fetch))
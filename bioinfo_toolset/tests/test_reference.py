@@ -0,0 +1,42 @@
+import gzip
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, mock
+
+from bioinfo_toolset.modules import reference
+from bioinfo_toolset.modules.reference import Reference, allele_at_position, bgzip_and_index, is_indexed
+
+FASTA = b'>1 dna:chromosome\n' + b'ACGTACGTAC' * 12 + b'\nGGTT\n>X dna:chromosome\nttgcaa\n'
+
+
+class TestReference(TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.fasta = join(self.dir.name, 'genome.fa.gz')
+        with open(self.fasta, 'wb') as outf:
+            outf.write(gzip.compress(FASTA))
+
+    def tearDown(self):
+        reference.get_reference.cache_clear()
+        self.dir.cleanup()
+
+    def test_bgzip_and_index(self):
+        self.assertFalse(is_indexed(self.fasta))
+        bgzip_and_index(self.fasta)
+        self.assertTrue(is_indexed(self.fasta))
+        # a bgzipped file is indexed again without changing its content
+        bgzip_and_index(self.fasta)
+        with gzip.open(self.fasta, 'rb') as inf:
+            self.assertEqual(FASTA, inf.read())
+
+        genome = Reference(self.fasta)
+        self.assertEqual('ACGTA', genome.fetch('1', 0, 5))
+        self.assertEqual('CGG', genome.fetch('chr1', 119, 122))
+        self.assertEqual('GCA', genome.fetch('X', 2, 5))
+        genome.close()
+
+    def test_allele_at_position(self):
+        """The installed fasta is used for reference alleles"""
+        bgzip_and_index(self.fasta)
+        with mock.patch('bioinfo_toolset.modules.vep_offline.local_fasta', return_value=self.fasta):
+            self.assertEqual('GTAC', allele_at_position('GRCh38', '1', 2, 6))
@@ -0,0 +1,63 @@
+from io import StringIO
+from unittest import TestCase, mock
+
+from bioinfo_toolset.modules.renderer import TSV_COLUMNS, TextRenderer, TsvRenderer, use_color
+
+RESULT = {
+    'input': '1 100 . A T', 'id': 'rs1', 'assembly_name': 'GRCh38', 'seq_region_name': '1', 'start': 100, 'end': 100,
+    'allele_string': 'A/T', 'most_severe_consequence': 'missense_variant',
+    'colocated_variants': [{'id': 'rs1', 'frequencies': {'T': {'gnomade': 0.1}}}],
+    'transcript_consequences': [
+        {'transcript_id': 'ENST1', 'canonical': 1, 'hgvsp': 'ENSP1:p.Val600Glu', 'consequence_terms': ['missense_variant'],
+         'protein_start': 600, 'protein_end': 600, 'cdna_start': 1799, 'cdna_end': 1799},
+        {'transcript_id': 'ENST2', 'consequence_terms': ['intron_variant', 'NMD_transcript_variant']}],
+}
+
+
+class TestRenderer(TestCase):
+    def test_text(self):
+        """The text output is aligned and colored only if asked to"""
+        renderer = TextRenderer(color=False)
+        text = renderer.render(RESULT)
+        lines = text.splitlines()
+        self.assertEqual('Result for 1 100 . A T', lines[0])
+        self.assertEqual('GRCh38: rs1 -> 1:100 (         A > T)', lines[1])
+        self.assertIn(' id                      : rs1', lines)
+        self.assertIn('    consequence_terms       : missense_variant', lines)
+        self.assertIn('    transcript_name         : V600E', lines)
+        self.assertIn(f"    frequencies             : T: \n{' ' * 34}gnomade: 0.1", text)
+        self.assertNotIn('ENST2', text)
+        self.assertNotIn('\x1b[', text)
+
+        renderer = TextRenderer(color=True, all_transcripts=True,
+                                lift=lambda result: ('GRCh37', '1', {'start': 99, 'end': 99}))
+        text = renderer.render(RESULT)
+        self.assertIn('ENST2', text)
+        self.assertIn('GRCh37: rs1 -> 1:99 (         A > T)', text)
+        self.assertIn('\x1b[1m\x1b[36mtranscript_id          \x1b[0m : \x1b[1m\x1b[97mENST1\x1b[0m', text)
+        self.assertIn(' \x1b[36mid                     \x1b[0m : \x1b[97mrs1\x1b[0m', text)
+        self.assertFalse(use_color(StringIO()))
+
+    def test_tsv(self):
+        """One row per shown transcript in the fixed column order"""
+        renderer = TsvRenderer(all_transcripts=True)
+        rows = [dict(zip(TSV_COLUMNS, line.split('\t'))) for line in renderer.render(RESULT).splitlines()]
+        self.assertEqual(['ENST1', 'ENST2'], [row['transcript_id'] for row in rows])
+        self.assertEqual(['V600E', ''], [row['transcript_name'] for row in rows])
+        self.assertEqual('intron_variant,NMD_transcript_variant', rows[1]['consequence_terms'])
+        self.assertEqual('rs1', rows[0]['colocated_ids'])
+        self.assertEqual('1 100 . A T', rows[0]['input'])
+
+        variant = dict(RESULT)
+        del variant['transcript_consequences']
+        lines = renderer.render(variant).splitlines()
+        self.assertEqual(1, len(lines))
+        self.assertEqual(len(TSV_COLUMNS), len(lines[0].split('\t')))
+
+    def test_stdout_stays_open(self):
+        for renderer in [TextRenderer, TsvRenderer]:
+            with mock.patch('sys.stdout', new=StringIO()) as out:
+                with renderer() as rendered:
+                    rendered.write(RESULT)
+                self.assertFalse(out.closed)
+                self.assertIn('ENST1', out.getvalue())
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+from unittest import TestCase, mock
+
+import requests
+
+from bioinfo_toolset.modules import rest
+from bioinfo_toolset.modules.rest import RateLimiter, request, retry_delay, session
+
+
+def response(status_code, json=None, headers=None):
+    resp = mock.Mock(ok=status_code < 400, status_code=status_code, headers=headers or {}, content=b'')
+    resp.json.return_value = json
+    resp.raise_for_status.side_effect = None if status_code < 400 else requests.HTTPError(str(status_code))
+    return resp
+
+
+class TestRest(TestCase):
+    def setUp(self):
+        self.session = mock.Mock()
+        patches = [mock.patch.object(rest, 'session', return_value=self.session),
+                   mock.patch.object(rest, 'sleep'),
+                   mock.patch.object(rest, 'limiter', RateLimiter(rate=0))]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.sleep = rest.sleep
+
+    def test_retry_after(self):
+        """Rate limited requests are retried after the time the server asks for"""
+        self.session.request.side_effect = [response(429, headers={'Retry-After': '3'}), response(200, {'ok': 1})]
+        self.assertEqual({'ok': 1}, request('GET', 'http://ensembl/info'))
+        self.sleep.assert_called_once_with(3.0)
+
+    def test_retry_after_date(self):
+        """Retry-After is also accepted as HTTP date, invalid values fall back to the backoff"""
+        now = datetime(2024, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+        with mock.patch.object(rest, 'datetime', wraps=datetime) as patched:
+            patched.now.return_value = now
+            self.assertEqual(30, retry_delay('Mon, 01 Jan 2024 12:00:30 GMT', 0))
+            self.assertEqual(0, retry_delay('Mon, 01 Jan 2024 11:00:00 GMT', 0))
+        self.assertEqual(4, retry_delay('soon', 2))
+        self.assertEqual(1, retry_delay(None, 0))
+        self.session.request.side_effect = [response(503, headers={'Retry-After': 'soon'}), response(200, {'ok': 1})]
+        self.assertEqual({'ok': 1}, request('GET', 'http://ensembl/info'))
+        self.sleep.assert_called_once_with(1)
+
+    def test_server_errors_back_off(self):
+        """Server errors are retried with a growing delay until the retries are used up"""
+        self.session.request.side_effect = [response(503)] * 3
+        with self.assertRaises(requests.HTTPError):
+            request('GET', 'http://ensembl/info', retries=2)
+        self.assertEqual([mock.call(1), mock.call(2)], self.sleep.call_args_list)
+        self.assertEqual(3, self.session.request.call_count)
+
+    def test_client_errors_are_not_retried(self):
+        self.session.request.side_effect = [response(400)]
+        with self.assertRaises(requests.HTTPError):
+            request('POST', 'http://ensembl/vep', json={})
+        self.sleep.assert_not_called()
+
+
+class TestSession(TestCase):
+    def test_shared_session(self):
+        """All modules get the same keep-alive session"""
+        self.assertIs(session(), session())
+        self.assertEqual('application/json', session().headers['Accept'])
+
+
+class TestRateLimiter(TestCase):
+    def test_spacing(self):
+        """Calls are spaced 1 / rate seconds apart"""
+        with mock.patch.object(rest, 'monotonic', return_value=100.0), mock.patch.object(rest, 'sleep') as sleep:
+            limiter = RateLimiter(rate=10)
+            for _ in range(3):
+                limiter.wait()
+        self.assertEqual([0.1, 0.2], [round(call.args[0], 6) for call in sleep.call_args_list])
@@ -0,0 +1,24 @@
+from unittest import TestCase
+
+from bioinfo_toolset.modules.sequence import (
+    complement, reverse_complement, reverse_complement_bytes, complement_array, reverse_complement_array)
+
+
+class TestSequence(TestCase):
+    def test_complement(self):
+        """Test complement handles N, lowercase and unknown characters"""
+        self.assertEqual('TGACN', complement('ACTGN'))
+        self.assertEqual('tgacn-', complement('actgn-'))
+
+    def test_reverse_complement(self):
+        """Test reverse complement of strings and bytes"""
+        self.assertEqual('CAGTN', reverse_complement('NACTG'))
+        self.assertEqual(b'CAGTN', reverse_complement_bytes(b'NACTG'))
+
+    def test_arrays(self):
+        """Test bulk complement keeps the alleles and their order"""
+        alleles = ['A', 'ACG', '', 'ttN']
+        self.assertEqual(['T', 'TGC', '', 'aaN'],
+                         complement_array(alleles).tolist())
+        self.assertEqual([reverse_complement(allele) for allele in alleles],
+                         reverse_complement_array(alleles).tolist())
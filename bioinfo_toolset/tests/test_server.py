@@ -0,0 +1,117 @@
+import socket
+import stat
+from os import stat as file_stat
+from os.path import join
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase, mock
+
+from bioinfo_toolset.modules import server
+from bioinfo_toolset.modules.server import Client, Job, Service, input_of, make_server
+
+
+class StubVep():
+    """Annotates every line with its position and records the lines of every run."""
+
+    def __init__(self):
+        self.runs = []
+
+    def evaluate_iter(self, input, GRCh37=False, **kwargs):
+        self.runs.append(list(input))
+        for line in input:
+            if 'fail' in line:
+                raise Exception('VEP failed')
+            yield {'input': input_of(line), 'start': int(line.split()[1]), 'assembly_name': 'GRCh37' if GRCh37 else 'GRCh38'}
+
+    def close(self):
+        pass
+
+
+class TestServer(TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.vep = StubVep()
+        self.service = Service(self.vep, batch_size=100, delay=0.5)
+        self.server = make_server(self.service, join(self.dir.name, 'bit.sock'))
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.client = Client(f"unix://{join(self.dir.name, 'bit.sock')}")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.close()
+        self.dir.cleanup()
+
+    def test_batching(self):
+        """Concurrent requests are annotated in one run and get their own results"""
+        requests = [['1 100 . A T', '1 200 . C G'], ['1 200 . C G', '2 300 . G A']]
+        results = [None, None]
+
+        def request(i):
+            results[i] = list(self.client.vep(requests[i]))
+        threads = [Thread(target=request, args=(i,)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(self.vep.runs))
+        self.assertEqual(3, len(self.vep.runs[0]))
+        self.assertEqual([[100, 200], [200, 300]],
+                         [[result['start'] for result in result_list] for result_list in results])
+        self.assertEqual({'status': 'ok', 'batches': 1, 'lines': 3},
+                         {key: value for key, value in self.client.health().items() if key in ['status', 'batches', 'lines']})
+
+    def test_error(self):
+        """VEP errors are passed on to the client"""
+        with self.assertRaises(Exception):
+            list(self.client.vep(['1 100 . A fail']))
+        # assemblies are not mixed
+        self.assertEqual(['GRCh37'], [result['assembly_name']
+                                      for result in self.client.vep(['1 100 . A T'], GRCh37=True)])
+
+    def test_requests(self):
+        """Large inputs are sent in several requests, the socket is private and requests are checked"""
+        client = Client(self.client.address, request_size=2)
+        lines = (f"1 {position} . A T" for position in range(100, 105))
+        self.assertEqual(list(range(100, 105)), [result['start'] for result in client.vep(lines)])
+        self.assertEqual([2, 2, 1], [len(run) for run in self.vep.runs])
+        self.assertEqual(0o600, stat.S_IMODE(file_stat(join(self.dir.name, 'bit.sock')).st_mode))
+
+        self.assertEqual([100], [result['start'] for result in self.client.vep(['1 100 . A T'], sift='p')])
+        for options in [{'output_file': '/opt/vep/.vep/other'}, {'sift': 'b --output_file x'}]:
+            with self.assertRaisesRegex(Exception, '400'):
+                list(self.client.vep(['1 100 . A T'], **options))
+        with mock.patch.object(server, 'SERVER_MAX_REQUEST_SIZE', 100):
+            with self.assertRaisesRegex(Exception, '413'):
+                list(self.client.vep([f"1 {position} . A T" for position in range(100, 110)]))
+
+    def post(self, body, length=None):
+        """Sends a raw POST /vep and returns the status code."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(join(self.dir.name, 'bit.sock'))
+            connection.sendall(f"POST /vep HTTP/1.1\r\nHost: bit\r\nContent-Length: {length or len(body)}\r\n\r\n".encode()
+                               + body)
+            # the server closes the connection after the response
+            return int(connection.makefile('rb').read().split()[1])
+
+    def test_bad_requests(self):
+        """Bodies which are not json objects, bad lengths and bad assemblies get a 400"""
+        for body in [b'[]', b'"x"', b'1', b'{"input": ["1 100 . A T"], "GRCh37": "yes"}']:
+            self.assertEqual(400, self.post(body), body)
+        self.assertEqual(400, self.post(b'{}', length='ten'))
+        self.assertEqual(200, self.post(b'{"input": ["1 100 . A T"], "GRCh37": true}'))
+
+
+class TestJob(TestCase):
+    def test_order(self):
+        """Results are passed on in line order, late duplicates are dropped"""
+        job = Job(['1 100 . A T', '1 200 . C G', '1 100 . A T'], False, {})
+        job.deliver({'input': '1\t200\t.\tC\tG'})
+        job.deliver({'input': '1\t100\t.\tA\tT'})
+        job.deliver({'input': '1\t200\t.\tC\tG', 'late': True})
+        job.deliver({'input': '9\t900\t.\tA\tT'})
+        self.assertEqual({}, job.pending)
+        job.finish()
+        self.assertEqual(['1\t100\t.\tA\tT', '1\t200\t.\tC\tG', '1\t100\t.\tA\tT'],
+                         [result['input'] for result in job])
@@ -0,0 +1,48 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from bioinfo_toolset.modules.store import Store, parse_region
+
+
+def result(chromosome, start, end, alt, consequence='missense_variant'):
+    return {'input': f"{chromosome}\t{start}\t.\tA\t{alt}", 'seq_region_name': chromosome, 'start': start, 'end': end,
+            'assembly_name': 'GRCh37', 'allele_string': f"A/{alt}", 'most_severe_consequence': consequence,
+            'transcript_consequences': [{'transcript_id': 'ENST1', 'consequence_terms': [consequence]}]}
+
+
+class TestStore(TestCase):
+    def setUp(self):
+        self.dir = TemporaryDirectory()
+        self.store = Store('GRCh37', self.dir.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.dir.cleanup()
+
+    def test_parse_region(self):
+        self.assertEqual(('17', 7570000, 7590000), parse_region('chr17:7,570,000-7,590,000'))
+        self.assertEqual(('X', 100, 100), parse_region('X:100'))
+        self.assertEqual(('MT', 1, None), parse_region('MT'))
+        with self.assertRaises(ValueError):
+            parse_region('17:200-100')
+
+    def test_ingest_and_query(self):
+        """Results are merged position sorted and found by region"""
+        self.assertEqual([], self.store.query('17:1-1000'))
+        self.assertEqual(3, self.store.ingest([result('17', 7577120, 7577120, 'T'),
+                                               result('2', 500, 500, 'G'),
+                                               result('17', 7578000, 7577999, '-')]))
+        self.assertEqual(2, self.store.ingest([result('17', 7577120, 7577120, 'T', 'stop_gained'),
+                                               result('10', 100, 100, 'C')]))
+
+        found = self.store.query('chr17:7,570,000-7,590,000')
+        self.assertEqual([7577120, 7578000], [found_result['start'] for found_result in found])
+        # the annotation of the same input is replaced
+        self.assertEqual('stop_gained', found[0]['most_severe_consequence'])
+        self.assertEqual('ENST1', found[0]['transcript_consequences'][0]['transcript_id'])
+        # insertions overlap the bases around them
+        self.assertEqual(1, len(self.store.query('17:7577999')))
+        self.assertEqual(['10', '2'], [found_result['seq_region_name'] for region in ['10', '2:1-1000']
+                                       for found_result in self.store.query(region)])
+        self.assertEqual([], self.store.query('17:1-1000'))
+        self.assertEqual([], self.store.query('Y'))
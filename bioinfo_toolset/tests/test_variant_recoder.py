@@ -0,0 +1,29 @@
+from threading import Lock
+from unittest import TestCase, mock
+
+from bioinfo_toolset.modules import rest
+from bioinfo_toolset.modules.variant_recoder import recode_batch
+
+
+class TestRecodeBatch(TestCase):
+    def test_recode_batch(self):
+        """Inputs are deduplicated, sent in batches and mapped back to their records"""
+        batches = []
+        lock = Lock()
+
+        def post(url, body):
+            with lock:
+                batches.append(body['ids'])
+            # the recoder answers per variant, the input is found in an allele
+            return [{'T': {'input': id, 'hgvsg': [f"g.{id}"]}, 'warnings': ['ignored']} for id in body['ids']
+                    if id != 'unknown']
+
+        inputs = ['c.1A>T', 'c.2A>T', 'c.1A>T', 'c.3A>T', 'unknown']
+        with mock.patch.object(rest, 'post', side_effect=post) as rest_post:
+            records = recode_batch(inputs, batch_size=2, workers=2)
+        self.assertEqual([['c.1A>T', 'c.2A>T'], ['c.3A>T', 'unknown']], sorted(batches))
+        self.assertTrue(all(call.args[0].endswith('/variant_recoder/human') for call in rest_post.call_args_list))
+        self.assertEqual(['c.1A>T', 'c.2A>T', 'c.3A>T', 'unknown'], list(records))
+        self.assertEqual(['g.c.2A>T'], records['c.2A>T'][0]['T']['hgvsg'])
+        self.assertEqual(1, len(records['c.1A>T']))
+        self.assertEqual([], records['unknown'])
@@ -0,0 +1,82 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import join
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+
+from bioinfo_toolset.modules.cache import AnnotationCache
+from bioinfo_toolset.modules.vep import rest_release, vep_batch
+
+
+class StubVepHandler(BaseHTTPRequestHandler):
+    """Answers VEP POST requests with one result per input in reversed order."""
+    requests = []
+    rate_limited = False
+
+    def do_GET(self):
+        StubVepHandler.requests.append((self.path, None))
+        payload = json.dumps({'release': 110}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if not StubVepHandler.rate_limited:
+            StubVepHandler.rate_limited = True
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        StubVepHandler.requests.append((self.path, body))
+        payload = json.dumps([{'input': input, 'most_severe_consequence': 'missense_variant'}
+                              for input in reversed(body['hgvs_notations'])]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestVepBatch(TestCase):
+    def setUp(self):
+        StubVepHandler.requests = []
+        StubVepHandler.rate_limited = False
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), StubVepHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_vep_batch(self):
+        """Inputs are chunked, retried after 429 and returned in input order"""
+        inputs = [f"7:g.{140753336 + i}A>T" for i in range(5)]
+        results = vep_batch(inputs, batch_size=2,
+                            workers=2, base_url=self.base_url)
+        self.assertEqual(inputs, [result['input'] for result in results])
+        self.assertEqual(3, len(StubVepHandler.requests))
+        self.assertTrue(all(path.startswith('/vep/human/hgvs?')
+                            for path, _ in StubVepHandler.requests))
+
+    def test_cache_release(self):
+        """Cached annotations are keyed by the release the server reports, asked once"""
+        rest_release.cache_clear()
+        self.addCleanup(rest_release.cache_clear)
+        inputs = [f"7:g.{140753336 + i}A>T" for i in range(3)]
+        with TemporaryDirectory() as dir:
+            cache = AnnotationCache(join(dir, 'cache.sqlite'))
+            vep_batch(inputs[:2], cache=cache, base_url=self.base_url)
+            results = vep_batch(inputs, cache=cache, base_url=self.base_url)
+            releases = {row[0] for row in cache.connection.execute("SELECT release FROM annotations")}
+            cache.close()
+        self.assertEqual(inputs, [result['input'] for result in results])
+        self.assertEqual({'110'}, releases)
+        self.assertEqual(['/info/software'], [path for path, body in StubVepHandler.requests if body is None])
@@ -0,0 +1,281 @@
+import json
+import re
+from itertools import islice
+from os.path import exists, join
+from tempfile import TemporaryDirectory
+from threading import Barrier, Event, Lock, Thread
+from time import sleep
+from unittest import TestCase, mock
+
+from bioinfo_toolset.modules import vep_offline
+from bioinfo_toolset.modules.cache import AnnotationCache
+from bioinfo_toolset.modules.download import marker
+from bioinfo_toolset.modules.vep_offline import DATA, OfflineVep, VepPool, cache_urls, shard
+
+
+def docker_client(exit_code=0):
+    """A docker client whose containers are mocks and exec runs print one line."""
+    client = mock.MagicMock()
+    client.containers.run.side_effect = lambda *args, **kwargs: mock.MagicMock(
+        id=f"container{client.containers.run.call_count}", name=kwargs['name'])
+    client.api.exec_start.return_value = [b'done\n']
+    client.api.exec_inspect.return_value = {'ExitCode': exit_code}
+    return client
+
+
+class TestVepPool(TestCase):
+    def test_reuse(self):
+        """Consecutive jobs run in the same warm container"""
+        client = docker_client()
+        pool = VepPool(client, size=2)
+        pool.run('vep -i a.vcf')
+        pool.run('vep -i b.vcf')
+        self.assertEqual(1, client.containers.run.call_count)
+        self.assertEqual(['container1', 'container1'], [call.args[0] for call in client.api.exec_create.call_args_list])
+        pool.close()
+
+    def test_broken_container_is_replaced(self):
+        """A container failing to exec is stopped and the next job gets a new one"""
+        client = docker_client()
+        pool = VepPool(client, size=1)
+        client.api.exec_start.side_effect = [Exception('container is gone'), [b'done\n']]
+        with self.assertRaises(Exception):
+            pool.run('vep -i a.vcf')
+        self.assertEqual([], pool.idle)
+        pool.run('vep -i a.vcf')
+        self.assertEqual(2, client.containers.run.call_count)
+        broken, replacement = [call.args[0] for call in client.api.exec_create.call_args_list]
+        self.assertEqual(('container1', 'container2'), (broken, replacement))
+        pool.close()
+
+    def test_failed_run_keeps_container(self):
+        """VEP exiting with an error does not break the container"""
+        client = docker_client(exit_code=2)
+        pool = VepPool(client, size=1)
+        with self.assertRaises(Exception):
+            pool.run('vep -i a.vcf')
+        self.assertEqual(1, len(pool.idle))
+        pool.close()
+
+    def test_size_limit(self):
+        """Jobs wait for a free container once `size` containers are running"""
+        client = docker_client()
+        pool = VepPool(client, size=1)
+        container = pool.acquire()
+        acquired = []
+        waiting = Thread(target=lambda: acquired.append(pool.acquire()))
+        waiting.start()
+        waiting.join(0.2)
+        self.assertEqual([], acquired)
+        pool.release(container)
+        waiting.join(5)
+        self.assertEqual([container], acquired)
+        self.assertEqual(1, client.containers.run.call_count)
+        pool.release(container)
+        pool.close()
+        self.assertTrue(container.stop.called)
+        with self.assertRaises(Exception):
+            pool.acquire()
+
+
+VEP_HELP = b"""#----------------------------------#
+# ENSEMBL VARIANT EFFECT PREDICTOR #
+#----------------------------------#
+
+Versions:
+  ensembl              : 106.1ed4ddf
+  ensembl-vep          : 106.1
+"""
+
+
+class StubVep(OfflineVep):
+    """Answers every line of a VEP run without docker and records the runs."""
+
+    def __init__(self):
+        self.client = mock.MagicMock()
+        self.client.containers.run.return_value = VEP_HELP
+        self.runs = []
+
+    def evaluate_iter(self, input, GRCh37=False, result_cache=None, **kwargs):
+        if result_cache is not None:
+            yield from super().evaluate_iter(input, GRCh37, result_cache, **kwargs)
+            return
+        input = list(input)
+        self.runs.append(input)
+        for line in input:
+            yield {'input': '\t'.join(line.split()), 'most_severe_consequence': 'missense_variant'}
+
+
+class TestOfflineVep(TestCase):
+    def test_stream_with_cache(self):
+        """Streamed lines are looked up in chunks and only the missing ones are annotated"""
+        lines = [f"7 {140753336 + i} . A T" for i in range(5)]
+        with TemporaryDirectory() as dir, mock.patch.object(vep_offline, 'STREAM_CHUNK_SIZE', 2), \
+                mock.patch.object(vep_offline, 'get_reference', return_value=None), \
+                mock.patch.dict(vep_offline.vep_releases, clear=True):
+            cache = AnnotationCache(join(dir, 'cache.sqlite'))
+            stub = StubVep()
+            list(stub.evaluate_iter(lines[1:2], result_cache=cache))
+            results = stub.evaluate_iter(iter(lines), result_cache=cache)
+            self.assertEqual(['\t'.join(lines[0].split())], [result['input'] for result in islice(results, 1)])
+            # the input is not read ahead of the current chunk
+            self.assertEqual([lines[1:2], lines[:1]], stub.runs)
+            self.assertEqual(['\t'.join(line.split()) for line in lines[1:]], [result['input'] for result in results])
+            self.assertEqual([lines[1:2], lines[:1], lines[2:4], lines[4:]], stub.runs)
+            self.assertEqual({'106.1'}, {row[0] for row in cache.connection.execute("SELECT release FROM annotations")})
+            cache.close()
+
+    def test_vep_release(self):
+        """The release is read from the image once per process and image"""
+        stub = StubVep()
+        with mock.patch.dict(vep_offline.vep_releases, clear=True), \
+                mock.patch.dict(vep_offline.environ, {'VEP_RELEASE': 'latest'}):
+            self.assertEqual('106.1', stub.vep_release())
+            self.assertEqual('106.1', stub.vep_release())
+            self.assertEqual(1, stub.client.containers.run.call_count)
+            self.assertEqual(('ensemblorg/ensembl-vep:latest',), stub.client.containers.run.call_args.args)
+            stub.client.containers.run.return_value = b'usage'
+            vep_offline.environ['VEP_RELEASE'] = 'release_105.0'
+            with self.assertRaises(Exception):
+                stub.vep_release()
+
+
+class TestPopulateCache(TestCase):
+    def test_former_installation(self):
+        """A cache installed by a former version is not downloaded again"""
+        with TemporaryDirectory() as dir, mock.patch.object(vep_offline, 'VEP_DATA', dir), \
+                mock.patch.object(vep_offline, 'ENSEMBL_FTP', 'http://127.0.0.1:9'):
+            open(join(dir, '.installed'), 'w').close()
+            OfflineVep.__new__(OfflineVep).populate_cache('106')
+            self.assertTrue(all(marker(dir, url).is_file() for url in cache_urls('106', 'http://127.0.0.1:9')))
+            self.assertFalse(exists(join(dir, '.installed')))
+
+
+class FakeVep(OfflineVep):
+    """
+    Runs a stand-in for VEP instead of a container: every data line of the
+    input file gets a json line in the output file, a `fail` line makes the
+    run fail after the lines before it were written.
+    """
+
+    def __init__(self, vep_data, fail=None, barrier=None, split=False, gate=None):
+        self.client = None
+        self.pool = None
+        self.vep_data = vep_data
+        self.fail = fail
+        self.barrier = barrier
+        # lines are written in two halves with a pause in between
+        self.split = split
+        # the run waits for the gate once the first line is written
+        self.gate = gate
+        self.inputs = []
+        self.lock = Lock()
+
+    def run(self, command):
+        args = dict(re.findall(r'--(\w+) (\S+)', command))
+        with open(args['input_file'].replace(DATA, self.vep_data)) as inf:
+            lines = inf.read().splitlines()
+        with self.lock:
+            self.inputs.append(lines)
+        if self.barrier is not None:
+            self.barrier.wait(timeout=5)
+        with open(args['output_file'].replace(DATA, self.vep_data), 'w') as outf:
+            for line in lines:
+                if line == self.fail:
+                    raise Exception('VEP exited with code 2')
+                if line.startswith('#'):
+                    continue
+                output = json.dumps({'input': line}) + '\n'
+                if self.split:
+                    outf.write(output[:len(output) // 2])
+                    outf.flush()
+                    sleep(0.05)
+                    output = output[len(output) // 2:]
+                outf.write(output)
+                outf.flush()
+                if self.gate is not None:
+                    self.gate.wait(timeout=5)
+
+
+class TestEvaluateParallel(TestCase):
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.vep_data = tmp.name
+        patch = mock.patch.object(vep_offline, 'VEP_DATA', tmp.name)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.header = ['##fileformat=VCFv4.2', '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO']
+        self.lines = [f"7\t{140753336 + i}\t.\tA\tT" for i in range(7)]
+
+    def test_shard(self):
+        """Shards are contiguous runs of whole lines and every one gets the header"""
+        shards = shard(self.header + self.lines, 3)
+        self.assertEqual([self.header] * 3, [part[:2] for part in shards])
+        self.assertEqual([3, 2, 2], [len(part) - 2 for part in shards])
+        self.assertEqual(self.lines, [line for part in shards for line in part[2:]])
+        self.assertEqual([[line] for line in self.lines], shard(self.lines, 10))
+        self.assertEqual([[]], shard([], 3))
+
+    def test_jobs(self):
+        """--jobs shards run in as many concurrent VEP runs and the results keep the input order"""
+        vep = FakeVep(self.vep_data, barrier=Barrier(3))
+        results = vep.evaluate_parallel(self.header + self.lines, 3)
+        self.assertEqual(self.lines, [result['input'] for result in results])
+        self.assertEqual(3, len(vep.inputs))
+        self.assertTrue(all(lines[:2] == self.header for lines in vep.inputs))
+
+    def test_failing_shard(self):
+        """A failing shard fails the whole run instead of dropping its results"""
+        vep = FakeVep(self.vep_data, fail=self.lines[4])
+        with self.assertRaises(Exception):
+            vep.evaluate_parallel(self.lines, 3)
+        self.assertEqual(3, len(vep.inputs))
+
+
+class TestEvaluateIter(TestCase):
+    def setUp(self):
+        tmp = TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.vep_data = tmp.name
+        for patch in [mock.patch.object(vep_offline, 'VEP_DATA', tmp.name),
+                      mock.patch.object(vep_offline, 'POLL_INTERVAL', 0.01)]:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.lines = [f"7\t{140753336 + i}\t.\tA\tT" for i in range(3)]
+
+    def test_partial_lines(self):
+        """A line VEP has only partly written is held back until it is complete"""
+        results = FakeVep(self.vep_data, split=True).evaluate_iter(self.lines)
+        self.assertEqual(self.lines, [result['input'] for result in results])
+
+    def test_stream(self):
+        """Results arrive while VEP runs and the stream ends when it exits"""
+        gate = Event()
+        results = FakeVep(self.vep_data, gate=gate).evaluate_iter(self.lines)
+        self.assertEqual(self.lines[0], next(results)['input'])
+        gate.set()
+        self.assertEqual(self.lines[1:], [result['input'] for result in results])
+        self.assertEqual([], list(FakeVep(self.vep_data).evaluate_iter([])))
+
+    def test_failed_run(self):
+        """A failing VEP run raises after the results written before"""
+        results = FakeVep(self.vep_data, fail=self.lines[2]).evaluate_iter(self.lines)
+        self.assertEqual(self.lines[:2], [result['input'] for result in islice(results, 2)])
+        with self.assertRaises(Exception):
+            next(results)
+
+    def test_container_exit_code(self):
+        """A non-zero exit code of the VEP container is an error, the container is removed"""
+        vep = OfflineVep.__new__(OfflineVep)
+        vep.pool = None
+        vep.client = mock.MagicMock()
+        container = vep.client.containers.run.return_value
+        container.logs.return_value = [b'running\n']
+        container.wait.return_value = {'StatusCode': 2}
+        with self.assertRaises(Exception), mock.patch.object(vep_offline, 'stdout'):
+            vep.run('./vep --input_file in.vcf')
+        container.remove.assert_called_once_with(force=True)
+        container.wait.return_value = {'StatusCode': 0}
+        with mock.patch.object(vep_offline, 'stdout'):
+            vep.run('./vep --input_file in.vcf')
@@ -0,0 +1,42 @@
+import json
+from unittest import TestCase
+
+from bioinfo_toolset.modules.vep_result import LazyResult, decode, dumps
+
+RESULT = {
+    'input': '1\t100\t.\tA\tT', 'id': '.', 'start': 100, 'end': 100, 'allele_string': 'A/T',
+    'transcript_consequences': [{'transcript_id': 'ENST1', 'consequence_terms': ['missense_variant']}],
+    'colocated_variants': [{'id': 'rs1', 'frequencies': {'T': {'gnomade': 0.0001}}}],
+}
+LINE = json.dumps(RESULT) + '\n'
+
+
+class TestVepResult(TestCase):
+    def test_result(self):
+        """The line is decoded on access and kept until the result is changed"""
+        result = LazyResult(LINE)
+        self.assertIsNone(result.tree)
+        self.assertIn('colocated_variants', result)
+        self.assertEqual(100, result['start'])
+        self.assertEqual(LINE.strip().encode(), result.raw)
+        self.assertEqual('ENST1', result['transcript_consequences'][0]['transcript_id'])
+        self.assertIsNone(result.raw)
+        self.assertEqual(RESULT, dict(result))
+        self.assertEqual(RESULT, result)
+        self.assertEqual([], LazyResult(LINE).get('regulatory_feature_consequences', []))
+
+    def test_dumps(self):
+        """Unchanged results are written as read, changed ones are encoded again"""
+        result = LazyResult(LINE)
+        self.assertIs(result.raw, dumps(result))
+        copy = result.copy()
+        copy['vrs'] = 'ga4gh:VA.1'
+        del copy['colocated_variants']
+        self.assertIs(result.raw, dumps(result))
+        expected = dict(RESULT, vrs='ga4gh:VA.1')
+        del expected['colocated_variants']
+        self.assertEqual(expected, json.loads(dumps(copy)))
+        # changes inside decoded sub-trees are kept as well
+        result['transcript_consequences'][0]['hgvsg'] = ['1:g.100A>T']
+        self.assertEqual(['1:g.100A>T'], json.loads(dumps(result))['transcript_consequences'][0]['hgvsg'])
+        self.assertEqual([RESULT], decode(json.dumps([RESULT])))
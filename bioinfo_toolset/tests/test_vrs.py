@@ -0,0 +1,72 @@
+from unittest import TestCase, mock
+
+from ga4gh.core import ga4gh_identify
+from ga4gh.vrs import models
+
+from bioinfo_toolset.modules.helper import LRUCache
+from bioinfo_toolset.modules import vrs
+from bioinfo_toolset.modules.vrs import VRS
+
+SEQUENCE_ID = 'ga4gh:SQ.F-LrLMe1SRpfUZHkQmvkVKFEGaoDeHxY'
+
+
+class StubDataProxy():
+    def translate_sequence_identifier(self, identifier, namespace=None):
+        return [SEQUENCE_ID]
+
+
+class TestVRS(TestCase):
+    def setUp(self):
+        # bypass __init__, which needs the seqrepo backend
+        self.vrs = VRS.__new__(VRS)
+        self.vrs.backend = 'stub'
+        self.vrs.seqrepo = StubDataProxy()
+        self.vrs.identifiers = LRUCache()
+
+    def test_identify_many(self):
+        """Test bulk ids are identical to ga4gh_identify"""
+        records = [('GRCh38:7', 'T', 140753336),
+                   ('GRCh38:7', 'T', 140753336, 140753336),
+                   ('GRCh38:17', 'AG', 7675087, 7675089),
+                   ('GRCh38:17', '', 7675087, 7675100)]
+        for record, _id in zip(records, self.vrs.identify_many(records)):
+            sequence_id, allele, start, end = (record + (None,))[:4]
+            if end is None or start == end:
+                start, end = start - 1, start
+            location = models.SequenceLocation(
+                sequence_id=SEQUENCE_ID, interval=models.SimpleInterval(start=start, end=end))
+            expected = ga4gh_identify(models.Allele(
+                location=location, state=models.SequenceState(sequence=allele)))
+            self.assertEqual(expected, _id)
+            self.assertEqual(expected, self.vrs.identify(*record))
+
+
+class TestLocalSeqRepo(TestCase):
+    def setUp(self):
+        self.proxy = mock.Mock()
+        self.proxy.translate_sequence_identifier.return_value = [SEQUENCE_ID]
+        self.proxy.get_metadata.return_value = {'length': 10000}
+        self.proxy.get_sequence.side_effect = lambda identifier, start, end: ('ACGT' * 2500)[start:end]
+        patches = [mock.patch('biocommons.seqrepo.SeqRepo'),
+                   mock.patch('ga4gh.vrs.dataproxy.SeqRepoDataProxy', return_value=self.proxy),
+                   mock.patch('docker.client.from_env', side_effect=AssertionError('docker is not used'))]
+        self.seqrepo, self.data_proxy, _ = [patch.start() for patch in patches]
+        for patch in patches:
+            self.addCleanup(patch.stop)
+
+    def test_local_backend(self):
+        """The local backend reads the seqrepo directory without docker"""
+        local = VRS(backend='local')
+        self.seqrepo.assert_called_once_with(vrs.SEQREPO_DATA)
+        self.data_proxy.assert_called_once_with(self.seqrepo.return_value)
+        self.assertEqual('GTAC', local.allele_at_position('GRCh38', '7', 4094, 4098))
+        self.assertEqual(vrs.allele_digests([(SEQUENCE_ID.split('.', 1)[1], 9, 10, 'T')]),
+                         local.identify_many([('GRCh38:7', 'T', 10)]))
+        self.assertEqual(1, self.proxy.translate_sequence_identifier.call_count)
+
+    def test_local_errors(self):
+        self.proxy.translate_sequence_identifier.side_effect = KeyError('GRCh38:99')
+        with self.assertRaisesRegex(Exception, 'local seqrepo'):
+            VRS(backend='local').identify('GRCh38:99', 'T', 10)
+        with self.assertRaises(ValueError):
+            VRS(backend='remote')
@@ -0,0 +1,88 @@
+import json
+from importlib.util import find_spec
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+from click.testing import CliRunner
+
+from bioinfo_toolset.bit import cli
+from bioinfo_toolset.modules.writer import TableWriter, flatten, writer
+
+RESULTS = [
+    {'input': '1\t100\t.\tA\tT', 'id': '.', 'assembly_name': 'GRCh38', 'seq_region_name': '1', 'start': 100, 'end': 100,
+     'strand': 1, 'allele_string': 'A/T', 'most_severe_consequence': 'missense_variant',
+     'transcript_consequences': [
+         {'transcript_id': 'ENST1', 'gene_symbol': 'BRAF', 'biotype': 'protein_coding', 'canonical': 1,
+          'consequence_terms': ['missense_variant'], 'impact': 'MODERATE', 'sift_score': 0, 'protein_start': 600},
+         {'transcript_id': 'ENST2', 'gene_symbol': 'BRAF', 'biotype': 'nonsense_mediated_decay',
+          'consequence_terms': ['missense_variant', 'NMD_transcript_variant'], 'impact': 'MODERATE'}],
+     'colocated_variants': [{'id': 'rs113488022', 'start': 100, 'end': 100, 'clin_sig': ['pathogenic'],
+                             'frequencies': {'T': {'gnomade': 0.0001}}}]},
+    {'input': '2\t200\t.\tC\tG', 'id': '.', 'assembly_name': 'GRCh38', 'seq_region_name': '2', 'start': 200, 'end': 200,
+     'strand': 1, 'allele_string': 'C/G', 'most_severe_consequence': 'intron_variant',
+     'transcript_consequences': [{'transcript_id': 'ENST3', 'gene_symbol': 'TP53', 'biotype': 'protein_coding',
+                                  'consequence_terms': ['intron_variant'], 'impact': 'MODIFIER'}]}
+]
+
+
+class TestWriter(TestCase):
+    def test_flatten(self):
+        tables = flatten(RESULTS[0])
+        self.assertEqual(1, len(tables['variants']))
+        self.assertEqual(['ENST1', 'ENST2'], [row['transcript_id'] for row in tables['transcript_consequences']])
+        self.assertEqual(True, tables['transcript_consequences'][0]['canonical'])
+        self.assertEqual(0.0, tables['transcript_consequences'][0]['sift_score'])
+        self.assertEqual({'T': {'gnomade': 0.0001}}, json.loads(tables['colocated_variants'][0]['frequencies']))
+        self.assertTrue(all(row['input'] == RESULTS[0]['input'] for rows in tables.values() for row in rows))
+
+    def test_jsonl(self):
+        with TemporaryDirectory() as dir:
+            with writer('jsonl', join(dir, 'results.jsonl')) as out:
+                for result in RESULTS:
+                    out.write(result)
+            with open(join(dir, 'results.jsonl')) as inf:
+                self.assertEqual(RESULTS, [json.loads(line) for line in inf])
+
+    @skipUnless(find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_parquet_and_arrow(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        for output_format in ['parquet', 'arrow']:
+            with TemporaryDirectory() as dir:
+                with TableWriter(dir, output_format, row_group_size=1) as out:
+                    for result in RESULTS:
+                        out.write(result)
+                    paths = out.paths()
+                if output_format == 'parquet':
+                    self.assertEqual(2, pq.ParquetFile(paths['variants']).num_row_groups)
+                    read = {table: pq.read_table(path) for table, path in paths.items()}
+                else:
+                    read = {table: pa.ipc.open_stream(path).read_all() for table, path in paths.items()}
+                transcripts = read['transcript_consequences']
+                self.assertEqual(3, transcripts.num_rows)
+                self.assertTrue(pa.types.is_dictionary(transcripts.schema.field('gene_symbol').type))
+                self.assertEqual(['BRAF', 'BRAF', 'TP53'], transcripts.column('gene_symbol').to_pylist())
+                self.assertEqual(['missense_variant', 'NMD_transcript_variant'],
+                                 transcripts.column('consequence_terms').to_pylist()[1])
+                self.assertEqual([100, 200], read['variants'].column('start').to_pylist())
+                self.assertEqual(['rs113488022'], read['colocated_variants'].column('id').to_pylist())
+
+    def test_vep_output_option(self):
+        """bit vep -f jsonl writes the results to the --output file"""
+        with TemporaryDirectory() as dir, patch('bioinfo_toolset.modules.vep_offline.OfflineVep') as offline_vep:
+            offline_vep.return_value.evaluate.return_value = iter(RESULTS)
+            path = join(dir, 'results.jsonl')
+            run = CliRunner().invoke(cli, ['vep', '-t', 'vcf', '-f', 'jsonl', '-O', path, '1 100 . A T'])
+            self.assertEqual(0, run.exit_code, run.output)
+            with open(path) as inf:
+                self.assertEqual(RESULTS, [json.loads(line) for line in inf])
+
+    def test_jsonl_stdout(self):
+        """Writing to stdout does not close it"""
+        with patch('bioinfo_toolset.modules.vep_offline.OfflineVep') as offline_vep:
+            offline_vep.return_value.evaluate.return_value = iter(RESULTS)
+            run = CliRunner().invoke(cli, ['vep', '-t', 'vcf', '-f', 'jsonl', '1 100 . A T'])
+        self.assertEqual(0, run.exit_code, run.output)
+        self.assertEqual(RESULTS, [json.loads(line) for line in run.output.splitlines()])
@@ -29,8 +29,17 @@ setuptools.setup(
         'jsonschema',
         'docker',
         'ga4gh.vrs[extras]',
-        'biopython'
+        'biopython',
+        'numpy',
+        'requests',
+        'pysam'
     ],
+    extras_require={
+        # bit vep --output-format parquet|arrow
+        'arrow': ['pyarrow'],
+        # faster decoding of the VEP output
+        'json': ['orjson']
+    },
     entry_points={
         'console_scripts': {
             'bit = bioinfo_toolset.bit:cli'